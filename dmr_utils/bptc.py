@@ -28,6 +28,48 @@ from __future__ import print_function
 from bitarray import bitarray
 from dmr_utils import hamming, crc, rs129
 
+# ---------------------------------------------------------------------------
+#   Bit Conversion Routines
+# ---------------------------------------------------------------------------
+
+# Convert a (big endian) bitarray into an integer, the first bit of the
+# bitarray being the most significant bit of the integer
+def bits_to_int(_bits):
+    return int.from_bytes(_bits.tobytes(), 'big') >> (-len(_bits) % 8)
+
+# Convert an integer into a (big endian) bitarray of the given length
+def int_to_bits(_value, _length):
+    _pad = -_length % 8
+    _bits = bitarray(endian='big')
+    _bits.frombytes((_value << _pad).to_bytes((_length + _pad) // 8, 'big'))
+    del _bits[_length:]
+    return _bits
+
+# Build the byte lookup tables to move bits from an input bit string into an
+# output bit string; _map holds the input bit index for every output bit
+def mk_bit_tables(_map, _in_len):
+    _out_len = len(_map)
+    _bit_out = [[0] * 8 for _ in range((_in_len + 7) // 8)]
+    for _out_pos, _in_pos in enumerate(_map):
+        _bit_out[_in_pos // 8][_in_pos % 8] |= 1 << (_out_len - 1 - _out_pos)
+
+    _tables = []
+    for _byte in _bit_out:
+        _table = [0] * 256
+        for _value in range(1, 256):
+            _low = _value & -_value
+            _table[_value] = _table[_value ^ _low] | _byte[8 - _low.bit_length()]
+        _tables.append(_table)
+    return _tables
+
+# Move bits using tables built by mk_bit_tables(), _data are the input bits
+# packed into bytes (i.e. bitarray.tobytes())
+def permute_bits(_data, _tables):
+    _out = 0
+    for _table, _byte in zip(_tables, _data):
+        _out |= _table[_byte]
+    return _out
+
 # ---------------------------------------------------------------------------
 #   Contants
 # ---------------------------------------------------------------------------
@@ -46,151 +88,145 @@ INDEX_181 = (
     195, 180, 165, 150, 135, 120, 105, 90, 75, 60, 45, 30, 15
 )
 
+# Interleaved bit positions of the 96 information bits of a BPTC(196,96) block
+DECODE_FULL_LC_INDEX = (
+    136, 121, 106, 91,  76,  61,  46,  31,
+    152, 137, 122, 107, 92,  77,  62,  47,  32,  17,  2,
+    123, 108, 93,  78,  63,  48,  33,  18,  3,   184, 169,
+    94,  79,  64,  49,  34,  19,  4,   185, 170, 155, 140,
+    65,  50,  35,  20,  5,   186, 171, 156, 141, 126, 111,
+    36,  21,  6,   187, 172, 157, 142, 127, 112, 97,  82,
+    7,   188, 173, 158, 143, 128, 113, 98,  83,
+    68,  53,  174, 159, 144, 129, 114, 99,  84,  69,  54,  39,
+    24,  145, 130, 115, 100, 85,  70,  55,  40,  25,  10,  191
+)
+
+# Embedded LC matrix (8 rows of 16 bits) bit positions for bursts B-E, read
+# out column by column
+# Note: the second bit of burst D is taken from matrix bit 24 rather than 25;
+# this matches the encoder output this FNE has always produced
+ENCODE_EMBLC_INDEX = tuple(24 if (_col == 9 and _row == 1) else (_col + (_row * 16)) for _col in range(16) for _row in range(8))
+
+# Embedded LC matrix bit positions of the 72 LC bits
+DECODE_EMBLC_INDEX = tuple(_row + (_col * 8) for _row in range(7) for _col in range(11 if _row < 2 else 10))
+
+INTERLEAVE_19696_TABLES = mk_bit_tables([INDEX_181.index(_pos) for _pos in range(196)], 196)
+DECODE_FULL_LC_TABLES = mk_bit_tables(DECODE_FULL_LC_INDEX, 196)
+ENCODE_EMBLC_TABLES = mk_bit_tables(ENCODE_EMBLC_INDEX, 128)
+DECODE_EMBLC_TABLES = mk_bit_tables(DECODE_EMBLC_INDEX, 128)
+
+# Hamming parity lookup tables (indexed by the data bits as an integer)
+def mk_hamming_table(_enc, _bits):
+    _table = []
+    for _value in range(1 << _bits):
+        _csum = _enc(int_to_bits(_value, _bits))
+        _parity = 0
+        for _bit in _csum:
+            _parity = (_parity << 1) | _bit
+        _table.append(_parity)
+    return _table
+
+HAMMING_15113 = mk_hamming_table(hamming.enc_15113, 11)
+HAMMING_16114 = mk_hamming_table(hamming.enc_16114, 11)
+
+# Hamming(13,9,3) is applied over the columns of the BPTC matrix; as it is
+# linear, each parity row is the XOR of these data rows
+HAMMING_1393_ROWS = tuple(tuple(_row for _row in range(9) if hamming.enc_1393(int_to_bits(1 << (8 - _row), 9))[_parity]) for _parity in range(4))
+
 # ---------------------------------------------------------------------------
 #   BPTC(196,96) Module Routines
 # ---------------------------------------------------------------------------
 
-def decode_full_lc(_data):
-    binlc = bitarray(endian='big')
+# Accepts the 196 interleaved bits (packed into bytes) and returns the 96 bits
+# of information as an integer
+def decode_full_lc_int(_data):
+    return permute_bits(_data, DECODE_FULL_LC_TABLES)
 
-    binlc.extend([_data[136],_data[121],_data[106],_data[91], _data[76], _data[61], _data[46], _data[31]])
-    binlc.extend([_data[152],_data[137],_data[122],_data[107],_data[92], _data[77], _data[62], _data[47], _data[32], _data[17], _data[2]  ])
-    binlc.extend([_data[123],_data[108],_data[93], _data[78], _data[63], _data[48], _data[33], _data[18], _data[3],  _data[184],_data[169]])
-    binlc.extend([_data[94], _data[79], _data[64], _data[49], _data[34], _data[19], _data[4],  _data[185],_data[170],_data[155],_data[140]])
-    binlc.extend([_data[65], _data[50], _data[35], _data[20], _data[5],  _data[186],_data[171],_data[156],_data[141],_data[126],_data[111]])
-    binlc.extend([_data[36], _data[21], _data[6],  _data[187],_data[172],_data[157],_data[142],_data[127],_data[112],_data[97], _data[82] ])
-    binlc.extend([_data[7],  _data[188],_data[173],_data[158],_data[143],_data[128],_data[113],_data[98], _data[83]])
-    binlc.extend([_data[68],_data[53],_data[174],_data[159],_data[144],_data[129],_data[114],_data[99],_data[84],_data[69],_data[54],_data[39]])
-    binlc.extend([_data[24],_data[145],_data[130],_data[115],_data[100],_data[85],_data[70],_data[55],_data[40],_data[25],_data[10],_data[191]])
+def decode_full_lc(_data):
+    return int_to_bits(decode_full_lc_int(_data.tobytes()), 96)
 
-    return binlc
+def interleave_19696_int(_value):
+    return permute_bits((_value << 4).to_bytes(25, 'big'), INTERLEAVE_19696_TABLES)
 
 def interleave_19696(_data):
-    inter = bitarray(196, endian='big')
-    for index in range(196):
-        inter[INDEX_181[index]] = _data[index]  # the real math is slower: deint[index] = _data[(index * 181) % 196]
-    return inter
+    return int_to_bits(permute_bits(_data.tobytes(), INTERLEAVE_19696_TABLES), 196)
+
+# Accepts 12 byte LC header + RS1293, and returns the 196 bit BPTC matrix as an
+# integer; hamming 15113 is encoded to rows and 1393 to columns
+def encode_19696_int(_data):
+    # the R0-R3 bits are the 4 leading zero bits of the 100 bit data string,
+    # every row takes 11 bits (the first row includes an extra R3 bit that
+    # makes an even 196 bit string)
+    _value = int.from_bytes(_data, 'big')
+    _rows = []
+    for _row in range(9):
+        _d = (_value >> (88 - (_row * 11))) & 0x7FF
+        _rows.append((_d << 4) | HAMMING_15113[_d])
+
+    for _parity_rows in HAMMING_1393_ROWS:
+        _p = 0
+        for _row in _parity_rows:
+            _p ^= _rows[_row]
+        _rows.append(_p)
+
+    _matrix = 0
+    for _row in _rows:
+        _matrix = (_matrix << 15) | _row
+    return _matrix
 
-# Accepts 12 byte LC header + RS1293, converts to binary and pads for 196 bit
-# encode hamming 15113 to rows and 1393 to columns
 def encode_19696(_data):
-    # Create a bitarray from the 4 bytes of LC data (includes RS1293 ECC)
-    _bdata = bitarray(endian='big')
-    _bdata.frombytes(_data)
-    
-    # Insert R0-R3 bits
-    for i in range(4):
-        _bdata.insert(0, 0)
-    
-    # Get row hamming 15,11,3 and append. +1 is to account for R3 that makes an even 196bit string
-    for index in range(9):
-        spos = (index*15) + 1
-        epos= spos + 11
-        _rowp = hamming.enc_15113(_bdata[spos:epos])
-        for pbit in range(4):
-            _bdata.insert(epos+pbit,_rowp[pbit])
-    
-    # Get column hamming 13,9,3 and append. +1 is to account for R3 that makes an even 196bit string
-    # Pad out the bitarray to a full 196 bits. Can't insert into 'columns'
-    for i in range(60):
-        _bdata.append(0)
-    
-    column = bitarray(9, endian='big')  # Temporary bitarray to hold column data
-    for col in range(15):
-        spos = col + 1
-        for index in range(9):
-            column[index] = _bdata[spos]
-            spos += 15
-        _colp = hamming.enc_1393(column)
-        
-        # Insert bits into matrix...
-        cpar = 136 + col                # Starting location in the matrix for column bits
-        for pbit in range(4):
-            _bdata[cpar] =  _colp[pbit]
-            cpar += 15
-
-    return _bdata
+    return int_to_bits(encode_19696_int(_data), 196)
+
+def encode_header_lc_int(_lc):
+    return interleave_19696_int(encode_19696_int(_lc + rs129.lc_header_encode(_lc)))
 
 def encode_header_lc(_lc):
-    full_lc = _lc + rs129.lc_header_encode(_lc)
-    full_lc = encode_19696(full_lc)
-    full_lc = interleave_19696(full_lc)
-    return full_lc
+    return int_to_bits(encode_header_lc_int(_lc), 196)
+
+def encode_header_pi_int(_lc):
+    return interleave_19696_int(encode_19696_int(_lc))
 
 def encode_header_pi(_lc):
-    full_lc = _lc
-    full_lc = encode_19696(full_lc)
-    full_lc = interleave_19696(full_lc)
-    return full_lc
-    
+    return int_to_bits(encode_header_pi_int(_lc), 196)
+
+def encode_terminator_lc_int(_lc):
+    return interleave_19696_int(encode_19696_int(_lc + rs129.lc_terminator_encode(_lc)))
+
 def encode_terminator_lc(_lc):
-    full_lc = _lc + rs129.lc_terminator_encode(_lc)
-    full_lc = encode_19696(full_lc)
-    full_lc = interleave_19696(full_lc)
-    return full_lc
+    return int_to_bits(encode_terminator_lc_int(_lc), 196)
+
+# Accepts the 128 bit embedded LC matrix (packed into bytes) and returns the 72
+# bits of LC as an integer
+def decode_emblc_int(_elc):
+    return permute_bits(_elc, DECODE_EMBLC_TABLES)
 
 def decode_emblc(_elc):
-    _binlc = bitarray(endian='big')
-
-    _binlc.extend([_elc[0],_elc[8], _elc[16],_elc[24],_elc[32],_elc[40],_elc[48],_elc[56],_elc[64],_elc[72] ,_elc[80]])
-    _binlc.extend([_elc[1],_elc[9], _elc[17],_elc[25],_elc[33],_elc[41],_elc[49],_elc[57],_elc[65],_elc[73] ,_elc[81]])
-    _binlc.extend([_elc[2],_elc[10],_elc[18],_elc[26],_elc[34],_elc[42],_elc[50],_elc[58],_elc[66],_elc[74]])
-    _binlc.extend([_elc[3],_elc[11],_elc[19],_elc[27],_elc[35],_elc[43],_elc[51],_elc[59],_elc[67],_elc[75]])
-    _binlc.extend([_elc[4],_elc[12],_elc[20],_elc[28],_elc[36],_elc[44],_elc[52],_elc[60],_elc[68],_elc[76]])
-    _binlc.extend([_elc[5],_elc[13],_elc[21],_elc[29],_elc[37],_elc[45],_elc[53],_elc[61],_elc[69],_elc[77]])
-    _binlc.extend([_elc[6],_elc[14],_elc[22],_elc[30],_elc[38],_elc[46],_elc[54],_elc[62],_elc[70],_elc[78]])
-    
-    return(_binlc.tobytes())
-
-# Accepts 12 byte LC header + 5-bit checksum, converts to binary and builts out the BPTC
-# encoded result with hamming(16,11,4) and parity.
+    return decode_emblc_int(_elc.tobytes()).to_bytes(9, 'big')
+
+# Accepts 9 byte LC, and returns the embedded LC for bursts B-E as integers,
+# built from the LC + 5-bit checksum with hamming(16,11,4) rows and column
+# parity.
+def encode_emblc_int(_lc):
+    _csum = crc.csum5_int(_lc)
+    _value = int.from_bytes(_lc, 'big')
+
+    # the first two rows are 11 bits of LC, the remaining rows are 10 bits of
+    # LC and 1 bit of the checksum
+    _data = [(_value >> 61) & 0x7FF, (_value >> 50) & 0x7FF]
+    for _row in range(5):
+        _data.append((((_value >> (40 - (_row * 10))) & 0x3FF) << 1) | ((_csum >> (4 - _row)) & 1))
+
+    _matrix = 0
+    _parity = 0
+    for _d in _data:
+        _row = (_d << 5) | HAMMING_16114[_d]
+        _parity ^= _row
+        _matrix = (_matrix << 16) | _row
+    _matrix = (_matrix << 16) | _parity
+
+    _emb = permute_bits(_matrix.to_bytes(16, 'big'), ENCODE_EMBLC_TABLES)
+    return {1: (_emb >> 96) & 0xFFFFFFFF, 2: (_emb >> 64) & 0xFFFFFFFF, 3: (_emb >> 32) & 0xFFFFFFFF, 4: _emb & 0xFFFFFFFF}
+
 def encode_emblc(_lc):
-    # Get the 5-bit checksum for the Embedded LC
-    _csum = crc.csum5(_lc)
-    
-    # Create a bitarray from the 4 bytes of LC data (includes 5-bit checksum).
-    _binlc = bitarray(endian='big')
-    _binlc.frombytes(_lc)
-    
-    # Insert the checksum bits at the right location in the matrix (this is actually faster than with a for loop)
-    _binlc.insert(32,_csum[0])
-    _binlc.insert(43,_csum[1])
-    _binlc.insert(54,_csum[2])
-    _binlc.insert(65,_csum[3])
-    _binlc.insert(76,_csum[4])
-
-    # Insert the hamming bits at the right location in the matrix
-    for index in range(0,112,16):
-        for hindex,hbit in zip(range(index+11,index+16), hamming.enc_16114(_binlc[index:index+11])):
-            _binlc.insert(hindex,hbit)
-    
-    # Insert the column parity bits at the right location in the matrix
-    for index in range(0,16):
-        _binlc.insert(index+112, _binlc[index+0] ^ _binlc[index+16] ^ _binlc[index+32] ^ _binlc[index+48] ^ _binlc[index+64] ^ _binlc[index+80] ^ _binlc[index+96])
-    
-    # Create Embedded LC segments in 48 bit blocks
-    emblc_b = bitarray(endian='big')
-    emblc_b.extend([_binlc[0], _binlc[16],_binlc[32],_binlc[48],_binlc[64],_binlc[80],_binlc[96], _binlc[112]])
-    emblc_b.extend([_binlc[1], _binlc[17],_binlc[33],_binlc[49],_binlc[65],_binlc[81],_binlc[97], _binlc[113]])
-    emblc_b.extend([_binlc[2], _binlc[18],_binlc[34],_binlc[50],_binlc[66],_binlc[82],_binlc[98], _binlc[114]])
-    emblc_b.extend([_binlc[3], _binlc[19],_binlc[35],_binlc[51],_binlc[67],_binlc[83],_binlc[99], _binlc[115]])
-    
-    emblc_c = bitarray(endian='big')
-    emblc_c.extend([_binlc[4], _binlc[20],_binlc[36],_binlc[52],_binlc[68],_binlc[84],_binlc[100],_binlc[116]])
-    emblc_c.extend([_binlc[5], _binlc[21],_binlc[37],_binlc[53],_binlc[69],_binlc[85],_binlc[101],_binlc[117]])
-    emblc_c.extend([_binlc[6], _binlc[22],_binlc[38],_binlc[54],_binlc[70],_binlc[86],_binlc[102],_binlc[118]])
-    emblc_c.extend([_binlc[7], _binlc[23],_binlc[39],_binlc[55],_binlc[71],_binlc[87],_binlc[103],_binlc[119]])
-    
-    emblc_d = bitarray(endian='big')
-    emblc_d.extend([_binlc[8], _binlc[24],_binlc[40],_binlc[56],_binlc[72],_binlc[88],_binlc[104],_binlc[120]])
-    emblc_d.extend([_binlc[9], _binlc[24],_binlc[41],_binlc[57],_binlc[73],_binlc[89],_binlc[105],_binlc[121]])
-    emblc_d.extend([_binlc[10],_binlc[26],_binlc[42],_binlc[58],_binlc[74],_binlc[90],_binlc[106],_binlc[122]])
-    emblc_d.extend([_binlc[11],_binlc[27],_binlc[43],_binlc[59],_binlc[75],_binlc[91],_binlc[107],_binlc[123]])
-    
-    emblc_e = bitarray(endian='big')
-    emblc_e.extend([_binlc[12],_binlc[28],_binlc[44],_binlc[60],_binlc[76],_binlc[92],_binlc[108],_binlc[124]])
-    emblc_e.extend([_binlc[13],_binlc[29],_binlc[45],_binlc[61],_binlc[77],_binlc[93],_binlc[109],_binlc[125]])
-    emblc_e.extend([_binlc[14],_binlc[30],_binlc[46],_binlc[62],_binlc[78],_binlc[94],_binlc[110],_binlc[126]])
-    emblc_e.extend([_binlc[15],_binlc[31],_binlc[47],_binlc[63],_binlc[79],_binlc[95],_binlc[111],_binlc[127]])
-    
-    return({1: emblc_b, 2: emblc_c, 3: emblc_d, 4: emblc_e})
+    _emb = encode_emblc_int(_lc)
+    return({1: int_to_bits(_emb[1], 32), 2: int_to_bits(_emb[2], 32), 3: int_to_bits(_emb[3], 32), 4: int_to_bits(_emb[4], 32)})
@@ -38,4 +38,9 @@ def csum5(_data):
     csum.frombytes(accum)
     del csum[0:3]
 
-    return csum
\ No newline at end of file
+    return csum
+
+# Same as csum5(), returning the 5-bit checksum as an integer
+def csum5_int(_data):
+    assert len(_data) == 9, 'csum5 expected 9 bytes of data and got something else'
+    return sum(_data) % 31
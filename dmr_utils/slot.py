@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+#
+# Digital Voice Modem - Fixed Network Equipment
+# GPLv2 Open Source. Use is subject to license terms.
+# DO NOT ALTER OR REMOVE COPYRIGHT NOTICES OR THIS FILE HEADER.
+#
+# @package DVM / FNE
+#
+###############################################################################
+#   Copyright (C) 2017-2021 Bryan Biedenkapp <gatekeep@gmail.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+from __future__ import print_function
+
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     This implements the base for per-slot state objects. State is held in
+#     __slots__ attributes; subclasses declare their fields in __slots__.
+#
+#     For compatibility with code (and report consumers) that expect the old
+#     nested dictionaries, fields can also be accessed by name with [], and
+#     as_dict() returns a plain dictionary copy of the state (which is also
+#     what is pickled).
+# ---------------------------------------------------------------------------
+
+class slotState(object):
+    __slots__ = ()
+
+    _FIELDS = {}
+
+    @classmethod
+    def fields(cls):
+        try:
+            return slotState._FIELDS[cls]
+        except KeyError:
+            _fields = []
+            for _cls in reversed(cls.__mro__):
+                for _field in _cls.__dict__.get('__slots__', ()):
+                    if _field not in _fields:
+                        _fields.append(_field)
+            slotState._FIELDS[cls] = tuple(_fields)
+            return slotState._FIELDS[cls]
+
+    def keys(self):
+        return self.fields()
+
+    def as_dict(self):
+        _state = {}
+        for _field in self.fields():
+            _state[_field] = getattr(self, _field, None)
+        return _state
+
+    def __getitem__(self, _key):
+        if _key not in self.fields():
+            raise KeyError(_key)
+        return getattr(self, _key)
+
+    def __setitem__(self, _key, _value):
+        if _key not in self.fields():
+            raise KeyError(_key)
+        setattr(self, _key, _value)
+
+    def __contains__(self, _key):
+        return _key in self.fields()
+
+    def __getstate__(self):
+        return self.as_dict()
+
+    def __setstate__(self, _state):
+        for _field, _value in _state.items():
+            setattr(self, _field, _value)
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, self.as_dict())
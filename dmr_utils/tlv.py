@@ -33,13 +33,13 @@ from bitarray import bitarray
 from bitstring import BitArray
 from bitstring import BitString
 import struct
-from time import time, sleep
+from time import time
 from importlib import import_module
 from binascii import b2a_hex as ahex
 from random import randint
 import sys, socket, configparser, traceback
-from threading import Lock
-from time import time, sleep, clock, localtime, strftime
+from collections import deque
+from time import time, localtime, strftime
 from pprint import pprint
 
 # Twisted is pretty important, so I keep it separate
@@ -49,8 +49,10 @@ from twisted.internet import task
 
 # Things we import from the core modules
 from fne.fne_core import int_to_bytes, bytes_to_int, short_to_bytes
+from fne.fne_log import lazy_ahex
 
 from dmr_utils import lc, bptc, const, golay, qr, rs129
+from dmr_utils.slot import slotState
 
 from ipsc.ipsc_const import *
 from dmr_utils.const import *
@@ -71,6 +73,12 @@ TAG_AMBE_72     = 0x0B      # AMBE frame of 72 bit samples (FNE)
 
 TAG_DMR_TEST    = 0xFF
 
+# Interval (in seconds) between DMR frames, and the maximum number of frames
+# held per slot by the playout scheduler (i.e. to absorb bursts from the
+# gateway)
+PLAYOUT_INTERVAL = 0.06
+PLAYOUT_DEPTH = 25
+
 # ---------------------------------------------------------------------------
 #   Globals
 # ---------------------------------------------------------------------------
@@ -92,7 +100,10 @@ voice_flag         = lambda _slot, _vf: (0x80 if (_slot == 2) else 0) | (0x10 if
 #
 # ---------------------------------------------------------------------------
 
-class SLOT:
+class SLOT(slotState):
+    __slots__ = ('src_id', 'dst_id', 'peer_id', 'slot', 'cc', 'type', 'stream_id', 'frame_count', 'start_time', 'time', 'group',
+                 'secure', 'alg_id', 'key_id', 'mi')
+
     def __init__(self, _slot, _src_id, _dst_id, _peer_id, _cc):
         self.src_id = _src_id                               # Source ID
         self.dst_id = _dst_id                               # Destination ID (TG)
@@ -117,6 +128,8 @@ class SLOT:
 # ---------------------------------------------------------------------------
 
 class RX_SLOT(SLOT):
+    __slots__ = ('vf', 'seq', 'emblc')
+
     def __init__(self, _slot, _src_id, _dst_id, _peer_id, _cc):
         SLOT.__init__(self, _slot, _src_id, _dst_id, _peer_id, _cc)
         self.vf = 0                                         # Voice Frame (A-F in DMR spec)
@@ -129,11 +142,99 @@ class RX_SLOT(SLOT):
 # ---------------------------------------------------------------------------
 
 class TX_SLOT(SLOT):
+    __slots__ = ('lastSeq', 'lostFrame')
+
     def __init__(self, _slot, _src_id, _dst_id, _peer_id, _cc):
         SLOT.__init__(self, _slot, _src_id, _dst_id, _peer_id, _cc)
         self.lastSeq = 0                                    # Used to look for gaps in seq numbers
         self.lostFrame = 0                                  # Number of lost frames in a single session
 
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     Per-slot playout scheduler; queued sends are run in order from the
+#     reactor, each no earlier than its gap after the previous send on the
+#     slot. Sends keep to exact boundaries (i.e. every 60ms) while the queue
+#     is busy, and resynchronize once it has been idle.
+# ---------------------------------------------------------------------------
+
+class tlvPlayout:
+    def __init__(self, _name, _logger, _depth = PLAYOUT_DEPTH):
+        self._system = _name
+        self._logger = _logger
+        self._depth = _depth
+
+        self._queues = {1: deque(), 2: deque()}
+        self._timers = {1: None, 2: None}
+        self._last = {1: 0, 2: 0}
+        self._overflow = {1: False, 2: False}
+
+        # frames dropped on each slot (buffer full) since the slot was cleared
+        self.dropped = {1: 0, 2: 0}
+
+    # Queue _func(*_args) to be run on the slot, at least _gap seconds after
+    # the previous send on the slot
+    def queue(self, _slot, _gap, _func, *_args):
+        _queue = self._queues[_slot]
+        if len(_queue) >= self._depth:
+            if self._overflow[_slot] == False:
+                self._overflow[_slot] = True
+                self._logger.warning('(%s) TS %s playout buffer full, dropping frames', self._system, _slot)
+            self.dropped[_slot] += 1
+            return
+
+        _queue.append((_gap, _func, _args))
+        if self._timers[_slot] == None:
+            self.schedule(_slot)
+
+    def schedule(self, _slot):
+        _gap = self._queues[_slot][0][0]
+        _delay = (self._last[_slot] + _gap) - time()
+        if _delay <= 0:
+            self._timers[_slot] = None
+            self.run(_slot)
+        else:
+            self._timers[_slot] = reactor.callLater(_delay, self.run, _slot)
+
+    def run(self, _slot):
+        _now = time()
+        _queue = self._queues[_slot]
+        while _queue:
+            _gap, _func, _args = _queue[0]
+            _due = self._last[_slot] + _gap
+            if _due > _now:
+                self._timers[_slot] = reactor.callLater(_due - _now, self.run, _slot)
+                return
+
+            _queue.popleft()
+
+            # stay on the frame boundary unless we have fallen a whole
+            # gap behind (i.e. the queue was idle)
+            if (_now - _due) < _gap:
+                self._last[_slot] = _due
+            else:
+                self._last[_slot] = _now
+
+            _func(*_args)
+
+        self._timers[_slot] = None
+        self._overflow[_slot] = False
+
+    # Drop everything queued for the slot (i.e. left over from the previous
+    # stream when a new one starts), and restart the slot's drop count
+    def clear(self, _slot):
+        if (self._timers[_slot] != None) and self._timers[_slot].active():
+            self._timers[_slot].cancel()
+        self._timers[_slot] = None
+
+        if self._queues[_slot]:
+            self._logger.info('(%s) TS %s playout dropped %s frames left from the previous stream', self._system, _slot, len(self._queues[_slot]))
+            self._queues[_slot].clear()
+        self._overflow[_slot] = False
+        self.dropped[_slot] = 0
+
+    def __len__(self):
+        return len(self._queues[1]) + len(self._queues[2])
+
 # ---------------------------------------------------------------------------
 #   Class Declaration
 #
@@ -151,6 +252,9 @@ class tlvBase:
 
         self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 
+        self.playout = tlvPlayout(_name, _logger)           # Frames to the network, paced at the DMR frame rate
+        self.export = tlvPlayout(_name, _logger)            # TLVs to the gateway
+
         self._slot = 2                                      # "current slot"
         self.rx = [0, RX_SLOT(1, 0, 0, 0, 1), RX_SLOT(2, 0, 0, 0, 1)]
         self.tx = [0, TX_SLOT(1, 0, 0, 0, 1), TX_SLOT(2, 0, 0, 0, 1)]
@@ -219,6 +323,7 @@ class tlvBase:
                                 _rx_slot.group = True
 
                         _rx_slot.stream_id = randint(0, 0xFFFFFFFF)   # Every stream has a unique ID
+                        self.playout.clear(_slot)
                         self._logger.info('(%s) TLV BEGIN_TX, STREAM ID %s SRC_ID %s PEER %s GROUP %s TGID %s TS %s', \
                                         self._system, _rx_slot.stream_id, _rx_slot.src_id, _rx_slot.peer_id, group, _rx_slot.dst_id, _slot)
                         self.send_voice_header(_rx_slot)
@@ -240,7 +345,8 @@ class tlvBase:
                         if _rx_slot.frame_count > 0:
                             self.send_voice_term(_rx_slot)
                         
-                        self._logger.info('(%s) TLV END_TX, STREAM ID %d FRAMES %d', self._system, _rx_slot.stream_id, _rx_slot.frame_count)
+                        self._logger.info('(%s) TLV END_TX, STREAM ID %d FRAMES %d DROPPED %d', self._system, _rx_slot.stream_id, _rx_slot.frame_count,
+                                          self.playout.dropped[_slot])
                         
                         # set it back to zero so any random AMBE frames are ignored.
                         _rx_slot.frame_count = 0
@@ -259,11 +365,10 @@ class tlvBase:
                     elif (t == TAG_DMR_TEST):
                         _rx_slot.dst_id = int(v.split('=')[1])
                         self._logger.info('(%s) TLV DMR_TEST, TGID %d TS %d', self._system, _rx_slot.dst_id, _rx_slot.slot)
-                        #TODO: fix this thread
-                        thread.start_new_thread(self.sendBlankAmbe, (_rx_slot, randint(0,0xFFFFFFFF), 5 * 60 * 500))
+                        self.sendBlankAmbe(_rx_slot, randint(0,0xFFFFFFFF), 5 * 60 * 500)
                             
                     else:
-                        self._logger.info('(%s) TLV unknown, T %d L %d, V %s', self._system, t, ord(l), ahex(v))
+                        self._logger.info('(%s) TLV unknown, T %d L %d, V %s', self._system, t, ord(l), lazy_ahex(v))
             else:
                 self._logger.info('(%s) EOF on UDP stream', self._system)
 
@@ -275,18 +380,31 @@ class tlvBase:
         for _gateway in self._gateways:
             self._sock.sendto(_tlv, _gateway)
 
+    # Queue a TLV for the gateway; it is sent after anything queued before it
+    # for the slot, and at least _gap seconds after the previous TLV
+    def queue_tlv(self, _slot, _tag, _value, _gap = 0):
+        self.export.queue(_slot, _gap, self.send_tlv, _tag, _value)
+
     # TG selection, send a simple blank voice frame to network
     def sendBlankAmbe(self, _rx_slot, _stream_id, _frames=1):
         _rx_slot.stream_id = _stream_id
+        self.playout.clear(_rx_slot.slot)
         self.send_voice_header(_rx_slot)
-        sleep(0.06)
-        silence = b'\xAC\AA\x40\x20\x00\x44\x40\x80\x80'
         self._logger.info('(%s) Silence %d frames', self._system, _frames)
-        while _frames > 0:
+        self.sendBlankAmbeFrame(_rx_slot, _stream_id, _frames)
+
+    # Generate the blank voice frames one at a time, so they never pile up in
+    # the playout buffer
+    def sendBlankAmbeFrame(self, _rx_slot, _stream_id, _frames):
+        if _rx_slot.stream_id != _stream_id:
+            return
+
+        if _frames > 0:
+            silence = b'\xAC\AA\x40\x20\x00\x44\x40\x80\x80'
             self.send_voice72(_rx_slot, silence + silence + silence)
-            sleep(0.06)
-            _frames = _frames - 1
-        self.send_voice_term(_rx_slot)
+            reactor.callLater(PLAYOUT_INTERVAL, self.sendBlankAmbeFrame, _rx_slot, _stream_id, _frames - 1)
+        else:
+            self.send_voice_term(_rx_slot)
 
     # Begin export call to partner                
     def begin_call(self, _slot, _group_call, _src_id, _dst_id, _peer_id, _cc, _seq, _stream_id):
@@ -296,10 +414,12 @@ class tlvBase:
 
         metadata = _src_id[0:3] + _peer_id[0:4] + _dst_id[0:3] + struct.pack('B', _slot) + struct.pack('B', _cc) + group
 
-        # start transmission
-        self.send_tlv(TAG_BEGIN_TX, metadata)    
+        # start transmission; anything still queued for the slot belongs to
+        # the previous call
+        self.export.clear(_slot)
+        self.queue_tlv(_slot, TAG_BEGIN_TX, metadata)
 
-        self._logger.info('Voice Transmission Start; slot = {}, dstId = {}, srcId = {}'.format(_slot, _dst_id, _src_id))
+        self._logger.info('Voice Transmission Start; slot = %s, dstId = %s, srcId = %s', _slot, _dst_id, _src_id)
 
         _tx_slot = self.tx[_slot]
         _tx_slot.slot = _slot
@@ -318,12 +438,10 @@ class tlvBase:
     def pi_params(self, _slot, _dst_id, _alg_id, _key_id, _mi):
         metadata = _dst_id[0:3] + int_to_bytes(_alg_id) + int_to_bytes(_key_id) + _mi[0:4] + struct.pack('B', _slot)
 
-        sleep(0.06)
-
-        # start transmission
-        self.send_tlv(TAG_PI_INFO, metadata)    
+        # start transmission; give the gateway a frame time after BEGIN_TX
+        self.queue_tlv(_slot, TAG_PI_INFO, metadata, PLAYOUT_INTERVAL)
 
-        self._logger.info('PI parameters; slot = {}, dstId = {}, algId = {}, kId = {}'.format(_slot, _dst_id, _alg_id, _key_id))
+        self._logger.info('PI parameters; slot = %s, dstId = %s, algId = %s, kId = %s', _slot, _dst_id, _alg_id, _key_id)
 
         _tx_slot = self.tx[_slot]
         _tx_slot.secure = True
@@ -334,12 +452,13 @@ class tlvBase:
     # End export call to partner                
     def end_call(self, _tx_slot):
         # end transmission
-        self.send_tlv(TAG_END_TX, struct.pack('B', _tx_slot.slot))
+        self.queue_tlv(_tx_slot.slot, TAG_END_TX, struct.pack('B', _tx_slot.slot))
         
         call_duration = time() - _tx_slot.start_time
         _lost_percentage = ((_tx_slot.lostFrame / float(_tx_slot.frame_count)) * 100.0) if _tx_slot.frame_count > 0 else 0.0
         
-        self._logger.info('Voice Transmission End; {:.2f} seconds loss rate: {:.2f}% ({}/{})'.format(call_duration, _lost_percentage, _tx_slot.frame_count - _tx_slot.lostFrame, _tx_slot.frame_count))
+        self._logger.info('Voice Transmission End; %.2f seconds loss rate: %.2f%% (%s/%s) playout drops: %s', call_duration, _lost_percentage,
+                          _tx_slot.frame_count - _tx_slot.lostFrame, _tx_slot.frame_count, self.export.dropped[_tx_slot.slot])
 
 # ---------------------------------------------------------------------------
 #   Class Declaration
@@ -367,7 +486,6 @@ class tlvFNE(tlvBase):
         dmr = self.encode_voice_header(_rx_slot)
         for j in range(0,2):
             self.send_fne_frame(_rx_slot, flag, dmr)
-            sleep(0.06)
 
     def send_pi_header(self, _rx_slot):
         flag = pi_header_flag(_rx_slot.slot)
@@ -405,7 +523,7 @@ class tlvFNE(tlvBase):
 
     # Export voice frame to partner (actually done in sub classes for 49 or 72 bits)               
     def export_voice(self, _tx_slot, _seq, _ambe):
-        self.send_tlv(TAG_AMBE_72, struct.pack('B', _tx_slot.slot) + _ambe) # send AMBE
+        self.queue_tlv(_tx_slot.slot, TAG_AMBE_72, struct.pack('B', _tx_slot.slot) + _ambe) # send AMBE
         if _seq != ((_tx_slot.lastSeq + 1) & 0xff):
             self._logger.warn('(%s) Seq number not found. Got %d expected %d', self._system, _seq, _tx_slot.lastSeq + 1)
             _tx_slot.lostFrame += 1
@@ -415,24 +533,24 @@ class tlvFNE(tlvBase):
     def send_fne_frame(self, _rx_slot, _flag, _dmr_frame):
         # Make the HB frame, ready to send
         frame = self.make_dmrd(_rx_slot.seq, _rx_slot.src_id, _rx_slot.dst_id, _rx_slot.peer_id, _flag, _rx_slot.stream_id, _dmr_frame)         
-        self.send_system(_rx_slot, frame)                   # Send  the frame to all peers or master
+        self.playout.queue(_rx_slot.slot, PLAYOUT_INTERVAL, self.send_system, _rx_slot.stream_id, frame) # Send the frame to all peers or master
         _rx_slot.seq += 1                                   # Convienent place for this increment
         _rx_slot.frame_count += 1                           # update count (used for stats and to make sure header was sent)
 
     # Override the super class because (1) DMO must be placed on slot 2 and (2) peer_id must be the ID of the client (TODO)
-    def send_system(self, _rx_slot, _frame):
+    def send_system(self, _stream_id, _frame):
         if hasattr(self._parent, '_peers'):
             _orig_flag = _frame[15]                         # Save off the flag since _frame is a reference
             for _peer in self._parent._peers:
                 _peerDict = self._parent._peers[_peer]
                 if _peerDict['TX_FREQ'] == _peerDict['RX_FREQ']:
                     if (self._DMOStreamID == 0) or (time() > self._DMOTimeout): # are we idle?
-                        self._DMOStreamID = _rx_slot.stream_id
+                        self._DMOStreamID = _stream_id
                         self._DMOTimeout = time() + 0.50
-                        self._logger.info('(%s) DMO Transition from idle to stream %d', self._system, _rx_slot.stream_id)
-                    if _rx_slot.stream_id != self._DMOStreamID: # packet is from wrong stream?
+                        self._logger.info('(%s) DMO Transition from idle to stream %d', self._system, _stream_id)
+                    if _stream_id != self._DMOStreamID: # packet is from wrong stream?
                         if (_frame[15] & 0x2F) == 0x21:     # Call start?
-                            self._logger.info('(%s) DMO Ignore traffic on stream %d', self._system, _rx_slot.stream_id)
+                            self._logger.info('(%s) DMO Ignore traffic on stream %d', self._system, _stream_id)
                         continue
                     if (_frame[15] & 0x2F) == 0x22:         # call terminator flag?
                         self._DMOStreamID = 0               # we are idle again
@@ -560,7 +678,6 @@ class tlvIPSC(tlvBase):
             frame = ipscHeader + rtpHeader + voiceHeader
 
             self.send_ipsc(_rx_slot.slot, frame)
-            sleep(0.06)
         pass
     
     def send_pi_header(self, _rx_slot):
@@ -628,19 +745,22 @@ class tlvIPSC(tlvBase):
 
     # Export voice frame to partner (actually done in sub classes for 49 or 72 bits)               
     def export_voice(self, _tx_slot, _seq, _ambe):
-        self.send_tlv(TAG_AMBE_49, struct.pack('B', _tx_slot.slot) + _ambe)    # send AMBE
+        self.queue_tlv(_tx_slot.slot, TAG_AMBE_49, struct.pack('B', _tx_slot.slot) + _ambe)    # send AMBE
         if _seq != ((_tx_slot.lastSeq + 1) & 0xff):
             self._logger.warn('(%s) Seq number not found. Got %d expected %d', self._system, _seq, _tx_slot.lastSeq + 1)
             _tx_slot.lostFrame += 1
         _tx_slot.lastSeq = _seq
 
     def send_ipsc(self, _slot, _frame):
+        self.playout.queue(_slot, PLAYOUT_INTERVAL, self.write_ipsc, _slot, _frame)
+        self.rx[_slot].frame_count += 1      # update count (used for stats and to make sure header was sent)
+
+    def write_ipsc(self, _slot, _frame):
         if (time() - self._parent._busy_slots[_slot]) >= 0.10 : # slot is not busy so it is safe to transmit
             # Send the packet to all peers in the target IPSC
             self._parent.send_to_ipsc(_frame)
         else:
-            self._logger.info('Slot {} is busy, will not transmit packet from gateway'.format(_slot))
-        self.rx[_slot].frame_count += 1      # update count (used for stats and to make sure header was sent)
+            self._logger.info('Slot %s is busy, will not transmit packet from gateway', _slot)
 
     def generate_ipsc_voice_header(self, _rx_slot):
         src_id = struct.pack('>I', _rx_slot.src_id)
@@ -170,7 +170,7 @@ if __name__ == '__main__':
     import os
     import sys
     import signal
-    from fne.fne_core import mk_id_dict
+    from fne.fne_core import mk_id_set
 
     from ipsc.dmrlink_log import config_logging    
     from ipsc.dmrlink_config import build_config
@@ -206,11 +206,11 @@ if __name__ == '__main__':
     observer.start()
 
     # Make Dictionaries
-    white_rids = mk_id_dict(config['Aliases']['Path'], config['Aliases']['WhitelistRIDsFile'])
+    white_rids = mk_id_set(config['Aliases']['Path'], config['Aliases']['WhitelistRIDsFile'])
     if white_rids:
         logger.info('ID MAPPER: white_rids dictionary is available')
 
-    black_rids = mk_id_dict(config['Aliases']['Path'], config['Aliases']['BlacklistRIDsFile'])
+    black_rids = mk_id_set(config['Aliases']['Path'], config['Aliases']['BlacklistRIDsFile'])
     if black_rids:
         logger.info('ID MAPPER: black_rids dictionary is available')
     
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+#
+# Digital Voice Modem - Fixed Network Equipment
+# GPLv2 Open Source. Use is subject to license terms.
+# DO NOT ALTER OR REMOVE COPYRIGHT NOTICES OR THIS FILE HEADER.
+#
+# @package DVM / FNE
+#
+###############################################################################
+#   Copyright (C) 2017-2021 Bryan Biedenkapp <gatekeep@gmail.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+###############################################################################
+from __future__ import print_function
+
+import ctypes
+import ctypes.util
+import socket
+import struct
+
+# sendmmsg(2) is only available on Linux; where it (or libc) can't be found
+# batched sending falls back to writing each datagram individually
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno = True)
+    _sendmmsg = _libc.sendmmsg
+    _sendmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+    _sendmmsg.restype = ctypes.c_int
+except (OSError, AttributeError, TypeError):
+    _sendmmsg = None
+
+# Maximum number of datagrams handed to a single sendmmsg() call
+MAX_BATCH = 1024
+
+# ---------------------------------------------------------------------------
+#   Structure Declarations
+# ---------------------------------------------------------------------------
+
+class iovec(ctypes.Structure):
+    _fields_ = [
+        ('iov_base', ctypes.c_void_p),
+        ('iov_len', ctypes.c_size_t),
+    ]
+
+class msghdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_name', ctypes.c_void_p),
+        ('msg_namelen', ctypes.c_uint32),
+        ('msg_iov', ctypes.POINTER(iovec)),
+        ('msg_iovlen', ctypes.c_size_t),
+        ('msg_control', ctypes.c_void_p),
+        ('msg_controllen', ctypes.c_size_t),
+        ('msg_flags', ctypes.c_int),
+    ]
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_hdr', msghdr),
+        ('msg_len', ctypes.c_uint),
+    ]
+
+# ---------------------------------------------------------------------------
+#   Module Routines
+# ---------------------------------------------------------------------------
+
+# Returns True if batched sending is supported on this platform
+def batch_supported():
+    return _sendmmsg != None
+
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     Sends one datagram to many destinations on a UDP transport with as few
+#     sendmmsg() calls as possible. Anything that can't be batched (IPv6
+#     destinations, or datagrams left over after a short or failed
+#     sendmmsg()) is written individually with the transport instead.
+# ---------------------------------------------------------------------------
+
+class batchSender(object):
+    def __init__(self, _transport):
+        self._transport = _transport
+        self._fd = _transport.socket.fileno()
+
+        # every message points at the same (single) iovec, since the same
+        # datagram is sent to all destinations
+        self._iov = iovec()
+
+        # (IP, port) -> (packed sockaddr_in, packed mmsghdr), or None if the
+        # address can't be batched
+        self._hdrs = {}
+
+        self.datagrams = 0
+        self.syscalls = 0
+
+    def get_hdr(self, _addr):
+        try:
+            return self._hdrs[_addr]
+        except KeyError:
+            try:
+                _sockaddr = ctypes.create_string_buffer(struct.pack('=H', socket.AF_INET) + struct.pack('>H', _addr[1]) +
+                                                        socket.inet_aton(_addr[0]) + (b'\x00' * 8), 16)
+            except (OSError, struct.error, TypeError):
+                self._hdrs[_addr] = None
+                return None
+
+            _msg = mmsghdr()
+            _msg.msg_hdr.msg_name = ctypes.addressof(_sockaddr)
+            _msg.msg_hdr.msg_namelen = 16
+            _msg.msg_hdr.msg_iov = ctypes.pointer(self._iov)
+            _msg.msg_hdr.msg_iovlen = 1
+
+            # the sockaddr buffer is kept with the header, so the pointer to it
+            # stays valid for as long as the header is cached
+            self._hdrs[_addr] = (_sockaddr, ctypes.string_at(ctypes.addressof(_msg), ctypes.sizeof(_msg)))
+            return self._hdrs[_addr]
+
+    # Forget cached destination addresses (i.e. when the peer list changes)
+    def clear(self):
+        self._hdrs.clear()
+
+    def sendto(self, _packet, _addrs):
+        _batch = []
+        _hdrs = []
+        for _addr in _addrs:
+            _hdr = self.get_hdr(_addr)
+            if _hdr == None:
+                self.write(_packet, _addr)
+                continue
+
+            _batch.append(_addr)
+            _hdrs.append(_hdr[1])
+
+        if not _batch:
+            return
+
+        _buffer = ctypes.create_string_buffer(_packet, len(_packet))
+        self._iov.iov_base = ctypes.addressof(_buffer)
+        self._iov.iov_len = len(_packet)
+
+        for _idx in range(0, len(_batch), MAX_BATCH):
+            self.flush(_packet, _batch[_idx:_idx + MAX_BATCH], b''.join(_hdrs[_idx:_idx + MAX_BATCH]))
+
+    def flush(self, _packet, _batch, _hdrs):
+        _msgs = ctypes.create_string_buffer(_hdrs, len(_hdrs))
+        _sent = _sendmmsg(self._fd, ctypes.addressof(_msgs), len(_batch), 0)
+        self.syscalls += 1
+        if _sent > 0:
+            self.datagrams += _sent
+        else:
+            _sent = 0
+
+        # anything the kernel didn't take is written individually
+        for _addr in _batch[_sent:]:
+            self.write(_packet, _addr)
+
+    def write(self, _packet, _addr):
+        self._transport.write(_packet, _addr)
+        self.datagrams += 1
+        self.syscalls += 1
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+#
+# Digital Voice Modem - Fixed Network Equipment
+# GPLv2 Open Source. Use is subject to license terms.
+# DO NOT ALTER OR REMOVE COPYRIGHT NOTICES OR THIS FILE HEADER.
+#
+# @package DVM / FNE
+#
+###############################################################################
+#   Copyright (C) 2017-2021 Bryan Biedenkapp <gatekeep@gmail.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+###############################################################################
+from __future__ import print_function
+
+import mmap
+import os
+import struct
+
+from time import time
+
+# Capture file layout; a fixed header followed by the ring itself. The header
+# holds the ring size, the offsets of the next write (head) and the oldest
+# record (tail), the number of records in the ring and the number of records
+# ever written
+CAPTURE_MAGIC = b'DVMCAP01'
+FILE_HEADER = struct.Struct('>8sIIIIQ')
+RING_OFFSET = 32
+
+# Each record; total length, timestamp, direction, system name length, remote
+# host length, remote port and local port. The system name, remote host and
+# raw datagram follow the header. A zero length marks the ring wrapping
+RECORD_HEADER = struct.Struct('>HdBBBHH')
+RECORD_MAX = 0xFFFF
+
+# Record directions
+CAPTURE_RX = 0
+CAPTURE_TX = 1
+
+# Default ring size (in megabytes)
+CAPTURE_SIZE = 16
+
+# Capture rings opened by this process; path -> captureRing
+_rings = {}
+
+# ---------------------------------------------------------------------------
+#   Module Routines
+# ---------------------------------------------------------------------------
+
+# Returns the capture ring for the given file, opening (or creating) it the
+# first time; every system in a process shares the one ring
+def open_capture(_path, _size = CAPTURE_SIZE):
+    _path = os.path.realpath(_path)
+    if _path not in _rings:
+        _rings[_path] = captureRing(_path, _size * 1024 * 1024)
+    return _rings[_path]
+
+# Generator returning the records in a capture file, oldest first, as
+# (timestamp, direction, system, (host, port), local port, data) tuples
+def read_capture(_path):
+    with open(_path, 'rb') as _file:
+        _buf = _file.read()
+
+    if len(_buf) < RING_OFFSET:
+        raise ValueError('{} is not a capture file'.format(_path))
+    _magic, _size, _head, _tail, _live, _total = FILE_HEADER.unpack_from(_buf, 0)
+    if _magic != CAPTURE_MAGIC or len(_buf) < RING_OFFSET + _size:
+        raise ValueError('{} is not a capture file'.format(_path))
+
+    _pos = _tail
+    for _idx in range(_live):
+        if _pos + 2 > _size or struct.unpack_from('>H', _buf, RING_OFFSET + _pos)[0] == 0:
+            _pos = 0
+
+        _off = RING_OFFSET + _pos
+        _len, _ts, _dir, _sys_len, _host_len, _port, _lport = RECORD_HEADER.unpack_from(_buf, _off)
+        _off += RECORD_HEADER.size
+        _system = _buf[_off:_off + _sys_len].decode('utf-8', 'replace')
+        _off += _sys_len
+        _host = _buf[_off:_off + _host_len].decode('utf-8', 'replace')
+        _off += _host_len
+        _data = _buf[_off:RING_OFFSET + _pos + _len]
+
+        yield (_ts, _dir, _system, (_host, _port), _lport, _data)
+        _pos += _len
+
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     Fixed-size, memory-mapped binary packet capture ring. Datagrams are
+#     copied straight into the mapping with a small fixed header; once the
+#     ring is full the oldest records are overwritten. The file is left
+#     behind for tools/capture_export.py to turn into pcap or text.
+# ---------------------------------------------------------------------------
+
+class captureRing(object):
+    def __init__(self, _path, _size):
+        self._path = _path
+        self._size = _size
+
+        _fd = os.open(_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(_fd, RING_OFFSET + _size)
+            self._map = mmap.mmap(_fd, RING_OFFSET + _size)
+        finally:
+            os.close(_fd)
+
+        # always start a fresh ring
+        self._head = 0
+        self._tail = 0
+        self._live = 0
+        self._total = 0
+        self.update()
+
+    def update(self):
+        FILE_HEADER.pack_into(self._map, 0, CAPTURE_MAGIC, self._size, self._head, self._tail, self._live, self._total)
+
+    # Advance the tail past any records in [_start, _end) that are about to
+    # be overwritten
+    def reclaim(self, _start, _end):
+        while self._live > 0 and self._tail >= _start and self._tail < _end:
+            if self._tail + 2 > self._size:
+                self._tail = 0
+                continue
+
+            _len = struct.unpack_from('>H', self._map, RING_OFFSET + self._tail)[0]
+            if _len == 0:
+                self._tail = 0
+                continue
+
+            self._tail += _len
+            self._live -= 1
+
+            # nothing can start this close to the end of the ring; the next
+            # record is at the start
+            if self._tail + 2 > self._size:
+                self._tail = 0
+
+    def write(self, _dir, _system, _lport, _addr, _data):
+        _sys = _system.encode()[:255]
+        _host = str(_addr[0]).encode()[:255]
+        _len = RECORD_HEADER.size + len(_sys) + len(_host)
+        _data = _data[:RECORD_MAX - _len]
+        _len += len(_data)
+        if _len > self._size:
+            return
+
+        _head = self._head
+        if _head + _len > self._size:
+            self.reclaim(_head, self._size)
+            if _head + 2 <= self._size:
+                struct.pack_into('>H', self._map, RING_OFFSET + _head, 0)
+            _head = 0
+
+        self.reclaim(_head, _head + _len)
+        if self._live == 0:
+            self._tail = _head
+
+        _off = RING_OFFSET + _head
+        RECORD_HEADER.pack_into(self._map, _off, _len, time(), _dir, len(_sys), len(_host), _addr[1], _lport)
+        _off += RECORD_HEADER.size
+        self._map[_off:_off + len(_sys)] = _sys
+        _off += len(_sys)
+        self._map[_off:_off + len(_host)] = _host
+        _off += len(_host)
+        self._map[_off:_off + len(_data)] = _data
+
+        self._head = _head + _len
+        self._live += 1
+        self._total += 1
+        self.update()
+
+    def close(self):
+        self._map.flush()
+        self._map.close()
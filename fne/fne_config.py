@@ -51,7 +51,12 @@ def build_config(_config_file):
                     'Path': config.get(section, 'Path'),
                     'PingTime': config.getint(section, 'PingTime'),
                     'MaxMissed': config.getint(section, 'MaxMissed'),
-                    'RconTool': config.get(section, 'RconTool')
+                    'RconTool': config.get(section, 'RconTool'),
+                    'BatchSend': config.getboolean(section, 'BatchSend', fallback = False),
+                    'JitterBuffer': config.getboolean(section, 'JitterBuffer', fallback = False),
+                    'JitterDepth': config.getint(section, 'JitterDepth', fallback = 2),
+                    'JitterMaxDepth': config.getint(section, 'JitterMaxDepth', fallback = 8),
+                    'Workers': config.getint(section, 'Workers', fallback = 1)
                 })
 
             elif section == 'Reports':
@@ -59,7 +64,10 @@ def build_config(_config_file):
                     'Report': config.getboolean(section, 'Report'),
                     'ReportInterval': config.getint(section, 'ReportInterval'),
                     'ReportPort': config.getint(section, 'ReportPort'),
-                    'ReportClients': config.get(section, 'ReportClients').split(',')
+                    'ReportClients': config.get(section, 'ReportClients').split(','),
+                    'HookStats': config.getboolean(section, 'HookStats', fallback = False),
+                    'ClientQueueSize': config.getint(section, 'ClientQueueSize', fallback = 1024),
+                    'LegacyReports': config.getboolean(section, 'LegacyReports', fallback = True)
                 })
 
             elif section == 'Log':
@@ -68,11 +76,17 @@ def build_config(_config_file):
                     'LogHandlers': config.get(section, 'LogHandlers'),
                     'LogLevel': config.get(section, 'LogLevel'),
                     'LogName': config.get(section, 'LogName'),
+                    'LogQueue': config.getboolean(section, 'LogQueue', fallback = False),
                     'RawPacketTrace': config.getboolean(section, 'RawPacketTrace'),
+                    'CaptureFile': config.get(section, 'CaptureFile', fallback = 'fne_capture.bin'),
+                    'CaptureSize': config.getint(section, 'CaptureSize', fallback = 16),
                     'AllowActTrans': config.getboolean(section, 'AllowActTrans'),
                     'AllowDiagTrans': config.getboolean(section, 'AllowDiagTrans'),
                     'ActivityLogFile': config.get(section, 'ActivityLogFile'),
-                    'DiagLogPath': config.get(section, 'DiagLogPath')
+                    'ActivityLogSize': config.getint(section, 'ActivityLogSize', fallback = 1),
+                    'ActivityLogBackups': config.getint(section, 'ActivityLogBackups', fallback = 1),
+                    'DiagLogPath': config.get(section, 'DiagLogPath'),
+                    'DiagLogMaxOpen': config.getint(section, 'DiagLogMaxOpen', fallback = 64)
                 })
 
             elif section == 'Aliases':
@@ -28,8 +28,16 @@
 from __future__ import print_function
 
 import subprocess
+import logging
 import socket
+import struct
 import pickle
+import os
+import sys
+
+from array import array
+from bisect import bisect_left
+from collections import deque
 
 from binascii import b2a_hex as ahex
 from binascii import a2b_hex as bhex
@@ -40,21 +48,33 @@ from bitstring import BitArray
 from csv import reader as csv_reader
 from csv import DictReader as csv_dict_reader
 
+from zope.interface import implementer
+
 from twisted.python import log
+from twisted.internet.interfaces import IPushProducer
 from twisted.internet.protocol import DatagramProtocol, Factory, Protocol
 from twisted.protocols.basic import NetstringReceiver
 from twisted.internet import reactor, task
 
 from fne import fne_config
 from fne import fne_log
+from fne.fne_log import lazy_ahex
 from fne import fne_const
+from fne.fne_batch import batchSender, batch_supported
+from fne.fne_jitter import jitterBuffer
+from fne.fne_capture import open_capture, CAPTURE_RX, CAPTURE_TX
+from fne.fne_stats import hookStats, STATS_HOOKS, DROP_ACL, DROP_IGNORED
+from fne.fne_logfile import bufferedLogFile, logFilePool
+from fne.fne_state import stateStore, STATE_ALL
 import json
 
+from dmr_utils.slot import slotState
+
 # Global variables used whether we are a module or __main__
 systems = {}
-_act_log_lock = False
-#TODO: fix this, but for now it's a quick little hack to get running
-open_logfiles = {}
+
+# Pool of open peer diagnostics logs; shared by every system in the process
+diag_logs = None
 
 # Opcodes for the network-based reporting protocol
 REPORT_OPCODES = {
@@ -69,8 +89,20 @@ REPORT_OPCODES = {
     'GRP_AFF_UPD': b'\x08',
     'RCON_REQ': b'\x09',
     'WHITELIST_RID_UPD': b'\x10',
+    'HOOK_STATS': b'\x11',
+    'STATE_SNAPSHOT': b'\x12',
+    'STATE_DELTA': b'\x13',
 }
 
+# Report messages that carry the whole of some state; a client only needs the
+# latest of each
+REPORT_LATEST_OPCODES = (REPORT_OPCODES['HOOK_STATS'], REPORT_OPCODES['CONFIG_RSP'], REPORT_OPCODES['RRULES_RSP'],
+                         REPORT_OPCODES['GRP_AFF_UPD'], REPORT_OPCODES['WHITELIST_RID_UPD'])
+
+# Report messages that carry state; queued state is coalesced rather than
+# dropped
+REPORT_STATE_OPCODES = (REPORT_OPCODES['STATE_SNAPSHOT'], REPORT_OPCODES['STATE_DELTA']) + REPORT_LATEST_OPCODES
+
 # ---------------------------------------------------------------------------
 #   Module Routines
 # ---------------------------------------------------------------------------
@@ -91,15 +123,19 @@ def setup_fne():
     parser = argparse.ArgumentParser()
     parser.add_argument('-c', '--config', action = 'store', dest = 'ConfigFile', help = '/full/path/to/config.file (usually fne.cfg)')
     parser.add_argument('-l', '--logging', action = 'store', dest = 'LogLevel', help = 'Override config file logging level.')
+    parser.add_argument('--shard', action = 'store', dest = 'Shard', type = int, help = argparse.SUPPRESS) # used by multi-process workers
     cli_args = parser.parse_args()
 
     # Ensure we have a path for the config file, if one wasn't specified, then
     # use the execution directory
     if not cli_args.ConfigFile:
         cli_args.ConfigFile = os.path.dirname(os.path.abspath(__file__)) + '/fne.cfg'
+    cli_args.ConfigFile = os.path.abspath(cli_args.ConfigFile)
 
     # Call the external routine to build the configuration dictionary
     config = fne_config.build_config(cli_args.ConfigFile)
+    config['Global']['ConfigFile'] = cli_args.ConfigFile
+    config['Global']['Shard'] = cli_args.Shard
     
     # Call the external routing to start the system logger
     if cli_args.LogLevel:
@@ -142,8 +178,12 @@ def config_reports(_config, _logger, _factory):
     if _config['Reports']['Report']:
         def reporting_loop(_logger, _server):
             _logger.debug('Periodic reporting loop started')
-            _server.send_config()
-            _server.send_timed()
+            if _server.clients:
+                _server.send_state()
+                if _config['Reports']['LegacyReports']:
+                    _server.send_config()
+                    _server.send_timed()
+            _server.send_hook_stats()
             
         _logger.info('Reporting services configured')
         
@@ -163,61 +203,23 @@ def config_reports(_config, _logger, _factory):
    
     return report_server
 
-# Helper to split a file.
-def split_file(filePath, fin, percentage=0.50):
-    foutName = filePath + '.1'
-    with open(foutName, 'a+') as fout:
-        content = list(fin)
-        fin.seek(0)
-
-        nLines = sum(1 for line in fin)
-        fin.seek(0)
-
-        nTrain = int(nLines * percentage)
-        nValid = nLines - nTrain
-
-        fin.truncate()
-
-        i = 0
-        for line in content:
-            if (i < nTrain) or (nLines - i > nValid):
-                fout.write(line)
-                i += 1
-            else:
-                fin.write(line)
-
-        fout.flush()
-        fout.close()
-        fin.flush()
-        fin.seek(0, 2)
-
 # Helper to setup the system activity logs.
 def setup_activity_log(_config, _logger):
     if _config['Log']['AllowActTrans'] == False:
         return None
 
-    act_log_file = open(_config['Log']['ActivityLogFile'], "a+")
-    def act_log_split_loop(_actLogFile, _filePath):
-        global _act_log_lock
-        _actLogFile.seek(0)
-                
-        nLines = sum(1 for line in _actLogFile)
-        _actLogFile.seek(0)
-        if (nLines < 2048):
-            _actLogFile.seek(0, 2)
-        else:
-            _act_log_lock = True
-            split_file(_filePath, _actLogFile)
-            _actLogFile.seek(0, 2)
-            _act_log_lock = False
-            
+    # each multi-process worker writes (and rotates) its own activity log
+    _path = _config['Log']['ActivityLogFile']
+    if _config['Global'].get('Shard') != None:
+        _path += '.' + str(_config['Global']['Shard'])
+
+    act_log_file = bufferedLogFile(_path, _config['Log']['ActivityLogSize'] * 1024 * 1024,
+                                   _config['Log']['ActivityLogBackups'], _logger)
+    reactor.addSystemEventTrigger('before', 'shutdown', act_log_file.close)
+
     _logger.info('Activity Log Transfer services configured')
-        
-    logsplitter = task.LoopingCall(act_log_split_loop, act_log_file, _config['Log']['ActivityLogFile'])
-    logsplitter.start(3600)
     return (act_log_file)
 
-#TODO: make this into a class
 # Helpers for peer diagnostic logs.
 def get_peer_diag_log_filename(_config, _peer_id):
     if _config['Log']['AllowDiagTrans'] == False:
@@ -226,27 +228,21 @@ def get_peer_diag_log_filename(_config, _peer_id):
     diag_log_filepath = _config['Log']['DiagLogPath'] + str(_peer_id) + ".log"
     return (diag_log_filepath)
 
-def get_peer_diag_log_handler(_config, _logger, _peer_id):
-    global open_logfiles
+def get_peer_diag_logs(_config, _logger):
+    global diag_logs
     if _config['Log']['AllowDiagTrans'] == False:
         return None
 
-    if (_peer_id in open_logfiles):
-        diag_log_file = open_logfiles[_peer_id]
-        #print("Type of found logfile: {}".format(type(diag_log_file)))
-        
-    else:
-        diag_log_filepath = get_peer_diag_log_filename(_config, _peer_id)
-        diag_log_file = open(diag_log_filepath, "a+")
-        open_logfiles[_peer_id] = diag_log_file
+    if diag_logs == None:
+        diag_logs = logFilePool(_config['Log']['DiagLogMaxOpen'], _logger)
+        reactor.addSystemEventTrigger('before', 'shutdown', diag_logs.close)
 
-    return (diag_log_file)
+    return (diag_logs)
 
-def close_peer_logs():
-    global open_logfiles
-    for _peer_id in open_logfiles:
-        open_logfiles[_peer_id].close()
-    return True
+def close_peer_diag_log(_config, _logger, _peer):
+    if _peer['DIAG_LOG_FILE'] != None:
+        get_peer_diag_logs(_config, _logger).close_file(_peer['DIAG_LOG_FILE'])
+        _peer['DIAG_LOG_FILE'] = None
 
 # ---------------------------------------------------------------------------
 #   String Utility Routines
@@ -286,6 +282,58 @@ def short_to_bytes(numIn):
 def bytes_to_int(bytesIn):
     return int.from_bytes(bytesIn, "big")
 
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     Compact set of (32-bit) IDs, held as a sorted array; membership is a
+#     binary search. The aliases from the ID file are not kept in memory
+#     unless they are asked for with alias() or as_dict().
+# ---------------------------------------------------------------------------
+
+ID_TYPECODE = 'I' if array('I').itemsize == 4 else 'L'
+
+class idSet(object):
+    __slots__ = ('_ids', '_aliases', 'file', 'version')
+
+    def __init__(self, _ids = (), _file = None, _version = None):
+        self._ids = array(ID_TYPECODE, sorted(set(_ids)))
+        self._aliases = None
+        self.file = _file
+        self.version = _version
+
+    def __contains__(self, _id):
+        _idx = bisect_left(self._ids, _id)
+        return (_idx < len(self._ids)) and (self._ids[_idx] == _id)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def alias(self, _id):
+        if self._aliases == None:
+            self._aliases = {}
+            if self.file != None:
+                for _alias_id, _alias in mk_id_dict('', self.file).items():
+                    if _alias_id in self:
+                        self._aliases[_alias_id] = _alias
+        return self._aliases.get(_id, '')
+
+    # Plain {ID: alias} dictionary of the set (i.e. for report clients)
+    def as_dict(self):
+        _dict = {}
+        for _id in self._ids:
+            _dict[_id] = self.alias(_id)
+        return _dict
+
+    # IDs as packed big-endian 32-bit integers
+    def pack(self):
+        if sys.byteorder == 'big':
+            return self._ids.tobytes()
+        _ids = array(ID_TYPECODE, self._ids)
+        _ids.byteswap()
+        return _ids.tobytes()
+
 # ---------------------------------------------------------------------------
 #   Dictionary Routines
 # ---------------------------------------------------------------------------
@@ -293,15 +341,50 @@ def bytes_to_int(bytesIn):
 def mk_id_dict(_path, _file):
     dict = {}
     try:
-        with open(_path + _file, 'rU') as _handle:
+        with open(_path + _file, 'r', newline='') as _handle:
             ids = csv_reader(_handle, dialect='excel', delimiter=',')
             for row in ids:
-                dict[int(row[0])] = (row[1])
-            _handle.close
+                try:
+                    dict[int(row[0])] = (row[1])
+                except (IndexError, ValueError):
+                    continue
             return dict
     except IOError:
         return dict
 
+# Load an ID list (i.e. the RID whitelist/blacklist) into a compact idSet; if
+# _prev is given and the file hasn't changed since it was loaded (or can't be
+# read, or both are empty), _prev is returned as is
+def mk_id_set(_path, _file, _prev = None):
+    try:
+        _stat = os.stat(_path + _file)
+        _version = (_stat.st_mtime, _stat.st_size)
+    except OSError:
+        if _prev != None:
+            return _prev
+        return idSet()
+
+    if (_prev != None) and (_prev.file == _path + _file) and (_prev.version == _version):
+        return _prev
+
+    _ids = array(ID_TYPECODE)
+    try:
+        with open(_path + _file, 'r', newline='') as _handle:
+            for row in csv_reader(_handle, dialect='excel', delimiter=','):
+                try:
+                    _ids.append(int(row[0]))
+                except (IndexError, ValueError, OverflowError):
+                    continue
+    except IOError:
+        if _prev != None:
+            return _prev
+        return idSet()
+
+    if (_prev != None) and (len(_prev) == 0) and (len(_ids) == 0):
+        return _prev
+
+    return idSet(_ids, _path + _file, _version)
+
 # ---------------------------------------------------------------------------
 #   Class Declaration
 #     Used to parse out AMBE and send to gateway.
@@ -317,18 +400,20 @@ class AMBE:
         self._exp_port = self._CONFIG['AMBE']['Port']
 
     def parse_ambe(self, _client, _data):
-        _seq = bytes_to_int(_data[4:5])
-        _srcID = bytes_to_int(_data[5:8])
-        _dstID = bytes_to_int(_data[8:11])
-        _rptID = bytes_to_int(_data[11:15])
-        _bits = bytes_to_int(_data[15:16])       # SCDV NNNN (Slot|Call type|Data|Voice|Seq or Data type)
-        _slot = 2 if _bits & 0x80 else 1
-        _callType = 1 if (_bits & 0x40) else 0
-        _frameType = (_bits & 0x30) >> 4
-        _voiceSeq = (_bits & 0x0f)
-        _streamID = bytes_to_int(_data[16:20])
-        self._logger.debug('(%s) SEQ %d SRC_ID %d DST_ID %d PEER %d BITS %0X TS %d CALLTYPE %d FRAMETYPE %d VOICESEQ %d [STREAM ID %0X]', 
-                           _client, _seq, _srcID, _dstID, _rptID, _bits, _slot, _callType, _frameType, _voiceSeq, _streamID)
+        # the header is only decoded for the debug log
+        if self._logger.isEnabledFor(logging.DEBUG):
+            _seq = bytes_to_int(_data[4:5])
+            _srcID = bytes_to_int(_data[5:8])
+            _dstID = bytes_to_int(_data[8:11])
+            _rptID = bytes_to_int(_data[11:15])
+            _bits = bytes_to_int(_data[15:16])       # SCDV NNNN (Slot|Call type|Data|Voice|Seq or Data type)
+            _slot = 2 if _bits & 0x80 else 1
+            _callType = 1 if (_bits & 0x40) else 0
+            _frameType = (_bits & 0x30) >> 4
+            _voiceSeq = (_bits & 0x0f)
+            _streamID = bytes_to_int(_data[16:20])
+            self._logger.debug('(%s) SEQ %d SRC_ID %d DST_ID %d PEER %d BITS %0X TS %d CALLTYPE %d FRAMETYPE %d VOICESEQ %d [STREAM ID %0X]', 
+                               _client, _seq, _srcID, _dstID, _rptID, _bits, _slot, _callType, _frameType, _voiceSeq, _streamID)
 
         #self._logger.debug('Frame 1:(%s)', self.ByteToHex(_data))
         _dmr_frame = BitArray('0x' + ahex(_data[20:]))
@@ -373,12 +458,229 @@ class PacketData:
     def packet_datagramReceived(self, _data, hostInfo):   # hostInfo is tuple; converted from 2.x to 3.x syntax
         self._FNE.send_peers(_data)
 
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     Status information for a single timeslot of a system.
+# ---------------------------------------------------------------------------
+
+class slotStatus(slotState):
+    __slots__ = ('RX_START', 'RX_PEER_ID', 'RX_SEQ', 'RX_RFS', 'TX_RFS', 'RX_STREAM_ID', 'TX_STREAM_ID', 'RX_TGID', 'TX_TGID', 'TX_PI_TGID',
+                 'RX_TIME', 'TX_TIME', 'RX_TYPE', 'RX_LC', 'RX_PI_LC', 'TX_H_LC', 'TX_P_LC', 'TX_T_LC', 'TX_EMB_LC', 'P25_RX_CT')
+
+    def __init__(self):
+        self.RX_START = time()
+        self.RX_PEER_ID = 0
+        self.RX_SEQ = 0
+        self.RX_RFS = 0
+        self.TX_RFS = 0
+        self.RX_STREAM_ID = 0
+        self.TX_STREAM_ID = 0
+        self.RX_TGID = 0
+        self.TX_TGID = 0
+        self.TX_PI_TGID = 0
+        self.RX_TIME = time()
+        self.TX_TIME = time()
+        self.RX_TYPE = fne_const.DT_TERMINATOR_WITH_LC
+        self.RX_LC = 0
+        self.RX_PI_LC = 0
+        self.TX_H_LC = 0
+        self.TX_P_LC = 0
+        self.TX_T_LC = 0
+        # In TX_EMB_LC, 1-4 are burst B-E
+        self.TX_EMB_LC = {
+            1: 0,
+            2: 0,
+            3: 0,
+            4: 0,
+            }
+        self.P25_RX_CT = 'group'
+
+# Time (in seconds) a call is kept in the call table after its last frame, and
+# the tick (in seconds) of the call table timer wheel
+CALL_TIMEOUT = 5
+CALL_TICK = 1
+
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     Status information for a single call stream received by a system.
+# ---------------------------------------------------------------------------
+
+class callStatus(slotState):
+    __slots__ = ('RX_START', 'RX_PEER_ID', 'RX_SLOT', 'RX_RFS', 'RX_STREAM_ID', 'RX_TGID', 'RX_TIME', 'RX_TYPE', 'RX_LC', 'RX_PI_LC', 'P25_RX_CT',
+                 'LC_REWRITE')
+
+    def __init__(self, _peer_id, _slot, _stream_id, _now):
+        self.RX_START = _now
+        self.RX_PEER_ID = _peer_id
+        self.RX_SLOT = _slot
+        self.RX_RFS = 0
+        self.RX_STREAM_ID = _stream_id
+        self.RX_TGID = 0
+        self.RX_TIME = _now
+        self.RX_TYPE = fne_const.FT_VOICE
+        self.RX_LC = 0
+        self.RX_PI_LC = 0
+        self.P25_RX_CT = 'group'
+        # Per-target rewrites of the stream, keyed by target, target TS and
+        # target TGID
+        self.LC_REWRITE = {}
+
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     Table of the calls being received by a system, keyed by peer ID, slot
+#     and stream ID; so calls from different peers never share state.
+#
+#     Calls are expired with a timer wheel; a call is only looked at again
+#     when its wheel bucket comes up, and is then either dropped (if no frame
+#     was received for it within the timeout) or moved to a later bucket.
+#     tick() must be called every tick seconds.
+# ---------------------------------------------------------------------------
+
+class callTable(object):
+    def __init__(self, _timeout = CALL_TIMEOUT, _tick = CALL_TICK):
+        self._timeout = _timeout
+        self._tick = _tick
+
+        # (peer ID, slot, stream ID) -> call
+        self._calls = {}
+
+        # (peer ID, slot) -> latest call started by the peer on the slot
+        self._last = {}
+
+        self._wheel = [[] for _ in range(int(-(-_timeout // _tick)) + 1)]
+        self._pos = 0
+
+    def get(self, _peer_id, _slot, _stream_id):
+        return self._calls.get((_peer_id, _slot, _stream_id))
+
+    # Latest call started by the given peer on the given slot
+    def last(self, _peer_id, _slot):
+        return self._last.get((_peer_id, _slot))
+
+    def start(self, _peer_id, _slot, _stream_id, _now):
+        _key = (_peer_id, _slot, _stream_id)
+        _call = callStatus(_peer_id, _slot, _stream_id, _now)
+        self._calls[_key] = _call
+        self._last[(_peer_id, _slot)] = _call
+        self.schedule(_key, _now + self._timeout, _now)
+        return _call
+
+    def schedule(self, _key, _expires, _now):
+        _ticks = min(len(self._wheel) - 1, max(1, int((_expires - _now) / self._tick) + 1))
+        self._wheel[(self._pos + _ticks) % len(self._wheel)].append(_key)
+
+    def tick(self):
+        _now = time()
+        self._pos = (self._pos + 1) % len(self._wheel)
+        _bucket, self._wheel[self._pos] = self._wheel[self._pos], []
+        for _key in _bucket:
+            _call = self._calls.get(_key)
+            if _call == None:
+                continue
+
+            _expires = _call.RX_TIME + self._timeout
+            if _expires > _now:
+                self.schedule(_key, _expires, _now)
+                continue
+
+            del self._calls[_key]
+            if self._last.get(_key[:2]) is _call:
+                del self._last[_key[:2]]
+
+    def calls(self):
+        return list(self._calls.values())
+
+    def __len__(self):
+        return len(self._calls)
+
+# DMRD header, starting at byte 4 -- SEQ, SRC_ID (3 bytes), DST_ID (3 bytes),
+# PEER ID, BITS, STREAM ID
+DMRD_HEADER = struct.Struct('>BHBHBIBI')
+DMRD_MIN_LEN = 4 + DMRD_HEADER.size
+
+# P25D header, starting at byte 4 -- LCF, SRC_ID (3 bytes), DST_ID (3 bytes),
+# PEER ID, (skip), STREAM ID, (skip), DUID
+P25D_HEADER = struct.Struct('>BHBHBIxIxxB')
+P25D_MIN_LEN = 4 + P25D_HEADER.size
+
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     Decoded view of an encapsulated DMR data frame. The header is unpacked
+#     once, straight from the received buffer, and this object is handed to
+#     every DMRD hook.
+# ---------------------------------------------------------------------------
+
+class dmrdFrame(object):
+    __slots__ = ('data', 'peer_id', 'seq', 'rf_src', 'dst_id', 'bits', 'slot', 'call_type', 'frame_type', 'dtype_vseq', 'stream_id')
+
+    def __init__(self, _data):
+        _seq, _src_hi, _src_lo, _dst_hi, _dst_lo, _peer_id, _bits, _stream_id = DMRD_HEADER.unpack_from(_data, 4)
+
+        self.data = _data
+        self.peer_id = _peer_id
+        self.seq = _seq
+        self.rf_src = (_src_hi << 8) | _src_lo
+        self.dst_id = (_dst_hi << 8) | _dst_lo
+        self.bits = _bits
+        self.slot = 2 if (_bits & 0x80) else 1
+        self.call_type = 'unit' if (_bits & 0x40) else 'group'
+        self.frame_type = (_bits & 0x30) >> 4
+        self.dtype_vseq = (_bits & 0xF) # data, 1=voice header, 2=voice terminator; voice, 0=burst A ...  5=burst F
+        self.stream_id = _stream_id
+
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     Decoded view of an encapsulated P25 data frame. The header is unpacked
+#     once, straight from the received buffer, and this object is handed to
+#     every P25D hook.
+# ---------------------------------------------------------------------------
+
+class p25dFrame(object):
+    __slots__ = ('data', 'peer_id', 'lcf', 'rf_src', 'dst_id', 'slot', 'call_type', 'duid', 'dtype_vseq', 'stream_id')
+
+    def __init__(self, _data):
+        _lcf, _src_hi, _src_lo, _dst_hi, _dst_lo, _peer_id, _stream_id, _duid = P25D_HEADER.unpack_from(_data, 4)
+
+        self.data = _data
+        self.peer_id = _peer_id
+        self.lcf = _lcf
+        self.rf_src = (_src_hi << 8) | _src_lo
+        self.dst_id = (_dst_hi << 8) | _dst_lo
+        self.slot = 1               # fake the slot data, P25 doesn't have this
+        self.call_type = 'unit' if (_lcf == fne_const.P25_LC_PRIVATE) else 'group'
+        self.duid = _duid
+        self.dtype_vseq = fne_const.FT_VOICE if ((_duid != fne_const.P25_DUID_TDU) and (_duid != fne_const.P25_DUID_TDULC)) else fne_const.DT_TERMINATOR_WITH_LC
+        self.stream_id = _stream_id
+
 # ---------------------------------------------------------------------------
 #   Class Declaration
 #     This implements the core network FNE logic.
 # ---------------------------------------------------------------------------
 
 class coreFNE(DatagramProtocol):
+    # Opcode handlers (by method name) for a master and for a peer; see
+    # register_opcode() for adding handlers for other tags
+    MASTER_OPCODES = {
+        fne_const.TAG_DMR_DATA: 'master_process_dmrd',
+        fne_const.TAG_P25_DATA: 'master_process_p25d',
+        fne_const.TAG_REPEATER_LOGIN: 'master_process_rptl',
+        fne_const.TAG_REPEATER_AUTH: 'master_process_rptk',
+        fne_const.TAG_REPEATER_CONFIG: 'master_process_rptc',
+        fne_const.TAG_REPEATER_CLOSING: 'master_process_rptcl',
+        fne_const.TAG_REPEATER_PING: 'master_process_rptping',
+        fne_const.TAG_TRANSFER_ACT_LOG: 'master_process_trnslog',
+        fne_const.TAG_TRANSFER_DIAG_LOG: 'master_process_trnsdiag',
+    }
+
+    PEER_OPCODES = {
+        fne_const.TAG_DMR_DATA: 'peer_process_dmrd',
+        fne_const.TAG_P25_DATA: 'peer_process_p25d',
+        fne_const.TAG_MASTER_CLOSING: 'peer_process_mstcl',
+        fne_const.TAG_MASTER_NAK: 'peer_process_mstnak',
+        fne_const.TAG_REPEATER_ACK: 'peer_process_rptack',
+        fne_const.TAG_MASTER_PONG: 'peer_process_mstpong',
+    }
+
     def __init__(self, _name, _config, _logger, _act_log_file, _report):
         # Define a few shortcuts to make the rest of the class more readable
         self._CONFIG = _config
@@ -396,6 +698,8 @@ class coreFNE(DatagramProtocol):
             self.maintenance_loop = self.master_maintenance_loop
             self.datagramReceived = self.master_datagramReceived
             self.dereg = self.master_dereg
+            self.deliver_dmrd = self.master_deliver_dmrd
+            _opcodes = self.MASTER_OPCODES
         
         elif self._config['Mode'] == 'peer':
             self._stats = self._config['STATS']
@@ -403,6 +707,38 @@ class coreFNE(DatagramProtocol):
             self.maintenance_loop = self.peer_maintenance_loop
             self.datagramReceived = self.peer_datagramReceived
             self.dereg = self.peer_dereg
+            self.deliver_dmrd = self.peer_deliver_dmrd
+            _opcodes = self.PEER_OPCODES
+
+        # Build the opcode dispatch table
+        self._opcodes = {}
+        for _tag, _handler in _opcodes.items():
+            self.register_opcode(_tag, getattr(self, _handler))
+
+        # Repeat fan-out cache; (DST_ID, slot, call type) -> [(peer ID, (IP, port)), ...]
+        self._fanout = {}
+
+        # Batched (sendmmsg) transmit, set up in startProtocol if enabled
+        self._batch = None
+
+        # Binary packet capture, if raw packet tracing is enabled
+        self._capture = None
+        if self._CONFIG['Log']['RawPacketTrace']:
+            self._capture = open_capture(self._CONFIG['Log']['CaptureFile'], self._CONFIG['Log']['CaptureSize'])
+
+        # Per-stream DMRD jitter buffer, if enabled
+        self._jitter = None
+        if self._CONFIG['Global']['JitterBuffer']:
+            self._jitter = jitterBuffer(self._system, self._logger, self.deliver_dmrd,
+                                        self._CONFIG['Global']['JitterDepth'], self._CONFIG['Global']['JitterMaxDepth'])
+
+        # Per-hook latency histograms and traffic counters, if enabled; the
+        # hooks are replaced (on this instance) by timed wrappers
+        self._hook_stats = None
+        if self._CONFIG['Reports']['HookStats']:
+            self._hook_stats = hookStats(self._system)
+            for _hook in STATS_HOOKS:
+                setattr(self, _hook, self._hook_stats.timed(_hook, getattr(self, _hook)))
         
         # Configure for AMBE audio export if enabled
         if self._config['ExportAMBE']:
@@ -418,44 +754,104 @@ class coreFNE(DatagramProtocol):
         self._system_maintenance = task.LoopingCall(self.maintenance_loop)
         self._system_maintenance_loop = self._system_maintenance.start(self._CONFIG['Global']['PingTime'])
 
-    def dmrd_validate(self, _peer_id, _rf_src, _dst_id, _slot, _call_type, _frame_type, _dtype_vseq, _stream_id):
+        # Set up batched transmit for sending to peers if enabled
+        if self._CONFIG['Global']['BatchSend'] and self._config['Mode'] == 'master':
+            if batch_supported() and self.transport.addressFamily == socket.AF_INET:
+                self._batch = batchSender(self.transport)
+            else:
+                self._logger.warning('(%s) Batched send is not supported here, sending datagrams individually', self._system)
+
+    # DMRD and P25D hooks are passed the decoded frame (dmrdFrame/p25dFrame)
+    def dmrd_validate(self, _frame):
         pass
 
-    def dmrd_received(self, _peer_id, _rf_src, _dst_id, _seq, _slot, _call_type, _frame_type, _dtype_vseq, _stream_id, _data):
+    def dmrd_received(self, _frame):
         pass
 
-    def p25d_preprocess(self, _peer_id, _rf_src, _dst_id, _call_type, _duid, _dtype_vseq, _stream_id, _data):
+    def p25d_preprocess(self, _frame):
         pass
 
-    def p25d_validate(self, _peer_id, _rf_src, _dst_id, _call_type, _duid, _dtype_vseq, _stream_id):
+    def p25d_validate(self, _frame):
         pass
 
-    def p25d_received(self, _peer_id, _rf_src, _dst_id, _call_type, _duid, _dtype_vseq, _stream_id, _data):
+    def p25d_received(self, _frame):
         pass
 
-    def peer_ignored(self, _peer_id, _rf_src, _dst_id, _call_type, _slot, _dtype_vseq, _stream_id, _is_source):
+    # _peer_id is the peer being checked, which is not necessarily the peer
+    # the frame came from
+    def peer_ignored(self, _peer_id, _frame, _is_source):
         pass
 
     def peer_connected(self, _peer_id, _peer):
         pass
+
+    # Return the peers a frame is repeated to (including the source peer, which
+    # the caller skips). The list is built with peer_ignored() and cached per
+    # destination until invalidate_fanout() is called
+    def get_fanout(self, _frame):
+        _key = (_frame.dst_id, _frame.slot, _frame.call_type)
+        try:
+            return self._fanout[_key]
+        except KeyError:
+            _fanout = []
+            for _peer in self._peers:
+                if self.peer_ignored(_peer, _frame, False) == False:
+                    _fanout.append((_peer, (self._peers[_peer]['IP'], self._peers[_peer]['PORT'])))
+
+            self._fanout[_key] = _fanout
+            return _fanout
+
+    # Discard the repeat fan-out cache; this must be called whenever the peers,
+    # routing rules or affiliations change
+    def invalidate_fanout(self):
+        self._fanout.clear()
+        if self._batch != None:
+            self._batch.clear()
+
+    # Tell the report server an item of its published state (i.e. a peer) has
+    # changed
+    def report_changed(self, _section, _key):
+        if self._report != None:
+            self._report.changed(_section, _key)
     
     def send_peers(self, _packet):
+        if self._batch != None:
+            self.send_peer_addrs(_packet, [(_peer['IP'], _peer['PORT']) for _peer in self._peers.values()])
+            return
+
         for _peer in self._peers:
             self.send_peer(_peer, _packet)
 
+    # Send a packet to several peer addresses; with BatchSend enabled these are
+    # sent with as few sendmmsg() calls as possible
+    def send_peer_addrs(self, _packet, _addrs):
+        if self._batch != None:
+            self._batch.sendto(_packet, _addrs)
+        else:
+            for _addr in _addrs:
+                self.transport.write(_packet, _addr)
+
+        if self._hook_stats != None:
+            self._hook_stats.sent(len(_packet), len(_addrs))
+        if self._capture != None:
+            for _addr in _addrs:
+                self._capture.write(CAPTURE_TX, self._system, self._config['Port'], _addr, _packet)
+
     def send_peer(self, _peer, _packet):
         _ip = self._peers[_peer]['IP']
         _port = self._peers[_peer]['PORT']
         self.transport.write(_packet, (_ip, _port))
-        if self._CONFIG['Log']['RawPacketTrace']:
-            self._logger.debug('(%s) PEER %s Network Transmitted (to %s:%s) -- %s', self._system, self._peers[_peer]['PEER_ID'],
-                               self._peers[_peer]['IP'], self._peers[_peer]['PORT'], ahex(_packet))
+        if self._hook_stats != None:
+            self._hook_stats.sent(len(_packet))
+        if self._capture != None:
+            self._capture.write(CAPTURE_TX, self._system, self._config['Port'], (_ip, _port), _packet)
 
     def send_master(self, _packet):
         self.transport.write(_packet, (self._config['MasterAddress'], self._config['MasterPort']))
-        if self._CONFIG['Log']['RawPacketTrace']:
-            self._logger.debug('(%s) Network Transmitted (to %s:%s) -- %s', self._system, 
-                               self._config['MasterAddress'], self._config['MasterPort'], ahex(_packet))
+        if self._hook_stats != None:
+            self._hook_stats.sent(len(_packet))
+        if self._capture != None:
+            self._capture.write(CAPTURE_TX, self._system, self._config['Port'], (self._config['MasterAddress'], self._config['MasterPort']), _packet)
 
     def master_dereg(self):
         for _peer in self._peers:
@@ -472,9 +868,7 @@ class coreFNE(DatagramProtocol):
     def send_peer_wrids(self, _peer, _rids):
         from struct import pack
         if self._config['Mode'] == 'master':
-            data = pack('>I', int(len(_rids)))
-            for rid in _rids:
-                data = data + pack('>I', int(rid))
+            data = pack('>I', int(len(_rids))) + _rids.pack()
 
             self.send_peer(_peer, fne_const.TAG_MASTER_WL_RID + data)
             self._logger.debug('(%s) Whitelist RIDs sent to PEER %s', self._system, self._peers[_peer]['PEER_ID'])
@@ -490,9 +884,7 @@ class coreFNE(DatagramProtocol):
     def send_peer_brids(self, _peer, _rids):
         from struct import pack
         if self._config['Mode'] == 'master':
-            data = pack('>I', int(len(_rids))) 
-            for rid in _rids:
-                data = data + pack('>I', int(rid))
+            data = pack('>I', int(len(_rids))) + _rids.pack()
 
             self.send_peer(_peer, fne_const.TAG_MASTER_BL_RID + data)
             self._logger.debug('(%s) Blacklist RIDs sent to PEER %s', self._system, self._peers[_peer]['PEER_ID'])
@@ -545,14 +937,30 @@ class coreFNE(DatagramProtocol):
     
     # Aliased in __init__ to maintenance_loop if system is a master
     def master_maintenance_loop(self):
-        for _peer in self._peers:
+        for _peer in list(self._peers):
             _this_peer = self._peers[_peer]
             # Check to see if any of the peers have been quiet (no ping)
             # longer than allowed
             if _this_peer['LAST_PING'] + self._CONFIG['Global']['PingTime'] * self._CONFIG['Global']['MaxMissed'] < time():
                 self._logger.info('(%s) PEER %s has timed out', self._system, _this_peer['PEER_ID'])
+                if self._CONFIG['Log']['AllowDiagTrans'] == True:
+                    close_peer_diag_log(self._CONFIG, self._logger, _this_peer)
+
                 # remove any timed out peers from the configuration
                 del self._CONFIG['Systems'][self._system]['PEERS'][_peer]
+                self.invalidate_fanout()
+                self.report_changed('PEERS', (self._system, _peer))
+
+        if self._jitter != None:
+            self._jitter.prune_peers(self._peers)
+            for _peer_id, _stats in self._jitter.PEERS.items():
+                if _stats.LATE or _stats.LOST or _stats.DUPLICATE:
+                    self._logger.debug('(%s) Jitter PEER %s; RX %s LATE %s LOST %s DUP %s', self._system, _peer_id,
+                                       _stats.RECEIVED, _stats.LATE, _stats.LOST, _stats.DUPLICATE)
+
+        if self._batch != None and self._batch.syscalls > 0:
+            self._logger.debug('(%s) Batched send; %s datagrams in %s syscalls (%.2f datagrams/syscall)', self._system,
+                               self._batch.datagrams, self._batch.syscalls, self._batch.datagrams / self._batch.syscalls)
     
     # Aliased in __init__ to maintenance_loop if system is a peer
     def peer_maintenance_loop(self):
@@ -571,435 +979,502 @@ class coreFNE(DatagramProtocol):
             self._stats['PINGS_SENT'] += 1
             self._logger.debug('(%s) RPTPING Sent to MASTER. Pings since connected: %s', self._system, self._stats['PINGS_SENT'])
 
+        self.report_changed('SYSTEMS', self._system)
+
+    # Register a handler for an opcode tag. Handlers are called with
+    # (_data, _host, _port). Tags are bucketed by their first 4 bytes, and
+    # within a bucket the longest matching tag wins (i.e. RPTCL before RPTC)
+    def register_opcode(self, _tag, _handler):
+        _bucket = [_entry for _entry in self._opcodes.get(_tag[:4], []) if _entry[0] != _tag]
+        _bucket.append((_tag, _handler))
+        _bucket.sort(key = lambda _entry: len(_entry[0]), reverse = True)
+        self._opcodes[_tag[:4]] = _bucket
+
+    # Call the handler registered for the opcode of the given packet; returns
+    # False if the opcode is unrecognized
+    def dispatch_opcode(self, _data, _host, _port):
+        for _tag, _handler in self._opcodes.get(_data[:4], ()):
+            if _data.startswith(_tag):
+                _handler(_data, _host, _port)
+                return True
+        return False
+
     # Aliased in __init__ to datagramReceived if system is a master
     def master_datagramReceived(self, _data, hostInfo): # hostInfo is a tuple; converted from 2.x to 3.x syntax
         _host, _port = hostInfo
-        global _act_log_lock
-        if self._CONFIG['Log']['RawPacketTrace']:
-            self._logger.debug('(%s) Network Received (from %s:%s) -- %s', self._system, _host, _port, ahex(_data))
+        if self._hook_stats != None:
+            self._hook_stats.received(len(_data))
+        if self._capture != None:
+            self._capture.write(CAPTURE_RX, self._system, self._config['Port'], hostInfo, _data)
 
         # process opcode from data, usually first 4 bytes but can be a varied length
         # depending on the opcode
-        #print("Data packet")
-        #print(_data)
-        if _data[:4] == fne_const.TAG_DMR_DATA: # fne_const.TAG_DMR_DATA -- encapsulated DMR data frame
-            _peer_id = bytes_to_int(_data[11:15])
-            if (_peer_id in self._peers and self._peers[_peer_id]['CONNECTION'] == 'YES' and 
-                self._peers[_peer_id]['IP'] == _host and self._peers[_peer_id]['PORT'] == _port):
-                _seq = _data[4]
-                _rf_src = bytes_to_int(_data[5:8])
-                _dst_id = bytes_to_int(_data[8:11])
-                _bits = _data[15]
-                _slot = 2 if (_bits & 0x80) else 1
-                _call_type = 'unit' if (_bits & 0x40) else 'group'
-                _frame_type = (_bits & 0x30) >> 4
-                _dtype_vseq = (_bits & 0xF) # data, 1=voice header, 2=voice terminator; voice, 0=burst A ...  5=burst F
-                _stream_id = bytes_to_int(_data[16:20])
-                #self._logger.debug('(%s) DMRD - SEQ %s SRC_ID %s DST_ID %s', self._system, _seq, _rf_src, _dst_id)
-
-                if self.dmrd_validate(_peer_id, _rf_src, _dst_id, _slot, _call_type, _frame_type, _dtype_vseq, _stream_id) == True:
-                    if self.peer_ignored(_peer_id, _rf_src, _dst_id, _call_type, _slot, _dtype_vseq, _stream_id, True) == True:
-                        return
-
-                    # If AMBE audio exporting is configured...
-                    if self._config['ExportAMBE']:
-                        self._ambe.parse_ambe(self._system, _data)
-
-                    # If packet data exporting is configured...
-                    if self._config['PacketData']:
-                        if ((_frame_type == fne_const.FT_DATA_SYNC) and ((_dtype_vseq == fne_const.DT_CSBK) or (_dtype_vseq == fne_const.DT_DATA_HEADER) or
-                                                                         (_dtype_vseq == fne_const.DT_RATE_12_DATA) or (_dtype_vseq == fne_const.DT_RATE_34_DATA) or
-                                                                         (_dtype_vseq == fne_const.DT_RATE_1_DATA))):
-                            self._packet_data.send_data(_data)
-
-                    # The basic purpose of a master is to repeat to the peers
-                    if self._config['Repeat'] == True:
-                        for _peer in self._peers:
-                            if _peer != _peer_id:
-                                if self.peer_ignored(_peer, _rf_src, _dst_id, _call_type, _slot, _dtype_vseq, _stream_id, False) == False:
-                                    self.send_peer(_peer, _data)
-                                    self._logger.debug('(%s) DMRD: Packet TS %s SRC_PEER %s DST_ID %s DST_PEER %s [STREAM ID %s]', self._system, 
-                                                       _slot, _peer_id, _dst_id, _peer, _stream_id)
-                                else:
-                                    continue
-
-                    # Userland actions -- typically this is the function you
-                    # subclass for an application
-                    self.dmrd_received(_peer_id, _rf_src, _dst_id, _seq, _slot, _call_type, _frame_type, _dtype_vseq, _stream_id, _data)
-
-        elif _data[:4] == fne_const.TAG_P25_DATA: # fne_const.TAG_P25_DATA -- encapsulated P25 data frame
-            _peer_id = bytes_to_int(_data[11:15])
-            if (_peer_id in self._peers and self._peers[_peer_id]['CONNECTION'] == 'YES' and
-                self._peers[_peer_id]['IP'] == _host and self._peers[_peer_id]['PORT'] == _port):
-                _rf_src = bytes_to_int(_data[5:8])
-                _dst_id = bytes_to_int(_data[8:11])
-                _call_type = 'unit' if (_data[4] == fne_const.P25_LC_PRIVATE) else 'group'
-                _duid = _data[22]
-                _dtype_vseq = fne_const.FT_VOICE if ((_duid != fne_const.P25_DUID_TDU) and (_duid != fne_const.P25_DUID_TDULC)) else fne_const.DT_TERMINATOR_WITH_LC
-                _stream_id = bytes_to_int(_data[16:20])
-
-                if self.p25d_validate(_peer_id, _rf_src, _dst_id, _call_type, _duid, _dtype_vseq, _stream_id) == True:
-                    self.p25d_preprocess(_peer_id, _rf_src, _dst_id, _call_type, _duid, _dtype_vseq, _stream_id, _data)
-                    if self.peer_ignored(_peer_id, _rf_src, _dst_id, _call_type, 1, _dtype_vseq, _stream_id, True) == True:
-                        return
-
-                    # If packet data exporting is configured...
-                    if self._config['PacketData']:
-                        if ((_duid == fne_const.P25_DUID_TSDU) or (_duid == fne_const.P25_DUID_PDU)):
-                            self._packet_data.send_data(_data)
-
-                    # The basic purpose of a master is to repeat to the peers
-                    if self._config['Repeat'] == True:
-                        for _peer in self._peers:
-                            if _peer != _peer_id:
-                                if self.peer_ignored(_peer, _rf_src, _dst_id, _call_type, 1, _dtype_vseq, _stream_id, False) == False:
-                                    self.send_peer(_peer, _data)
-                                    self._logger.debug('(%s) P25D: Packet SRC_PEER %s DST_ID %s DST_PEER %s [STREAM ID %s]', self._system,
-                                                       _peer_id, _dst_id, _peer, _stream_id)
-                                else:
-                                    continue
-
-                    # Userland actions -- typically this is the function you
-                    # subclass for an application
-                    self.p25d_received(_peer_id, _rf_src, _dst_id, _call_type, _duid, _dtype_vseq, _stream_id, _data)
-
-        elif _data[:4] == fne_const.TAG_REPEATER_LOGIN: # fne_const.TAG_REPEATER_LOGIN -- a repeater wants to login
-            _peer_id = bytes_to_int(_data[4:8])
-            if _peer_id:
-                # Build the configuration data structure for the peer
-                self._peers.update({_peer_id: {
-                        'CONNECTION': 'RPTL-RECEIVED',
-                        'PINGS_RECEIVED': 0,
-                        'LAST_PING': time(),
-                        'IP': _host,
-                        'PORT': _port,
-                        'SALT': randint(0,0xFFFFFFFF),
-                        'PEER_ID': _peer_id,
-
-                        'IDENTITY': '',
-                        'RX_FREQ': '',
-                        'TX_FREQ': '',
-
-                        'LATITUDE': '',
-                        'LONGITUDE': '',
-                        'HEIGHT': '',
-                        'LOCATION': '',
-
-                        'TX_OFFSET': '',
-                        'CH_BW': '',
-                        'CHANNEL_ID': '',
-                        'CHANNEL_NO': '',
-                        'TX_POWER': '',
-
-                        'SOFTWARE_ID': '',
-
-                        'RCON_PASSWORD': '',
-                        'RCON_PORT': '',
-
-                        'DIAG_LOG_FILE': None,
-                }})
-
-                self._logger.info('(%s) Repeater logging in with PEER %s, %s:%s', self._system, _peer_id, _host, _port)
-
-                _salt_str = self._peers[_peer_id]['SALT'].to_bytes(4, "big")
-                self.send_peer(_peer_id, fne_const.TAG_REPEATER_ACK + _salt_str)
-                self._peers[_peer_id]['CONNECTION'] = 'CHALLENGE_SENT'
-                self._peers[_peer_id]['SYSTEM'] = self._system
-                self._logger.info('(%s) Sent Challenge Response to PEER %s for login %s', self._system, _peer_id, self._peers[_peer_id]['SALT'])
+        if self.dispatch_opcode(_data, _host, _port) == False:
+            self._logger.error('(%s) Unrecognized command %s PACKET %s', self._system, _data[:9], lazy_ahex(_data))
 
-            else:
-                self.transport.write(fne_const.TAG_MASTER_NAK + _peer_id, (_host, _port))
-                self._logger.warning('(%s) Invalid login from PEER %s', self._system, _peer_id)
+    # DMRD -- encapsulated DMR data frame
+    def master_process_dmrd(self, _data, _host, _port):
+        if len(_data) < DMRD_MIN_LEN:
+            self._logger.warning('(%s) DMRD: Dropped short packet (%s bytes) from %s:%s', self._system, len(_data), _host, _port)
+            return
 
-        elif _data[:4] == fne_const.TAG_REPEATER_AUTH: # fne_const.TAG_REPEATER_AUTH -- Repeater has answered our login challenge
-            _peer_id = bytes_to_int(_data[4:8])
-            _peer_bytes = _data[4:8]
-            if (_peer_id in self._peers and self._peers[_peer_id]['CONNECTION'] == 'CHALLENGE_SENT' and
-                self._peers[_peer_id]['IP'] == _host and self._peers[_peer_id]['PORT'] == _port):
-                _this_peer = self._peers[_peer_id]
-                _this_peer['LAST_PING'] = time()
-                _sent_hash = _data[8:]
-                _salt_str = self._peers[_peer_id]['SALT'].to_bytes(4, "big")
-                #salt_bytes = _this_peer['SALT'].to_bytes(4, byteorder="big")
-                _calc_hash = sha256(_salt_str + self._config['Passphrase'].encode()).digest()
-                if _sent_hash == _calc_hash:
-                    _this_peer['CONNECTION'] = 'WAITING_CONFIG'
-                    
-                    self.send_peer(_peer_id, fne_const.TAG_REPEATER_ACK + _peer_bytes)
-                    self._logger.info('(%s) PEER %s has completed the login exchange successfully', self._system, _this_peer['PEER_ID'])
+        _frame = dmrdFrame(_data)
+        _peer_id = _frame.peer_id
+        if (_peer_id in self._peers and self._peers[_peer_id]['CONNECTION'] == 'YES' and 
+            self._peers[_peer_id]['IP'] == _host and self._peers[_peer_id]['PORT'] == _port):
+            #self._logger.debug('(%s) DMRD - SEQ %s SRC_ID %s DST_ID %s', self._system, _frame.seq, _frame.rf_src, _frame.dst_id)
+
+            if self.dmrd_validate(_frame) == True:
+                if self.peer_ignored(_peer_id, _frame, True) == True:
+                    if self._hook_stats != None:
+                        self._hook_stats.drop(DROP_IGNORED)
+                    return
+
+                # If the jitter buffer is enabled, the frame is delivered
+                # (in sequence order) when the buffer releases it
+                if self._jitter != None:
+                    self._jitter.queue(_frame)
                 else:
-                    self._logger.warning('(%s) PEER %s has FAILED the login exchange', self._system, _this_peer['PEER_ID'])
-                    self.transport.write(fne_const.TAG_MASTER_NAK + _peer_bytes, (_host, _port))
-                    del self._peers[_peer_id]
-            else:
-                self.transport.write(fne_const.TAG_MASTER_NAK + _peer_bytes, (_host, _port))
-                self._logger.warning('(%s) RPTK from unauth PEER %s', self._system, _peer_id)
+                    self.master_deliver_dmrd(_frame)
+            elif self._hook_stats != None:
+                self._hook_stats.drop(DROP_ACL)
+
+    # Export, repeat and hand a validated DMRD frame to the application
+    def master_deliver_dmrd(self, _frame):
+        _data = _frame.data
+        _peer_id = _frame.peer_id
+        _frame_type = _frame.frame_type
+        _dtype_vseq = _frame.dtype_vseq
+
+        # If AMBE audio exporting is configured...
+        if self._config['ExportAMBE']:
+            self._ambe.parse_ambe(self._system, _data)
 
-        elif _data[:4] == fne_const.TAG_REPEATER_CONFIG: # fne_const.TAG_REPEATER_CONFIG -- Repeater is sending it's configuration
-            _peer_id = bytes_to_int(_data[4:8])
-            if (_peer_id in self._peers and self._peers[_peer_id]['CONNECTION'] == 'WAITING_CONFIG' and
-                self._peers[_peer_id]['IP'] == _host and self._peers[_peer_id]['PORT'] == _port):
-                _this_peer = self._peers[_peer_id]
-                jsonBytes = _data[8:]
-                #if we have the old format - exit gracefully
-                try:
-                    peerCfg = json.loads(jsonBytes.decode())
-                    peerInfo = peerCfg['info']
-                    peerChannel = peerCfg['channel']
-                    peerRcon = peerCfg['rcon']
-
-                    _this_peer['CONNECTION'] = 'YES'
-                    _this_peer['PINGS_RECEIVED'] = 0
-                    _this_peer['LAST_PING'] = time()
-
-                    _this_peer['IDENTITY'] = peerCfg['identity']
-                    _this_peer['RX_FREQ'] = peerCfg['rxFrequency']
-                    _this_peer['TX_FREQ'] = peerCfg['txFrequency']
-
-                    _this_peer['LATITUDE'] = peerInfo['latitude']
-                    _this_peer['LONGITUDE'] = peerInfo['longitude']
-                    _this_peer['HEIGHT'] = peerInfo['height']
-                    _this_peer['LOCATION'] = peerInfo['location']
-                    _this_peer['TX_OFFSET'] = peerChannel['txOffsetMhz']
-                    _this_peer['CH_BW'] = peerChannel['chBandwidthKhz']
-                    _this_peer['CHANNEL_ID'] = peerChannel['channelId']
-                    _this_peer['CHANNEL_NO'] = peerChannel['channelNo']
-                    _this_peer['TX_POWER'] = peerChannel['txPower']
-                    _this_peer['RCON_PASSWORD'] = peerRcon['password']
-                    _this_peer['RCON_PORT'] = peerRcon['port']
-                except:
-                    _this_peer['CONNECTION'] = 'YES'
-                    _this_peer['PINGS_RECEIVED'] = 0
-                    _this_peer['LAST_PING'] = time()
-
-                    _this_peer['IDENTITY'] = "I NEED TO UPDATE MY DVMHOST"
-                    _this_peer['RX_FREQ'] = 0
-                    _this_peer['TX_FREQ'] = 0
-
-                    _this_peer['LATITUDE'] = 0
-                    _this_peer['LONGITUDE'] = 0
-                    _this_peer['HEIGHT'] = 0
-                    _this_peer['LOCATION'] = "I NEED TO UPDATE MY DVMHOST"
-                    _this_peer['TX_OFFSET'] = 0
-                    _this_peer['CH_BW'] = 0
-                    _this_peer['CHANNEL_ID'] = 0
-                    _this_peer['CHANNEL_NO'] = 0
-                    _this_peer['TX_POWER'] = 0
-                    _this_peer['RCON_PASSWORD'] = "ABCD1234"
-                    _this_peer['RCON_PORT'] = 0
-                # setup peer diagnostics log
-                if self._CONFIG['Log']['AllowDiagTrans'] == True:
-                    diag_log_file = get_peer_diag_log_filename(self._CONFIG, _peer_id)
-                    _this_peer['DIAG_LOG_FILE'] = diag_log_file
+        # If packet data exporting is configured...
+        if self._config['PacketData']:
+            if ((_frame_type == fne_const.FT_DATA_SYNC) and ((_dtype_vseq == fne_const.DT_CSBK) or (_dtype_vseq == fne_const.DT_DATA_HEADER) or
+                                                             (_dtype_vseq == fne_const.DT_RATE_12_DATA) or (_dtype_vseq == fne_const.DT_RATE_34_DATA) or
+                                                             (_dtype_vseq == fne_const.DT_RATE_1_DATA))):
+                self._packet_data.send_data(_data)
+
+        # The basic purpose of a master is to repeat to the peers
+        if self._config['Repeat'] == True:
+            self.send_peer_addrs(_data, [_addr for _peer, _addr in self.get_fanout(_frame) if _peer != _peer_id])
+
+        # Userland actions -- typically this is the function you
+        # subclass for an application
+        self.dmrd_received(_frame)
+
+    # P25D -- encapsulated P25 data frame
+    def master_process_p25d(self, _data, _host, _port):
+        if len(_data) < P25D_MIN_LEN:
+            self._logger.warning('(%s) P25D: Dropped short packet (%s bytes) from %s:%s', self._system, len(_data), _host, _port)
+            return
+
+        _frame = p25dFrame(_data)
+        _peer_id = _frame.peer_id
+        if (_peer_id in self._peers and self._peers[_peer_id]['CONNECTION'] == 'YES' and
+            self._peers[_peer_id]['IP'] == _host and self._peers[_peer_id]['PORT'] == _port):
+            _duid = _frame.duid
+
+            if self.p25d_validate(_frame) == True:
+                self.p25d_preprocess(_frame)
+                if self.peer_ignored(_peer_id, _frame, True) == True:
+                    if self._hook_stats != None:
+                        self._hook_stats.drop(DROP_IGNORED)
+                    return
 
-                self.send_peer(_peer_id, fne_const.TAG_REPEATER_ACK + _peer_id.to_bytes(4, "big"))
-                self._logger.info('(%s) PEER %s has sent configuration', self._system, _this_peer['PEER_ID'])
-                self._logger.info('(%s) PEER %s Connection from PEER Completed', self._system, _this_peer['PEER_ID'])
+                # If packet data exporting is configured...
+                if self._config['PacketData']:
+                    if ((_duid == fne_const.P25_DUID_TSDU) or (_duid == fne_const.P25_DUID_PDU)):
+                        self._packet_data.send_data(_data)
+
+                # The basic purpose of a master is to repeat to the peers
+                if self._config['Repeat'] == True:
+                    self.send_peer_addrs(_data, [_addr for _peer, _addr in self.get_fanout(_frame) if _peer != _peer_id])
 
                 # Userland actions -- typically this is the function you
                 # subclass for an application
-                self.peer_connected(_peer_id, _this_peer)
+                self.p25d_received(_frame)
+            elif self._hook_stats != None:
+                self._hook_stats.drop(DROP_ACL)
+
+    # RPTL -- a repeater wants to login
+    def master_process_rptl(self, _data, _host, _port):
+        _peer_id = bytes_to_int(_data[4:8])
+        if _peer_id:
+            # Build the configuration data structure for the peer
+            self._peers.update({_peer_id: {
+                    'CONNECTION': 'RPTL-RECEIVED',
+                    'PINGS_RECEIVED': 0,
+                    'LAST_PING': time(),
+                    'IP': _host,
+                    'PORT': _port,
+                    'SALT': randint(0,0xFFFFFFFF),
+                    'PEER_ID': _peer_id,
+
+                    'IDENTITY': '',
+                    'RX_FREQ': '',
+                    'TX_FREQ': '',
+
+                    'LATITUDE': '',
+                    'LONGITUDE': '',
+                    'HEIGHT': '',
+                    'LOCATION': '',
+
+                    'TX_OFFSET': '',
+                    'CH_BW': '',
+                    'CHANNEL_ID': '',
+                    'CHANNEL_NO': '',
+                    'TX_POWER': '',
+
+                    'SOFTWARE_ID': '',
+
+                    'RCON_PASSWORD': '',
+                    'RCON_PORT': '',
+
+                    'DIAG_LOG_FILE': None,
+            }})
+
+            self.invalidate_fanout()
+            self._logger.info('(%s) Repeater logging in with PEER %s, %s:%s', self._system, _peer_id, _host, _port)
+
+            _salt_str = self._peers[_peer_id]['SALT'].to_bytes(4, "big")
+            self.send_peer(_peer_id, fne_const.TAG_REPEATER_ACK + _salt_str)
+            self._peers[_peer_id]['CONNECTION'] = 'CHALLENGE_SENT'
+            self._peers[_peer_id]['SYSTEM'] = self._system
+            self.report_changed('PEERS', (self._system, _peer_id))
+            self._logger.info('(%s) Sent Challenge Response to PEER %s for login %s', self._system, _peer_id, self._peers[_peer_id]['SALT'])
+
+        else:
+            self.transport.write(fne_const.TAG_MASTER_NAK + _peer_id, (_host, _port))
+            self._logger.warning('(%s) Invalid login from PEER %s', self._system, _peer_id)
+
+    # RPTK -- Repeater has answered our login challenge
+    def master_process_rptk(self, _data, _host, _port):
+        _peer_id = bytes_to_int(_data[4:8])
+        _peer_bytes = _data[4:8]
+        if (_peer_id in self._peers and self._peers[_peer_id]['CONNECTION'] == 'CHALLENGE_SENT' and
+            self._peers[_peer_id]['IP'] == _host and self._peers[_peer_id]['PORT'] == _port):
+            _this_peer = self._peers[_peer_id]
+            _this_peer['LAST_PING'] = time()
+            self.report_changed('PEERS', (self._system, _peer_id))
+            _sent_hash = _data[8:]
+            _salt_str = self._peers[_peer_id]['SALT'].to_bytes(4, "big")
+            #salt_bytes = _this_peer['SALT'].to_bytes(4, byteorder="big")
+            _calc_hash = sha256(_salt_str + self._config['Passphrase'].encode()).digest()
+            if _sent_hash == _calc_hash:
+                _this_peer['CONNECTION'] = 'WAITING_CONFIG'
+
+                self.send_peer(_peer_id, fne_const.TAG_REPEATER_ACK + _peer_bytes)
+                self._logger.info('(%s) PEER %s has completed the login exchange successfully', self._system, _this_peer['PEER_ID'])
             else:
-                self.transport.write(fne_const.TAG_MASTER_NAK + _peer_id.to_bytes(4, "big"), (_host, _port))
-                self._logger.warning('(%s) Configuration from unauth PEER %s', self._system, _peer_id)
+                self._logger.warning('(%s) PEER %s has FAILED the login exchange', self._system, _this_peer['PEER_ID'])
+                self.transport.write(fne_const.TAG_MASTER_NAK + _peer_bytes, (_host, _port))
+                del self._peers[_peer_id]
+                self.invalidate_fanout()
+        else:
+            self.transport.write(fne_const.TAG_MASTER_NAK + _peer_bytes, (_host, _port))
+            self._logger.warning('(%s) RPTK from unauth PEER %s', self._system, _peer_id)
+
+    # RPTC -- Repeater is sending it's configuration
+    def master_process_rptc(self, _data, _host, _port):
+        _peer_id = bytes_to_int(_data[4:8])
+        if (_peer_id in self._peers and self._peers[_peer_id]['CONNECTION'] == 'WAITING_CONFIG' and
+            self._peers[_peer_id]['IP'] == _host and self._peers[_peer_id]['PORT'] == _port):
+            _this_peer = self._peers[_peer_id]
+            jsonBytes = _data[8:]
+            #if we have the old format - exit gracefully
+            try:
+                peerCfg = json.loads(jsonBytes.decode())
+                peerInfo = peerCfg['info']
+                peerChannel = peerCfg['channel']
+                peerRcon = peerCfg['rcon']
 
-        elif _data[:5] == fne_const.TAG_REPEATER_CLOSING: # fne_const.TAG_REPEATER_CLOSING -- Disconnect command
-            _peer_id = bytes_to_int(_data[5:9])
-            if (_peer_id in self._peers and self._peers[_peer_id]['CONNECTION'] == 'YES' and
-                self._peers[_peer_id]['IP'] == _host and self._peers[_peer_id]['PORT'] == _port):
-                self._logger.info('(%s) PEER %s is closing down', self._system, _peer_id)
-                self.transport.write(fne_const.TAG_MASTER_NAK + _peer_id.to_bytes(4, "big"), (_host, _port))
+                _this_peer['CONNECTION'] = 'YES'
+                _this_peer['PINGS_RECEIVED'] = 0
+                _this_peer['LAST_PING'] = time()
 
-                # setup peer diagnostics log
-                if self._CONFIG['Log']['AllowDiagTrans'] == True:
-                    if self._peers[_peer_id]['DIAG_LOG_FILE'] != None:
-                        close_peer_logs()
-                        _this_peer['DIAG_LOG_FILE'] = None
+                _this_peer['IDENTITY'] = peerCfg['identity']
+                _this_peer['RX_FREQ'] = peerCfg['rxFrequency']
+                _this_peer['TX_FREQ'] = peerCfg['txFrequency']
+
+                _this_peer['LATITUDE'] = peerInfo['latitude']
+                _this_peer['LONGITUDE'] = peerInfo['longitude']
+                _this_peer['HEIGHT'] = peerInfo['height']
+                _this_peer['LOCATION'] = peerInfo['location']
+                _this_peer['TX_OFFSET'] = peerChannel['txOffsetMhz']
+                _this_peer['CH_BW'] = peerChannel['chBandwidthKhz']
+                _this_peer['CHANNEL_ID'] = peerChannel['channelId']
+                _this_peer['CHANNEL_NO'] = peerChannel['channelNo']
+                _this_peer['TX_POWER'] = peerChannel['txPower']
+                _this_peer['RCON_PASSWORD'] = peerRcon['password']
+                _this_peer['RCON_PORT'] = peerRcon['port']
+            except:
+                _this_peer['CONNECTION'] = 'YES'
+                _this_peer['PINGS_RECEIVED'] = 0
+                _this_peer['LAST_PING'] = time()
 
-                del self._peers[_peer_id]
+                _this_peer['IDENTITY'] = "I NEED TO UPDATE MY DVMHOST"
+                _this_peer['RX_FREQ'] = 0
+                _this_peer['TX_FREQ'] = 0
+
+                _this_peer['LATITUDE'] = 0
+                _this_peer['LONGITUDE'] = 0
+                _this_peer['HEIGHT'] = 0
+                _this_peer['LOCATION'] = "I NEED TO UPDATE MY DVMHOST"
+                _this_peer['TX_OFFSET'] = 0
+                _this_peer['CH_BW'] = 0
+                _this_peer['CHANNEL_ID'] = 0
+                _this_peer['CHANNEL_NO'] = 0
+                _this_peer['TX_POWER'] = 0
+                _this_peer['RCON_PASSWORD'] = "ABCD1234"
+                _this_peer['RCON_PORT'] = 0
+            # setup peer diagnostics log
+            if self._CONFIG['Log']['AllowDiagTrans'] == True:
+                diag_log_file = get_peer_diag_log_filename(self._CONFIG, _peer_id)
+                _this_peer['DIAG_LOG_FILE'] = diag_log_file
+
+            self.send_peer(_peer_id, fne_const.TAG_REPEATER_ACK + _peer_id.to_bytes(4, "big"))
+            self._logger.info('(%s) PEER %s has sent configuration', self._system, _this_peer['PEER_ID'])
+            self.report_changed('PEERS', (self._system, _peer_id))
+            self._logger.info('(%s) PEER %s Connection from PEER Completed', self._system, _this_peer['PEER_ID'])
+            self.invalidate_fanout()
+
+            # Userland actions -- typically this is the function you
+            # subclass for an application
+            self.peer_connected(_peer_id, _this_peer)
+        else:
+            self.transport.write(fne_const.TAG_MASTER_NAK + _peer_id.to_bytes(4, "big"), (_host, _port))
+            self._logger.warning('(%s) Configuration from unauth PEER %s', self._system, _peer_id)
+
+    # RPTCL -- Disconnect command
+    def master_process_rptcl(self, _data, _host, _port):
+        _peer_id = bytes_to_int(_data[5:9])
+        if (_peer_id in self._peers and self._peers[_peer_id]['CONNECTION'] == 'YES' and
+            self._peers[_peer_id]['IP'] == _host and self._peers[_peer_id]['PORT'] == _port):
+            self._logger.info('(%s) PEER %s is closing down', self._system, _peer_id)
+            self.transport.write(fne_const.TAG_MASTER_NAK + _peer_id.to_bytes(4, "big"), (_host, _port))
+
+            # close peer diagnostics log
+            if self._CONFIG['Log']['AllowDiagTrans'] == True:
+                close_peer_diag_log(self._CONFIG, self._logger, self._peers[_peer_id])
+
+            del self._peers[_peer_id]
+            self.invalidate_fanout()
+            self.report_changed('PEERS', (self._system, _peer_id))
+
+    # RPTPING -- peer is pinging us
+    def master_process_rptping(self, _data, _host, _port):
+        _peer_id = bytes_to_int(_data[7:11])
+        if (_peer_id in self._peers and self._peers[_peer_id]['CONNECTION'] == "YES" and
+            self._peers[_peer_id]['IP'] == _host and self._peers[_peer_id]['PORT'] == _port):
+            self._peers[_peer_id]['PINGS_RECEIVED'] += 1
+            self._peers[_peer_id]['LAST_PING'] = time()
+            self.report_changed('PEERS', (self._system, _peer_id))
+            self.send_peer(_peer_id, fne_const.TAG_MASTER_PONG + _peer_id.to_bytes(4, "big"))
+            self._logger.debug('(%s) Received and answered RPTPING from PEER %s', self._system, _peer_id)
+        else:
+            self.transport.write(fne_const.TAG_MASTER_NAK + _peer_id.to_bytes(4, "big"), (_host, _port))
+            self._logger.warning('(%s) RPTPING from unauth PEER %s', self._system, _peer_id)
 
-        elif _data[:7] == fne_const.TAG_REPEATER_PING: # fne_const.TAG_REPEATER_PING -- peer is pinging us
+    # TRNSLOG -- peer is transferring activity log data to us
+    def master_process_trnslog(self, _data, _host, _port):
+        if self._CONFIG['Log']['AllowActTrans'] == True:
             _peer_id = bytes_to_int(_data[7:11])
             if (_peer_id in self._peers and self._peers[_peer_id]['CONNECTION'] == "YES" and
                 self._peers[_peer_id]['IP'] == _host and self._peers[_peer_id]['PORT'] == _port):
-                self._peers[_peer_id]['PINGS_RECEIVED'] += 1
-                self._peers[_peer_id]['LAST_PING'] = time()
-                self.send_peer(_peer_id, fne_const.TAG_MASTER_PONG + _peer_id.to_bytes(4, "big"))
-                self._logger.debug('(%s) Received and answered RPTPING from PEER %s', self._system, _peer_id)
-            else:
-                self.transport.write(fne_const.TAG_MASTER_NAK + _peer_id.to_bytes(4, "big"), (_host, _port))
-                self._logger.warning('(%s) RPTPING from unauth PEER %s', self._system, _peer_id)
-
-        elif _data[:7] == fne_const.TAG_TRANSFER_ACT_LOG: # fne_const.TAG_TRANSFER_ACT_LOG -- peer is transferring activity log data to us
-            if self._CONFIG['Log']['AllowActTrans'] == True and _act_log_lock == False:
-                _peer_id = bytes_to_int(_data[7:11])
-                if (_peer_id in self._peers and self._peers[_peer_id]['CONNECTION'] == "YES" and
-                    self._peers[_peer_id]['IP'] == _host and self._peers[_peer_id]['PORT'] == _port):
-                    _msg = _data[11:-1].decode()
-                    self._act_log_file.seek(0, 2)
-                    self._act_log_file.write(str(_peer_id) + ' ' + _msg + '\n')
-                    self._act_log_file.flush()
-
-        elif _data[:8] == fne_const.TAG_TRANSFER_DIAG_LOG: # fne_const.TAG_TRANSFER_DIAG_LOG -- peer is transferring diagnostics log data to us
-            if self._CONFIG['Log']['AllowDiagTrans'] == True:
-                _peer_id = bytes_to_int(_data[8:12])
-                if (_peer_id in self._peers and self._peers[_peer_id]['CONNECTION'] == "YES" and
-                    self._peers[_peer_id]['IP'] == _host and self._peers[_peer_id]['PORT'] == _port):
-                    _msg = _data[12:-1].decode()
-                    diag_log_file = get_peer_diag_log_handler(self._CONFIG, self._logger, _peer_id)
+                _msg = _data[11:-1].decode()
+                self._act_log_file.write(str(_peer_id) + ' ' + _msg + '\n')
 
-                    if diag_log_file != None:
-                        diag_log_file.seek(0, 2)
-                        diag_log_file.write(str(_peer_id) + ' ' + _msg + '\n')
-                        diag_log_file.flush()
+    # TRNSDIAG -- peer is transferring diagnostics log data to us
+    def master_process_trnsdiag(self, _data, _host, _port):
+        if self._CONFIG['Log']['AllowDiagTrans'] == True:
+            _peer_id = bytes_to_int(_data[8:12])
+            if (_peer_id in self._peers and self._peers[_peer_id]['CONNECTION'] == "YES" and
+                self._peers[_peer_id]['IP'] == _host and self._peers[_peer_id]['PORT'] == _port):
+                _msg = _data[12:-1].decode()
+                _this_peer = self._peers[_peer_id]
+                if _this_peer['DIAG_LOG_FILE'] == None:
+                    _this_peer['DIAG_LOG_FILE'] = get_peer_diag_log_filename(self._CONFIG, _peer_id)
+
+                get_peer_diag_logs(self._CONFIG, self._logger).write(_this_peer['DIAG_LOG_FILE'], str(_peer_id) + ' ' + _msg + '\n')
 
-        else:
-            try:
-                self._logger.error('(%s) Unrecognized command PEER %s PACKET %s', self._system, _peer_id, ahex(_data))
-            except UnboundLocalError:
-                self._logger.error('(%s) Unrecognized command %s PACKET %s', self._system, _data[:9], ahex(_data))
-        
     # Aliased in __init__ to datagramReceived if system is a peer
     def peer_datagramReceived(self, _data, hostInfo): # hostInfo is tuple; converted from 2.x to 3.x syntax
         _host, _port = hostInfo
-        if self._CONFIG['Log']['RawPacketTrace']:
-            self._logger.debug('(%s) Network Received (from %s:%s) -- %s', self._system, _host, _port, ahex(_data))
+        if self._hook_stats != None:
+            self._hook_stats.received(len(_data))
+        if self._capture != None:
+            self._capture.write(CAPTURE_RX, self._system, self._config['Port'], hostInfo, _data)
 
         # validate that we receveived this packet from the master - security check!
         if self._config['MasterAddress'] == _host and self._config['MasterPort'] == _port:
             # process opcode from data, usually first 4 bytes but can be a varied length
             # depending on the opcode
-            if _data[:4] == fne_const.TAG_DMR_DATA: # fne_const.TAG_DMR_DATA -- encapsulated DMR data frame
-                _peer_id = bytes_to_int(_data[11:15])
-                if _peer_id != self._config['PeerId']:
-                    #self._logger.warning('(%s) PEER %s; routed traffic, rewriting PEER %s', self._system, _peer_id, self._config['PeerId'])
-                    _peer_id = self._config['PeerId']
-
-                if _peer_id == self._config['PeerId']: # Validate the source and intended target
-                    _seq = _data[4:5]
-                    _rf_src = bytes_to_int(_data[5:8])
-                    _dst_id = bytes_to_int(_data[8:11])
-                    _bits = _data[15]
-                    _slot = 2 if (_bits & 0x80) else 1
-                    _call_type = 'unit' if (_bits & 0x40) else 'group'
-                    _frame_type = (_bits & 0x30) >> 4
-                    _dtype_vseq = (_bits & 0xF) # data, 1=voice header, 2=voice terminator; voice, 0=burst A ...  5=burst F
-                    _stream_id = bytes_to_int(_data[16:20])
-
-                    # If AMBE audio exporting is configured...
-                    if self._config['ExportAMBE']:
-                        self._ambe.parse_ambe(self._system, _data)
-
-                    # Userland actions -- typically this is the function you
-                    # subclass for an application
-                    self.dmrd_received(_peer_id, _rf_src, _dst_id, _seq, _slot, _call_type, _frame_type, _dtype_vseq, _stream_id, _data)
-
-            elif _data[:4] == fne_const.TAG_P25_DATA: # fne_const.TAG_P25_DATA -- encapsulated P25 data
-                _peer_id = bytes_to_int(_data[11:15])
-                if _peer_id != self._config['PeerId']:
-                    #self._logger.warning('(%s) PEER %s; routed traffic, rewriting PEER %s', self._system, _peer_id, self._config['PeerId'])
-                    _peer_id = self._config['PeerId']
-
-                if _peer_id == self._config['PeerId']: # Validate the source and intended target
-                    _rf_src = bytes_to_int(_data[5:8])
-                    _dst_id = bytes_to_int(_data[8:11])
-                    _call_type = 'unit' if (_data[4] == 0x03) else 'group'
-                    _duid = _data[22]
-                    _dtype_vseq = fne_const.FT_VOICE if ((_duid != fne_const.P25_DUID_TDU) and (_duid != fne_const.P25_DUID_TDULC)) else fne_const.DT_TERMINATOR_WITH_LC
-                    _stream_id = bytes_to_int(_data[16:20])
-
-                    # Userland actions -- typically this is the function you
-                    # subclass for an application
-                    self.p25d_received(_peer_id, _rf_src, _dst_id, _call_type, _duid, _dtype_vseq, _stream_id, _data)
-
-            elif _data[:5] == fne_const.TAG_MASTER_CLOSING: # MSTCL -- notify us the master is closing down
-                if bytes_to_int(_data[5:9]) == self._config['PeerId']:
-                    self._stats['CONNECTION'] = 'NO'
-                    self._logger.info('(%s) PEER %s MSTCL recieved', self._system, self._config['PeerId'])
-
-            elif _data[:6] == fne_const.TAG_MASTER_NAK: # fne_const.TAG_MASTER_NAK -- a NACK from the master
-                _peer_id = bytes_to_int(_data[6:10])
-                if _peer_id == self._config['PeerId']: # Validate the source and intended target
-                    self._logger.warning('(%s) PEER %s MSTNAK received', self._system, self._config['PeerId'])
-                    self._stats['CONNECTION'] = 'NO' # Disconnect ourselves and re-register
-
-            elif _data[:6] == fne_const.TAG_REPEATER_ACK: # fne_const.TAG_REPEATER_ACK -- an ACK from the master
-                # Depending on the state, an RPTACK means different things, in
-                # each clause, we check
-                # and/or set the state
-                if self._stats['CONNECTION'] == 'RPTL_SENT': # If we've sent a login request...
-                    _login_int32 = bytes_to_int(_data[6:10])
-                    self._logger.info('(%s) PEER %s login ACK received with ID %s', self._system, self._config['PeerId'], _login_int32)
-                    _pass_hash = sha256(int_to_bytes(_login_int32) + self._config['Passphrase'].encode()).hexdigest()
-                    _pass_hash = bhex(_pass_hash)
-                    self.send_master(fne_const.TAG_REPEATER_AUTH + int_to_bytes(self._config['PeerId']) + _pass_hash)
-                    self._stats['CONNECTION'] = 'AUTHENTICATED'
-
-                elif self._stats['CONNECTION'] == 'AUTHENTICATED': # If we've sent the login challenge...
-                    if bytes_to_int(_data[6:10]) == self._config['PeerId']:
-                        self._logger.info('(%s) PEER %s authentication accepted', self._system, self._config['PeerId'])
-                        _peer_config = {
-                            'identity': self._config['Identity'],
-                            'rxFrequency': self._config['RxFrequency'],
-                            'txFrequency': self._config['TxFrequency'],
-                            'info': {
-                                'latitude': self._config['Latitude'],
-                                'longitude': self._config['Longitude'],
-                                'height': 0,
-                                'location': self._config['Location'],
-                            },
-                            'channel': {
-                                'txOffsetMhz': 0,
-                                'chBandwidthKhz': 0,
-                                'channelId': 0,
-                                'channelNo': 0,
-                                'txPower': 0
-                            },
-                            'rcon': {
-                                'password': 'ABCD123',
-                                'port': 0
-                            }
-                        }
-
-                        _config_packet = json.dumps(_peer_config, separators=(',', ':')).encode()
-
-                        self.send_master(fne_const.TAG_REPEATER_CONFIG + int_to_bytes(self._config['PeerId']) + _config_packet)
-                        self._stats['CONNECTION'] = 'CONFIG-SENT'
-                        self._logger.info('(%s) PEER %s Configuration sent to master', self._system, self._config['PeerId'])
-                    else:
-                        self._stats['CONNECTION'] = 'NO'
-                        self._logger.error('(%s) PEER %s Configuration master ACK Contained peer wrong ID - Connection Reset', self._system,
-                                           self._config['PeerId'])
-
-                elif self._stats['CONNECTION'] == 'CONFIG-SENT': # If we've sent out configuration to the master
-                    if bytes_to_int(_data[6:10]) == self._config['PeerId']:
-                        self._logger.info('(%s) PEER %s Master accepted configuration', self._system, self._config['PeerId'])
-                        self._stats['CONNECTION'] = 'YES'
-                        self._logger.info('(%s) PEER %s Connection to MASTER Completed', self._system, self._config['PeerId'])
-                    else:
-                        self._stats['CONNECTION'] = 'NO'
-                        self._logger.error('(%s) PEER %s Master ACK Contained wrong peer ID - Connection Reset', self._system,
-                                           self._config['PeerId'])
-
-            elif _data[:7] == fne_const.TAG_MASTER_PONG: # fne_const.TAG_MASTER_PONG -- a reply to RPTPING (send by peer)
-                if bytes_to_int(_data[7:11]) == self._config['PeerId']:
-                    self._stats['PINGS_ACKD'] += 1
-                    self._logger.debug('(%s) PEER %s MSTPONG received, pongs since connected %s', self._system,
-                                       self._config['PeerId'], self._stats['PINGS_ACKD'])
+            if self.dispatch_opcode(_data, _host, _port) == False:
+                self._logger.error('(%s) Unrecognized command PEER %s PACKET %s', self._system, self._config['PeerId'], lazy_ahex(_data))
 
+    # DMRD -- encapsulated DMR data frame
+    def peer_process_dmrd(self, _data, _host, _port):
+        if len(_data) < DMRD_MIN_LEN:
+            self._logger.warning('(%s) DMRD: Dropped short packet (%s bytes) from %s:%s', self._system, len(_data), _host, _port)
+            return
+
+        _frame = dmrdFrame(_data)
+        if _frame.peer_id != self._config['PeerId']:
+            #self._logger.warning('(%s) PEER %s; routed traffic, rewriting PEER %s', self._system, _frame.peer_id, self._config['PeerId'])
+            _frame.peer_id = self._config['PeerId']
+
+        if _frame.peer_id == self._config['PeerId']: # Validate the source and intended target
+            # If the jitter buffer is enabled, the frame is delivered
+            # (in sequence order) when the buffer releases it
+            if self._jitter != None:
+                self._jitter.queue(_frame)
             else:
-                self._logger.error('(%s) Unrecognized command PEER %s PACKET %s', self._system, self._config['PeerId'], ahex(_data))
+                self.peer_deliver_dmrd(_frame)
+
+    # Export and hand a DMRD frame from the master to the application
+    def peer_deliver_dmrd(self, _frame):
+        # If AMBE audio exporting is configured...
+        if self._config['ExportAMBE']:
+            self._ambe.parse_ambe(self._system, _frame.data)
+
+        # Userland actions -- typically this is the function you
+        # subclass for an application
+        self.dmrd_received(_frame)
+
+    # P25D -- encapsulated P25 data
+    def peer_process_p25d(self, _data, _host, _port):
+        if len(_data) < P25D_MIN_LEN:
+            self._logger.warning('(%s) P25D: Dropped short packet (%s bytes) from %s:%s', self._system, len(_data), _host, _port)
+            return
+
+        _frame = p25dFrame(_data)
+        if _frame.peer_id != self._config['PeerId']:
+            #self._logger.warning('(%s) PEER %s; routed traffic, rewriting PEER %s', self._system, _frame.peer_id, self._config['PeerId'])
+            _frame.peer_id = self._config['PeerId']
+
+        if _frame.peer_id == self._config['PeerId']: # Validate the source and intended target
+            # Userland actions -- typically this is the function you
+            # subclass for an application
+            self.p25d_received(_frame)
+
+    # MSTCL -- notify us the master is closing down
+    def peer_process_mstcl(self, _data, _host, _port):
+        if bytes_to_int(_data[5:9]) == self._config['PeerId']:
+            self._stats['CONNECTION'] = 'NO'
+            self.report_changed('SYSTEMS', self._system)
+            self._logger.info('(%s) PEER %s MSTCL recieved', self._system, self._config['PeerId'])
+
+    # MSTNAK -- a NACK from the master
+    def peer_process_mstnak(self, _data, _host, _port):
+        _peer_id = bytes_to_int(_data[6:10])
+        if _peer_id == self._config['PeerId']: # Validate the source and intended target
+            self._logger.warning('(%s) PEER %s MSTNAK received', self._system, self._config['PeerId'])
+            self._stats['CONNECTION'] = 'NO' # Disconnect ourselves and re-register
+            self.report_changed('SYSTEMS', self._system)
+
+    # RPTACK -- an ACK from the master
+    def peer_process_rptack(self, _data, _host, _port):
+        self.report_changed('SYSTEMS', self._system)
+
+        # Depending on the state, an RPTACK means different things, in
+        # each clause, we check
+        # and/or set the state
+        if self._stats['CONNECTION'] == 'RPTL_SENT': # If we've sent a login request...
+            _login_int32 = bytes_to_int(_data[6:10])
+            self._logger.info('(%s) PEER %s login ACK received with ID %s', self._system, self._config['PeerId'], _login_int32)
+            _pass_hash = sha256(int_to_bytes(_login_int32) + self._config['Passphrase'].encode()).hexdigest()
+            _pass_hash = bhex(_pass_hash)
+            self.send_master(fne_const.TAG_REPEATER_AUTH + int_to_bytes(self._config['PeerId']) + _pass_hash)
+            self._stats['CONNECTION'] = 'AUTHENTICATED'
+
+        elif self._stats['CONNECTION'] == 'AUTHENTICATED': # If we've sent the login challenge...
+            if bytes_to_int(_data[6:10]) == self._config['PeerId']:
+                self._logger.info('(%s) PEER %s authentication accepted', self._system, self._config['PeerId'])
+                _peer_config = {
+                    'identity': self._config['Identity'],
+                    'rxFrequency': self._config['RxFrequency'],
+                    'txFrequency': self._config['TxFrequency'],
+                    'info': {
+                        'latitude': self._config['Latitude'],
+                        'longitude': self._config['Longitude'],
+                        'height': 0,
+                        'location': self._config['Location'],
+                    },
+                    'channel': {
+                        'txOffsetMhz': 0,
+                        'chBandwidthKhz': 0,
+                        'channelId': 0,
+                        'channelNo': 0,
+                        'txPower': 0
+                    },
+                    'rcon': {
+                        'password': 'ABCD123',
+                        'port': 0
+                    }
+                }
+
+                _config_packet = json.dumps(_peer_config, separators=(',', ':')).encode()
+
+                self.send_master(fne_const.TAG_REPEATER_CONFIG + int_to_bytes(self._config['PeerId']) + _config_packet)
+                self._stats['CONNECTION'] = 'CONFIG-SENT'
+                self._logger.info('(%s) PEER %s Configuration sent to master', self._system, self._config['PeerId'])
+            else:
+                self._stats['CONNECTION'] = 'NO'
+                self._logger.error('(%s) PEER %s Configuration master ACK Contained peer wrong ID - Connection Reset', self._system,
+                                   self._config['PeerId'])
+
+        elif self._stats['CONNECTION'] == 'CONFIG-SENT': # If we've sent out configuration to the master
+            if bytes_to_int(_data[6:10]) == self._config['PeerId']:
+                self._logger.info('(%s) PEER %s Master accepted configuration', self._system, self._config['PeerId'])
+                self._stats['CONNECTION'] = 'YES'
+                self._logger.info('(%s) PEER %s Connection to MASTER Completed', self._system, self._config['PeerId'])
+            else:
+                self._stats['CONNECTION'] = 'NO'
+                self._logger.error('(%s) PEER %s Master ACK Contained wrong peer ID - Connection Reset', self._system,
+                                   self._config['PeerId'])
+
+    # MSTPONG -- a reply to RPTPING (send by peer)
+    def peer_process_mstpong(self, _data, _host, _port):
+        if bytes_to_int(_data[7:11]) == self._config['PeerId']:
+            self._stats['PINGS_ACKD'] += 1
+            self.report_changed('SYSTEMS', self._system)
+            self._logger.debug('(%s) PEER %s MSTPONG received, pongs since connected %s', self._system,
+                               self._config['PeerId'], self._stats['PINGS_ACKD'])
 
 # ---------------------------------------------------------------------------
 #   Class Declaration
-#     This implements the socket-based reporting logic.
+#     This implements the socket-based reporting logic. Messages to a client
+#     are written straight out while the transport keeps up; once it asks
+#     us to pause (its buffer is full) they are queued, up to ClientQueueSize.
+#     Queued state is coalesced (a queued HOOK_STATS is replaced by the next,
+#     and state deltas are replaced by one snapshot taken when the queue is
+#     sent), and if the queue is still full the oldest events are dropped.
 # ---------------------------------------------------------------------------
 
+@implementer(IPushProducer)
 class report(NetstringReceiver):
     def __init__(self, factory):
         self._factory = factory
+        self._max_queued = self._factory._config['Reports']['ClientQueueSize'] * 1024
+
+        # [opcode, message] entries; a message of None is a snapshot that is
+        # taken as it is sent
+        self._queue = deque()
+        self._paused = False
+        self._resync = False
+
+        self.QUEUED = 0
+        self.MAX_QUEUED = 0
+        self.SENT = 0
+        self.COALESCED = 0
+        self.DROPPED = 0
 
     def connectionMade(self):
+        self.transport.registerProducer(self, True)
+        self._factory.send_snapshot(self)
         self._factory.clients.append(self)
         self._factory._logger.info('Reporting client connected: %s', self.transport.getPeer())
 
@@ -1007,6 +1482,97 @@ class report(NetstringReceiver):
         self._factory._logger.info('Reporting client disconnected: %s', self.transport.getPeer())
         self._factory.clients.remove(self)
 
+    def pauseProducing(self):
+        self._paused = True
+
+    def resumeProducing(self):
+        self._paused = False
+        self.send_queued()
+
+    def stopProducing(self):
+        self._paused = True
+        self._queue.clear()
+        self.QUEUED = 0
+
+    def send_message(self, _message):
+        if not self._paused and not self._queue:
+            self.sendString(_message)
+            self.SENT += 1
+            return
+
+        _opcode = _message[:1]
+        if _opcode == REPORT_OPCODES['STATE_SNAPSHOT']:
+            self.resync()
+        elif _opcode == REPORT_OPCODES['STATE_DELTA'] and self._resync:
+            # the queued snapshot will include this
+            self.COALESCED += 1
+        else:
+            if _opcode in REPORT_LATEST_OPCODES:
+                self.discard(_opcode)
+            self._queue.append([_opcode, _message])
+            self.QUEUED += len(_message)
+
+        if self.QUEUED > self._max_queued:
+            self.resync()
+        while self.QUEUED > self._max_queued and self.drop_event():
+            pass
+
+        self.MAX_QUEUED = max(self.MAX_QUEUED, self.QUEUED)
+        self.send_queued()
+
+    def send_queued(self):
+        while self._queue and not self._paused:
+            _opcode, _message = self._queue.popleft()
+            if _message == None:
+                self._resync = False
+                _message = REPORT_OPCODES['STATE_SNAPSHOT'] + self._factory._state.snapshot()
+            else:
+                self.QUEUED -= len(_message)
+
+            self.sendString(_message)
+            self.SENT += 1
+
+    # Remove queued messages with the given opcode
+    def discard(self, _opcode):
+        for _entry in [_entry for _entry in self._queue if _entry[0] == _opcode]:
+            self._queue.remove(_entry)
+            self.QUEUED -= len(_entry[1])
+            self.COALESCED += 1
+
+    # Replace any queued state snapshots and deltas with a single snapshot
+    def resync(self):
+        self.discard(REPORT_OPCODES['STATE_DELTA'])
+        if not self._resync:
+            self._resync = True
+            self._queue.append([REPORT_OPCODES['STATE_SNAPSHOT'], None])
+        else:
+            self.COALESCED += 1
+
+    # Drop the oldest queued event (anything other than state); returns False
+    # if there is none to drop
+    def drop_event(self):
+        for _entry in self._queue:
+            if _entry[0] not in REPORT_STATE_OPCODES:
+                self._queue.remove(_entry)
+                self.QUEUED -= len(_entry[1])
+                if self.DROPPED == 0:
+                    self._factory._logger.warning('Reporting client %s is not keeping up; dropping events', self.transport.getPeer())
+                self.DROPPED += 1
+                return True
+        return False
+
+    # Returns the send queue counters (published with the report state)
+    def lag(self):
+        return {
+            'QUEUED': self.QUEUED,
+            'QUEUE_LEN': len(self._queue),
+            'MAX_QUEUED': self.MAX_QUEUED,
+            'PAUSED': self._paused,
+            'SENT': self.SENT,
+            'COALESCED': self.COALESCED,
+            'DROPPED': self.DROPPED,
+        }
+
     def stringReceived(self, data):
         self.process_message(data)
 
@@ -1016,7 +1582,9 @@ class report(NetstringReceiver):
         _message = _message.decode()
         if opcode == REPORT_OPCODES['CONFIG_REQ']:
             self._factory._logger.info('Reporting client sent \'CONFIG_REQ\': %s', self.transport.getPeer())
-            self.send_config()
+            self._factory.send_snapshot(self)
+            if self._factory._config['Reports']['LegacyReports']:
+                self.send_message(self._factory.config_message())
         elif opcode == REPORT_OPCODES['RCON_REQ']:
             _arguments = _message.split(',')
             if (len(_arguments) < 6):
@@ -1095,6 +1663,12 @@ class reportFactory(Factory):
     def __init__(self, config, logger):
         self._config = config
         self._logger = logger
+
+        # the system configuration is published per system (without its
+        # peers) and per peer
+        self._state = stateStore()
+        self._state.register('SYSTEMS', self._config['Systems'].keys, self.system_state)
+        self._state.register('PEERS', self.peer_keys, self.peer_state)
         
     def buildProtocol(self, addr):
         if (addr.host) in self._config['Reports']['ReportClients'] or '*' in self._config['Reports']['ReportClients']:
@@ -1104,15 +1678,72 @@ class reportFactory(Factory):
             self._logger.error('Invalid report server connection attempt from: %s:%s', addr.host, addr.port)
             return None
 
-    def send_timed(self):
-        pass
-            
     def send_clients(self, _message):
         if self._config['Reports']['Report']:
             for client in self.clients:
-                client.sendString(_message)
+                client.send_message(_message)
             
-    def send_config(self):
-        #print(self._config['Systems'])
+    def system_state(self, _system):
+        return {_key: _value for _key, _value in self._config['Systems'][_system].items() if _key != 'PEERS'}
+
+    def peer_keys(self):
+        _keys = []
+        for _system, _system_config in self._config['Systems'].items():
+            for _peer_id in _system_config.get('PEERS', {}):
+                _keys.append((_system, _peer_id))
+        return _keys
+
+    def peer_state(self, _key):
+        return self._config['Systems'][_key[0]]['PEERS'][_key[1]]
+
+    # Mark an item of the published state as changed (or, without a key,
+    # every item of the section); it is sent on with the next delta
+    def changed(self, _section, _key = STATE_ALL):
+        if self._config['Reports']['Report']:
+            self._state.changed(_section, _key)
+
+    # Bring the small, wholesale sections of the published state up to date;
+    # the rest is marked as changed where it changes
+    def update_state(self):
+        _clients = {}
+        for _client in self.clients:
+            _addr = _client.transport.getPeer()
+            _clients['{}:{}'.format(_addr.host, _addr.port)] = _client.lag()
+        self._state.update('CLIENTS', _clients)
+
+    # Send what has changed in the published state since the last update
+    def send_state(self):
+        self.update_state()
+        _delta = self._state.delta()
+        if _delta != None:
+            self.send_clients(REPORT_OPCODES['STATE_DELTA'] + _delta)
+
+    # Send the whole published state to a (newly connected) client
+    def send_snapshot(self, _client):
+        self.send_state()
+        _client.send_message(REPORT_OPCODES['STATE_SNAPSHOT'] + self._state.snapshot())
+
+    # Full state messages, for report clients that predate STATE_SNAPSHOT and
+    # STATE_DELTA (Reports LegacyReports)
+    def send_timed(self):
+        pass
+
+    def config_message(self):
         serialized = pickle.dumps(self._config['Systems'], protocol = pickle.HIGHEST_PROTOCOL)
-        self.send_clients(REPORT_OPCODES['CONFIG_RSP'] + serialized)
+        return REPORT_OPCODES['CONFIG_RSP'] + serialized
+
+    def send_config(self):
+        self.send_clients(self.config_message())
+
+    # Send the hook latency and traffic counter snapshots for the systems that
+    # keep them (Reports HookStats)
+    def send_hook_stats(self):
+        global systems
+        _stats = {}
+        for _system in systems:
+            if systems[_system]._hook_stats != None:
+                _stats[_system] = systems[_system]._hook_stats.snapshot()
+
+        if _stats:
+            serialized = pickle.dumps(_stats, protocol = pickle.HIGHEST_PROTOCOL)
+            self.send_clients(REPORT_OPCODES['HOOK_STATS'] + serialized)
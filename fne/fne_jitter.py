@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+#
+# Digital Voice Modem - Fixed Network Equipment
+# GPLv2 Open Source. Use is subject to license terms.
+# DO NOT ALTER OR REMOVE COPYRIGHT NOTICES OR THIS FILE HEADER.
+#
+# @package DVM / FNE
+#
+###############################################################################
+#   Copyright (C) 2017-2021 Bryan Biedenkapp <gatekeep@gmail.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+###############################################################################
+from __future__ import print_function
+
+from time import time
+
+from twisted.internet import task
+
+from fne import fne_const
+
+# Interval frames are released at (one DMR burst)
+JITTER_INTERVAL = 0.06
+
+# Number of clean (in order, on time) frames released before a stream's
+# depth is stepped back down by one frame
+JITTER_SHRINK = 50
+
+# Time (in seconds) a stream may go without receiving a frame before it is
+# flushed and dropped
+JITTER_TIMEOUT = 1
+
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     Jitter buffer counters; kept for each stream and summed for each peer.
+# ---------------------------------------------------------------------------
+
+class jitterStats(object):
+    __slots__ = ('RECEIVED', 'RELEASED', 'LATE', 'LOST', 'DUPLICATE')
+
+    def __init__(self):
+        self.RECEIVED = 0
+        self.RELEASED = 0
+        self.LATE = 0
+        self.LOST = 0
+        self.DUPLICATE = 0
+
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     Reorder state for a single DMRD stream. Frames are held by their
+#     sequence number (which wraps at 255) until the stream has buffered
+#     DEPTH frames, and are then released one per tick in sequence order.
+# ---------------------------------------------------------------------------
+
+class jitterStream(object):
+    def __init__(self, _key, _depth, _now):
+        self.KEY = _key
+        self.DEPTH = _depth
+        self.STATS = jitterStats()
+
+        self.FRAMES = {}
+        self.NEXT = None
+        self.STARTED = False
+        self.WAITED = 0
+        self.HOLD = 0
+        self.CLEAN = 0
+        self.ENDED = False
+        self.LAST = _now
+
+        # 0 - not yet released, 1 - released, 2 - skipped (lost); entries are
+        # cleared half a sequence space ahead of the release point
+        self.DONE = bytearray(256)
+
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     Optional per-stream adaptive jitter buffer for DMRD frames. Frames are
+#     queued with queue() and handed to the release function from a reactor
+#     timer, in sequence order, one per JITTER_INTERVAL for each stream.
+#
+#     Each stream starts at the configured depth; a late frame grows that
+#     stream's depth by one (up to the maximum depth) and JITTER_SHRINK clean
+#     frames step it back down.
+# ---------------------------------------------------------------------------
+
+class jitterBuffer(object):
+    def __init__(self, _name, _logger, _release, _depth, _max_depth):
+        self._system = _name
+        self._logger = _logger
+        self._release = _release
+        self._depth = max(1, _depth)
+        self._max_depth = max(self._depth, _max_depth)
+
+        # (peer ID, slot, stream ID) -> jitterStream
+        self._streams = {}
+
+        # peer ID -> jitterStats
+        self.PEERS = {}
+
+        self._timer = task.LoopingCall(self.tick)
+
+    # Returns the jitter counters for the given peer (or None)
+    def peer_stats(self, _peer_id):
+        return self.PEERS.get(_peer_id)
+
+    # Drop counters for peers that are no longer connected
+    def prune_peers(self, _peers):
+        for _peer_id in list(self.PEERS):
+            if _peer_id not in _peers:
+                del self.PEERS[_peer_id]
+
+    def count(self, _stream, _field, _count = 1):
+        _stats = _stream.STATS
+        setattr(_stats, _field, getattr(_stats, _field) + _count)
+        _stats = self.PEERS[_stream.KEY[0]]
+        setattr(_stats, _field, getattr(_stats, _field) + _count)
+
+    def queue(self, _frame):
+        _now = time()
+        _key = (_frame.peer_id, _frame.slot, _frame.stream_id)
+        _seq = _frame.seq
+
+        _stream = self._streams.get(_key)
+        if _stream == None:
+            _stream = jitterStream(_key, self._depth, _now)
+            _stream.NEXT = _seq
+            self._streams[_key] = _stream
+            if _frame.peer_id not in self.PEERS:
+                self.PEERS[_frame.peer_id] = jitterStats()
+
+        _stream.LAST = _now
+        self.count(_stream, 'RECEIVED')
+
+        # frames at or behind the release point have either been released
+        # already (duplicate) or been given up on (late)
+        if _stream.STARTED and ((_seq - _stream.NEXT) & 0xFF) >= 128:
+            if _stream.DONE[_seq] == 1:
+                self.count(_stream, 'DUPLICATE')
+            else:
+                self.count(_stream, 'LATE')
+                if _stream.DEPTH < self._max_depth:
+                    _stream.DEPTH += 1
+                    _stream.HOLD += 1
+                _stream.CLEAN = 0
+            return
+
+        if _seq in _stream.FRAMES:
+            self.count(_stream, 'DUPLICATE')
+            return
+
+        # before the stream starts, the release point follows the earliest
+        # frame seen
+        if not _stream.STARTED and ((_seq - _stream.NEXT) & 0xFF) >= 128:
+            _stream.NEXT = _seq
+
+        _stream.FRAMES[_seq] = _frame
+        if (_frame.frame_type == fne_const.FT_DATA_SYNC) and (_frame.dtype_vseq == fne_const.DT_TERMINATOR_WITH_LC):
+            _stream.ENDED = True
+
+        if not self._timer.running:
+            self._timer.start(JITTER_INTERVAL, now = False)
+
+    # Release the frame at the head of the stream, skipping over any missing
+    # sequence numbers
+    def release_next(self, _stream):
+        _gap = 0
+        while _stream.NEXT not in _stream.FRAMES:
+            _stream.DONE[_stream.NEXT] = 2
+            _stream.DONE[(_stream.NEXT + 128) & 0xFF] = 0
+            _stream.NEXT = (_stream.NEXT + 1) & 0xFF
+            _gap += 1
+
+        if _gap > 0:
+            self.count(_stream, 'LOST', _gap)
+            _stream.CLEAN = 0
+        else:
+            _stream.CLEAN += 1
+
+        _frame = _stream.FRAMES.pop(_stream.NEXT)
+        _stream.DONE[_stream.NEXT] = 1
+        _stream.DONE[(_stream.NEXT + 128) & 0xFF] = 0
+        _stream.NEXT = (_stream.NEXT + 1) & 0xFF
+        self.count(_stream, 'RELEASED')
+
+        try:
+            self._release(_frame)
+        except Exception:
+            self._logger.exception('(%s) Jitter buffer failed to release frame STREAM ID %s', self._system, _stream.KEY[2])
+
+    def tick(self):
+        _now = time()
+        for _key in list(self._streams):
+            _stream = self._streams[_key]
+
+            # stream went quiet; play out whatever is left and forget it
+            if (_now - _stream.LAST) > JITTER_TIMEOUT:
+                while _stream.FRAMES:
+                    self.release_next(_stream)
+                self.end_stream(_stream)
+                continue
+
+            if not _stream.FRAMES:
+                continue
+
+            if not _stream.STARTED:
+                _stream.WAITED += 1
+                if len(_stream.FRAMES) < _stream.DEPTH and _stream.WAITED < _stream.DEPTH and not _stream.ENDED:
+                    continue
+                _stream.STARTED = True
+
+            # a late frame grew the depth; skip a release to let it fill
+            if _stream.HOLD > 0 and not _stream.ENDED:
+                _stream.HOLD -= 1
+                continue
+
+            self.release_next(_stream)
+
+            # drain anything that has built up beyond the maximum depth (the
+            # source is running fast, or a burst arrived at once)
+            while len(_stream.FRAMES) > self._max_depth:
+                self.release_next(_stream)
+
+            if _stream.CLEAN >= JITTER_SHRINK and _stream.DEPTH > self._depth:
+                _stream.DEPTH -= 1
+                _stream.CLEAN = 0
+                if _stream.FRAMES:
+                    self.release_next(_stream)
+
+            if _stream.ENDED and not _stream.FRAMES:
+                self.end_stream(_stream)
+
+        if not self._streams and self._timer.running:
+            self._timer.stop()
+
+    def end_stream(self, _stream):
+        _stats = _stream.STATS
+        if _stats.LATE or _stats.LOST or _stats.DUPLICATE:
+            self._logger.debug('(%s) Jitter PEER %s TS %s STREAM ID %s; RX %s LATE %s LOST %s DUP %s DEPTH %s', self._system,
+                               _stream.KEY[0], _stream.KEY[1], _stream.KEY[2], _stats.RECEIVED, _stats.LATE, _stats.LOST,
+                               _stats.DUPLICATE, _stream.DEPTH)
+        del self._streams[_stream.KEY]
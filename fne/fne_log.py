@@ -23,9 +23,100 @@
 #   along with this program; if not, write to the Free Software Foundation,
 #   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 ###############################################################################
+import atexit
 import logging
+import queue
 
+from binascii import b2a_hex as ahex
 from logging.config import dictConfig
+from logging.handlers import QueueHandler, QueueListener
+
+# Maximum number of log records waiting for the logging thread (LogQueue);
+# records logged while the queue is full are dropped rather than blocking
+LOG_QUEUE_SIZE = 10000
+
+# Listener (thread) writing queued log records to the configured handlers
+_listener = None
+
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     Log argument that is only evaluated when the message is formatted; so
+#     a disabled level never pays for it. The function and its arguments are
+#     kept by reference, so they must not change after the call is logged.
+# ---------------------------------------------------------------------------
+
+class lazyArg(object):
+    __slots__ = ('_func', '_args')
+
+    def __init__(self, _func, *args):
+        self._func = _func
+        self._args = args
+
+    def __str__(self):
+        return str(self._func(*self._args))
+
+    def __repr__(self):
+        return repr(self._func(*self._args))
+
+# Hex dump of a buffer, as a lazy log argument
+def lazy_ahex(_data):
+    return lazyArg(ahex, _data)
+
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     Queue handler for LogQueue; records are queued as they are and are
+#     formatted (along with any lazy arguments) by the listener thread.
+# ---------------------------------------------------------------------------
+
+class deferredQueueHandler(QueueHandler):
+    def __init__(self, _queue):
+        QueueHandler.__init__(self, _queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+# ---------------------------------------------------------------------------
+#   Module Routines
+# ---------------------------------------------------------------------------
+
+# Move the handlers of the given loggers behind a queue, serviced by a
+# listener thread; so formatting and file/syslog I/O don't run on the reactor
+def queue_logging(_names):
+    global _listener
+    _handlers = []
+    for _name in _names:
+        for _handler in logging.getLogger(_name).handlers:
+            if _handler not in _handlers:
+                _handlers.append(_handler)
+
+    _queue = queue.Queue(LOG_QUEUE_SIZE)
+    _queue_handler = deferredQueueHandler(_queue)
+    for _name in _names:
+        _log = logging.getLogger(_name)
+        for _handler in list(_log.handlers):
+            _log.removeHandler(_handler)
+        _log.addHandler(_queue_handler)
+
+    _listener = QueueListener(_queue, *_handlers, respect_handler_level = True)
+    _listener.start()
+    atexit.register(stop_logging, logging.getLogger(_names[0]), _queue_handler)
+
+# Flush any queued log records and stop the logging thread
+def stop_logging(_logger, _queue_handler):
+    global _listener
+    if _listener != None:
+        if _queue_handler.dropped > 0:
+            _queue_handler.queue.put(_logger.makeRecord(_logger.name, logging.WARNING, __file__, 0,
+                                                        '%s log records were dropped (log queue full)', (_queue_handler.dropped,), None))
+        _listener.stop()
+        _listener = None
 
 def config_logging(_logger):
     dictConfig({
@@ -88,4 +179,7 @@ def config_logging(_logger):
         }
     })
 
+    if _logger.get('LogQueue', False):
+        queue_logging([_logger['LogName'], 'twisted'])
+
     return logging.getLogger(_logger['LogName'])
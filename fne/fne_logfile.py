@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+#
+# Digital Voice Modem - Fixed Network Equipment
+# GPLv2 Open Source. Use is subject to license terms.
+# DO NOT ALTER OR REMOVE COPYRIGHT NOTICES OR THIS FILE HEADER.
+#
+# @package DVM / FNE
+#
+###############################################################################
+#   Copyright (C) 2017-2021 Bryan Biedenkapp <gatekeep@gmail.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+###############################################################################
+from __future__ import print_function
+
+import os
+
+from collections import OrderedDict
+from twisted.internet import task
+
+# Bytes buffered before a log file is written out
+LOG_BUFFER_SIZE = 65536
+
+# Interval (in seconds) buffered lines are written out at, regardless of size
+LOG_FLUSH_INTERVAL = 1
+
+# Bytes held for another attempt after a failed write; beyond this they are
+# dropped
+LOG_RETRY_SIZE = 1048576
+
+# Default number of files a log file pool keeps open
+LOG_POOL_MAX_OPEN = 64
+
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     Buffered, size rotated log file (used for the activity log transferred
+#     by peers). Lines are buffered in memory and written once the buffer
+#     reaches LOG_BUFFER_SIZE or every LOG_FLUSH_INTERVAL; before a write
+#     would take the file past its maximum size the file is rotated (renamed
+#     to .1, .1 to .2 and so on) and a new file opened. Rotation never reads
+#     the file, so it costs the same however large the log is.
+# ---------------------------------------------------------------------------
+
+class bufferedLogFile(object):
+    def __init__(self, _path, _max_size, _backups, _logger):
+        self._path = _path
+        self._max_size = _max_size
+        self._backups = max(1, _backups)
+        self._logger = _logger
+
+        self._buffer = []
+        self._pending = 0
+        self._retry = b''
+
+        self._file = None
+        self.reopen()
+
+        self._flusher = task.LoopingCall(self.flush)
+        self._flusher.start(LOG_FLUSH_INTERVAL, now = False)
+
+    def write(self, _line):
+        _data = _line.encode('utf-8', 'replace')
+        self._buffer.append(_data)
+        self._pending += len(_data)
+        if self._pending >= LOG_BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer and not self._retry:
+            return
+
+        _data = self._retry + b''.join(self._buffer)
+        self._buffer = []
+        self._pending = 0
+        self._retry = b''
+
+        if self._file != None and self._size > 0 and (self._size + len(_data)) > self._max_size:
+            try:
+                self.rotate()
+            except (IOError, OSError) as e:
+                # the lines still go to the current file; rotation is tried
+                # again on the next write
+                self._logger.error('Failed to rotate log file %s: %s', self._path, e)
+
+        try:
+            if self._file == None:
+                self.reopen()
+            self._file.write(_data)
+            self._file.flush()
+            self._size += len(_data)
+        except (IOError, OSError) as e:
+            self._logger.error('Failed to write log file %s: %s', self._path, e)
+            if len(_data) <= LOG_RETRY_SIZE:
+                self._retry = _data
+            else:
+                self._logger.error('Dropped %s bytes of log file %s', len(_data), self._path)
+
+    def reopen(self):
+        self._file = open(self._path, 'ab')
+        self._size = self._file.tell()
+
+    def rotate(self):
+        self._file.close()
+        self._file = None
+        try:
+            for _idx in range(self._backups - 1, 0, -1):
+                _src = '{}.{}'.format(self._path, _idx)
+                if os.path.exists(_src):
+                    os.replace(_src, '{}.{}'.format(self._path, _idx + 1))
+            os.replace(self._path, self._path + '.1')
+            self._logger.info('Rotated log file %s', self._path)
+        finally:
+            # if the rename failed this reopens the same file
+            self.reopen()
+
+    def close(self):
+        if self._flusher.running:
+            self._flusher.stop()
+        self.flush()
+        if self._file != None:
+            self._file.close()
+
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     Pool of buffered log files (used for the diagnostics logs transferred
+#     by peers, one file per peer). Each file has its own buffer, and every
+#     buffer is written out each LOG_FLUSH_INTERVAL (or once it reaches
+#     LOG_BUFFER_SIZE); at most _max_open files are held open, the least
+#     recently written file being closed to make room for another.
+# ---------------------------------------------------------------------------
+
+class logFilePool(object):
+    def __init__(self, _max_open, _logger):
+        self._max_open = max(1, _max_open)
+        self._logger = _logger
+
+        # path -> [buffered lines, buffered bytes]
+        self._buffers = {}
+
+        # path -> open file; least recently written first
+        self._files = OrderedDict()
+
+        self._flusher = task.LoopingCall(self.flush)
+        self._flusher.start(LOG_FLUSH_INTERVAL, now = False)
+
+    def write(self, _path, _line):
+        _data = _line.encode('utf-8', 'replace')
+        _buffer = self._buffers.get(_path)
+        if _buffer == None:
+            _buffer = self._buffers[_path] = [[], 0]
+
+        _buffer[0].append(_data)
+        _buffer[1] += len(_data)
+        if _buffer[1] >= LOG_BUFFER_SIZE:
+            self.flush_file(_path)
+
+    # Returns the open file for the given path, opening it (and closing the
+    # least recently written file, if the pool is full) when needed
+    def handle(self, _path):
+        _file = self._files.get(_path)
+        if _file != None:
+            self._files.move_to_end(_path)
+            return _file
+
+        while len(self._files) >= self._max_open:
+            _old_path, _old_file = self._files.popitem(last = False)
+            _old_file.close()
+
+        _file = open(_path, 'ab')
+        self._files[_path] = _file
+        return _file
+
+    def flush_file(self, _path):
+        _buffer = self._buffers.get(_path)
+        if _buffer == None or not _buffer[0]:
+            return
+
+        _data = b''.join(_buffer[0])
+        _buffer[0] = []
+        _buffer[1] = 0
+
+        try:
+            _file = self.handle(_path)
+            _file.write(_data)
+            _file.flush()
+        except (IOError, OSError) as e:
+            self._logger.error('Failed to write log file %s: %s', _path, e)
+
+    def flush(self):
+        for _path in list(self._buffers):
+            self.flush_file(_path)
+
+    # Writes out and closes the given file only (e.g. when its peer
+    # disconnects), leaving every other file open
+    def close_file(self, _path):
+        self.flush_file(_path)
+        self._buffers.pop(_path, None)
+        _file = self._files.pop(_path, None)
+        if _file != None:
+            _file.close()
+
+    def close(self):
+        if self._flusher.running:
+            self._flusher.stop()
+        for _path in list(self._buffers):
+            self.close_file(_path)
+        for _file in self._files.values():
+            _file.close()
+        self._files.clear()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+#
+# Digital Voice Modem - Fixed Network Equipment
+# GPLv2 Open Source. Use is subject to license terms.
+# DO NOT ALTER OR REMOVE COPYRIGHT NOTICES OR THIS FILE HEADER.
+#
+# @package DVM / FNE
+#
+###############################################################################
+#   Copyright (C) 2017-2021 Bryan Biedenkapp <gatekeep@gmail.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+###############################################################################
+from __future__ import print_function
+
+import pickle
+
+# Marks every item of a section as changed (see stateStore.changed())
+STATE_ALL = None
+
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     Versioned copy of the state published to report clients. State is kept
+#     as sections of items (e.g. one item per peer), each held pickled. Items
+#     of a registered section are only pickled again once they are marked as
+#     changed, and only those whose pickle differs (or that were removed) are
+#     sent on. A client applies each delta on top of the version it holds,
+#     and needs a full snapshot only when it connects or misses a version.
+# ---------------------------------------------------------------------------
+
+class stateStore(object):
+    def __init__(self):
+        self.VERSION = 0
+
+        # section -> {key: pickled item}
+        self.SECTIONS = {}
+
+        # section -> (keys function, item function) (see register())
+        self._registered = {}
+
+        # section -> set of changed keys (or STATE_ALL)
+        self._dirty = {}
+
+        # section -> object the section was last built from (see
+        # update_source())
+        self._sources = {}
+
+        # changes since the last version; section -> {key: pickled item} and
+        # section -> [key, ...]
+        self._set = {}
+        self._del = {}
+
+    # Register a section whose items are tracked by marking them as changed;
+    # _keys() returns the current keys, _item(key) the current item (raising
+    # KeyError once it is gone). Every item is published on the next delta
+    def register(self, _section, _keys, _item):
+        self._registered[_section] = (_keys, _item)
+        self._dirty[_section] = STATE_ALL
+
+    # Mark an item (or, with STATE_ALL, every item) of a registered section as
+    # changed
+    def changed(self, _section, _key = STATE_ALL):
+        if _section not in self._registered:
+            return
+
+        _dirty = self._dirty.get(_section, set())
+        if _dirty == STATE_ALL:
+            return
+        if _key == STATE_ALL:
+            self._dirty[_section] = STATE_ALL
+        else:
+            _dirty.add(_key)
+            self._dirty[_section] = _dirty
+
+    def set_item(self, _section, _key, _item):
+        _current = self.SECTIONS.setdefault(_section, {})
+        _pickled = pickle.dumps(_item, protocol = pickle.HIGHEST_PROTOCOL)
+        if _current.get(_key) != _pickled:
+            _current[_key] = _pickled
+            self._set.setdefault(_section, {})[_key] = _pickled
+
+    def del_item(self, _section, _key):
+        _current = self.SECTIONS.get(_section, {})
+        if _key in _current:
+            del _current[_key]
+            self._set.get(_section, {}).pop(_key, None)
+            self._del.setdefault(_section, []).append(_key)
+
+    # Pickle the changed items of the registered sections
+    def update_changed(self):
+        _dirty = self._dirty
+        self._dirty = {}
+        for _section, _keys in _dirty.items():
+            _get_keys, _get_item = self._registered[_section]
+            if _keys == STATE_ALL:
+                _keys = set(_get_keys()) | set(self.SECTIONS.get(_section, {}))
+
+            for _key in _keys:
+                try:
+                    self.set_item(_section, _key, _get_item(_key))
+                except KeyError:
+                    self.del_item(_section, _key)
+
+    # Bring an (unregistered) section up to date with the given {key: item}
+    # dictionary, pickling every item; any key not in it is removed. Used for
+    # small sections that change wholesale
+    def update(self, _section, _items):
+        for _key, _item in _items.items():
+            self.set_item(_section, _key, _item)
+        for _key in [_key for _key in self.SECTIONS.get(_section, {}) if _key not in _items]:
+            self.del_item(_section, _key)
+
+    # Same as update(), for a section built from an object that is replaced
+    # (rather than changed) when its contents change; the items are only
+    # built, by _build(_source), when the object differs from the last one
+    def update_source(self, _section, _source, _build):
+        if _section in self._sources and self._sources[_section] is _source:
+            return
+        self._sources[_section] = _source
+        self.update(_section, _build(_source))
+
+    # Returns the changes since the last version as a pickled delta message,
+    # and starts a new version; returns None if nothing changed
+    def delta(self):
+        self.update_changed()
+        if not self._set and not self._del:
+            return None
+
+        self.VERSION += 1
+        _delta = {
+            'VERSION': self.VERSION,
+            'BASE': self.VERSION - 1,
+            'SET': self._set,
+            'DEL': self._del,
+        }
+        self._set = {}
+        self._del = {}
+        return pickle.dumps(_delta, protocol = pickle.HIGHEST_PROTOCOL)
+
+    # Returns the whole state, at the current version, as a pickled snapshot
+    # message; pending changes should be sent (with delta()) first
+    def snapshot(self):
+        _snapshot = {
+            'VERSION': self.VERSION,
+            'SECTIONS': self.SECTIONS,
+        }
+        return pickle.dumps(_snapshot, protocol = pickle.HIGHEST_PROTOCOL)
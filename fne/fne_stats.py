@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+#
+# Digital Voice Modem - Fixed Network Equipment
+# GPLv2 Open Source. Use is subject to license terms.
+# DO NOT ALTER OR REMOVE COPYRIGHT NOTICES OR THIS FILE HEADER.
+#
+# @package DVM / FNE
+#
+###############################################################################
+#   Copyright (C) 2017-2021 Bryan Biedenkapp <gatekeep@gmail.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+###############################################################################
+from __future__ import print_function
+
+from time import time, perf_counter
+
+# Hooks (coreFNE methods) that are timed; send_peer_addrs is the master
+# repeat (and routed traffic sent to several peers)
+STATS_HOOKS = ('dmrd_validate', 'dmrd_received', 'p25d_preprocess', 'p25d_validate', 'p25d_received',
+               'peer_ignored', 'get_fanout', 'send_peer_addrs', 'send_peer')
+
+# Reasons a frame is dropped
+DROP_ACL = 'ACL'
+DROP_IGNORED = 'IGNORED'
+DROP_COLLISION = 'COLLISION'
+DROP_REASONS = (DROP_ACL, DROP_IGNORED, DROP_COLLISION)
+
+# Reasons a frame is not routed to one rule's target; the frame is still
+# repeated and may be routed by other rules, so this is counted once for each
+# rule that skips it
+SKIP_COLLISION = 'COLLISION'
+SKIP_HANGTIME = 'HANGTIME'
+SKIP_REASONS = (SKIP_COLLISION, SKIP_HANGTIME)
+
+# Histogram resolution; each power of two (in microseconds) is split into
+# 2^(HISTOGRAM_BITS - 1) buckets, so a bucket is at most 1/8th (12.5%) wide
+HISTOGRAM_BITS = 4
+
+# Percentiles published with each snapshot
+STATS_PERCENTILES = (50, 90, 99, 99.9)
+
+# ---------------------------------------------------------------------------
+#   Module Routines
+# ---------------------------------------------------------------------------
+
+# Returns the histogram bucket for a latency (in microseconds); values below
+# 2^HISTOGRAM_BITS have a bucket each, above that buckets grow with the value
+def histogram_bucket(_us):
+    _exp = _us.bit_length() - HISTOGRAM_BITS
+    if _exp <= 0:
+        return _us
+    return (_exp << (HISTOGRAM_BITS - 1)) + (_us >> _exp)
+
+# Returns the lowest latency (in microseconds) counted in a histogram bucket
+def histogram_value(_bucket):
+    if _bucket < (1 << HISTOGRAM_BITS):
+        return _bucket
+    _exp = (_bucket >> (HISTOGRAM_BITS - 1)) - 1
+    return (_bucket - (_exp << (HISTOGRAM_BITS - 1))) << _exp
+
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     HDR-style latency histogram; log-linear buckets (in microseconds) kept
+#     sparsely, so recording is a dictionary increment.
+# ---------------------------------------------------------------------------
+
+class latencyHistogram(object):
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.BUCKETS = {}
+        self.COUNT = 0
+        self.TOTAL = 0
+        self.MAX = 0
+
+    def record(self, _us):
+        _bucket = histogram_bucket(_us)
+        self.BUCKETS[_bucket] = self.BUCKETS.get(_bucket, 0) + 1
+        self.COUNT += 1
+        self.TOTAL += _us
+        if _us > self.MAX:
+            self.MAX = _us
+
+    # Returns the latency (in microseconds) the given percentage of recorded
+    # values are at or below; this is the top of the bucket, capped at the
+    # maximum recorded value
+    def percentile(self, _pct):
+        if self.COUNT == 0:
+            return 0
+
+        _target = max(1, int(self.COUNT * _pct / 100 + 0.5))
+        _seen = 0
+        for _bucket in sorted(self.BUCKETS):
+            _seen += self.BUCKETS[_bucket]
+            if _seen >= _target:
+                return min(self.MAX, histogram_value(_bucket + 1) - 1)
+        return self.MAX
+
+    def snapshot(self):
+        _snapshot = {
+            'COUNT': self.COUNT,
+            'MEAN': self.TOTAL / self.COUNT if self.COUNT else 0,
+            'MAX': self.MAX,
+            'BUCKETS': dict(self.BUCKETS),
+        }
+        for _pct in STATS_PERCENTILES:
+            _snapshot['P{}'.format(_pct)] = self.percentile(_pct)
+        return _snapshot
+
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     Per-system hook latency histograms and traffic counters. Counters are
+#     totals since the system started; histograms cover the time since the
+#     last snapshot.
+# ---------------------------------------------------------------------------
+
+class hookStats(object):
+    def __init__(self, _name):
+        self._system = _name
+
+        # hook name -> latencyHistogram
+        self.HOOKS = {}
+
+        self.FRAMES_IN = 0
+        self.BYTES_IN = 0
+        self.FRAMES_OUT = 0
+        self.BYTES_OUT = 0
+        self.DROPS = dict.fromkeys(DROP_REASONS, 0)
+        self.SKIPS = dict.fromkeys(SKIP_REASONS, 0)
+
+        self.STARTED = time()
+        self.LAST_SNAPSHOT = self.STARTED
+
+    # Returns a wrapper for the given hook that records how long each call
+    # takes
+    def timed(self, _hook, _func):
+        _histogram = self.HOOKS.setdefault(_hook, latencyHistogram())
+
+        def _timed(*args):
+            _start = perf_counter()
+            try:
+                return _func(*args)
+            finally:
+                _histogram.record(int((perf_counter() - _start) * 1000000))
+        return _timed
+
+    def received(self, _len):
+        self.FRAMES_IN += 1
+        self.BYTES_IN += _len
+
+    def sent(self, _len, _count = 1):
+        self.FRAMES_OUT += _count
+        self.BYTES_OUT += _len * _count
+
+    def drop(self, _reason):
+        self.DROPS[_reason] += 1
+
+    def skip(self, _reason):
+        self.SKIPS[_reason] += 1
+
+    # Returns the counters and histograms as plain dictionaries (for the
+    # report server), and starts a new histogram interval
+    def snapshot(self):
+        _now = time()
+        _snapshot = {
+            'UPTIME': _now - self.STARTED,
+            'INTERVAL': _now - self.LAST_SNAPSHOT,
+            'FRAMES_IN': self.FRAMES_IN,
+            'BYTES_IN': self.BYTES_IN,
+            'FRAMES_OUT': self.FRAMES_OUT,
+            'BYTES_OUT': self.BYTES_OUT,
+            'DROPS': dict(self.DROPS),
+            'SKIPS': dict(self.SKIPS),
+            'HOOKS': {},
+        }
+        for _hook, _histogram in self.HOOKS.items():
+            _snapshot['HOOKS'][_hook] = _histogram.snapshot()
+            _histogram.reset()
+
+        self.LAST_SNAPSHOT = _now
+        return _snapshot
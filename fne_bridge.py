@@ -31,18 +31,16 @@ import struct
 import sys
 import socket
 import ConfigParser
-import thread
 import traceback
 
 from bitarray import bitarray
 from bitstring import BitArray
 from bitstring import BitString
-from time import time, sleep
+from time import time
 from importlib import import_module
 from binascii import b2a_hex as ahex
 from random import randint
-from threading import Lock
-from time import time, sleep, clock, localtime, strftime
+from time import time, localtime, strftime
 
 from twisted.python import log
 from twisted.internet.protocol import Factory, Protocol
@@ -73,15 +71,17 @@ class bridgeFNE(coreFNE):
         self.tlv_fne = tlvFNE(self, _name, _config, _logger, self._tlvPort)
         self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 
-    def dmrd_validate(self, _peer_id, _rf_src, _dst_id, _slot, _call_type, _frame_type, _dtype_vseq, _stream_id):
+    def dmrd_validate(self, _frame):
         return True
 
     # Callback with DMR data from peer/master.  Send this data to any
     # partner listening
-    def dmrd_received(self, _peer_id, _rf_src, _dst_id, _seq, _slot, _call_type, _frame_type, _dtype_vseq, _stream_id, _data):
+    def dmrd_received(self, _frame):
+        _peer_id, _rf_src, _dst_id, _slot, _call_type, _frame_type, _dtype_vseq, _stream_id, _data = (_frame.peer_id, _frame.rf_src, _frame.dst_id,
+            _frame.slot, _frame.call_type, _frame.frame_type, _frame.dtype_vseq, _frame.stream_id, _frame.data)
         dmrpkt = _data[20:53]
         _tx_slot = self.tlv_fne.tx[_slot]
-        _seq = ord(_data[4])
+        _seq = _frame.seq
         _tx_slot.frame_count += 1
 
         if (_stream_id != _tx_slot.stream_id):
@@ -101,23 +101,23 @@ class bridgeFNE(coreFNE):
         if (_frame_type == fne_const.FT_DATA_SYNC) and (_dtype_vseq == fne_const.DT_TERMINATOR_WITH_LC) and (_tx_slot.type != fne_const.DT_TERMINATOR_WITH_LC):
             self.tlv_fne.end_call(_tx_slot)
 
-        if (_data[15] & 0x20) == 0:
+        if (_frame.bits & 0x20) == 0:
             _dmr_frame = BitArray('0x' + ahex(_data[20:]))
             _ambe = _dmr_frame[0:108] + _dmr_frame[156:264]
             self.tlv_fne.export_voice(_tx_slot, _seq, _ambe.tobytes())
         else:
             _tx_slot.lastSeq = _seq
 
-    def p25d_preprocess(self, _peer_id, _rf_src, _dst_id, _call_type, _duid, _dtype_vseq, _stream_id, _data):
+    def p25d_preprocess(self, _frame):
         return
 
-    def p25d_validate(self, _peer_id, _rf_src, _dst_id, _call_type, _duid, _dtype_vseq, _stream_id):
+    def p25d_validate(self, _frame):
         return False
 
-    def p25d_received(self, _peer_id, _rf_src, _dst_id, _call_type, _duid, _dtype_vseq, _stream_id, _data):
+    def p25d_received(self, _frame):
         return
 
-    def peer_ignored(self, _peer_id, _rf_src, _dst_id, _call_type, _slot, _dtype_vseq, _stream_id, _is_source):
+    def peer_ignored(self, _peer_id, _frame, _is_source):
         return False
 
     def peer_connected(self, _peer_id, _peer):
@@ -144,20 +144,6 @@ class bridgeFNE(coreFNE):
             traceback.print_exc()
             sys.exit('Could not parse configuration file, ' + _file_name + ', exiting...')
 
-    # The methods below are overridden becuse the launchUDP thread can also
-    # wite to a master or peer async and confuse the master
-    # A lock is used to synchronize the two threads so that the resource is
-    # protected
-    def send_master(self, _packet):
-        mutex.acquire()
-        coreFNE.send_master(self, _packet)
-        mutex.release()
-    
-    def send_peers(self, _packet):
-        mutex.acquire()
-        coreFNE.send_peers(self, _packet)
-        mutex.release()
-
 # ---------------------------------------------------------------------------
 #   Program Entry Point
 # ---------------------------------------------------------------------------
@@ -166,7 +152,7 @@ if __name__ == '__main__':
     import argparse
     import os
 
-    from fne.fne_core import mk_id_dict
+    from fne.fne_core import mk_id_set
     from fne.fne_core import setup_fne
     
     # perform basic FNE setup
@@ -188,11 +174,11 @@ if __name__ == '__main__':
     report_server = config_reports(config, logger, reportFactory)
     
     # make dictionaries
-    white_rids = mk_id_dict(config['Aliases']['Path'], config['Aliases']['WhitelistRIDsFile'])
+    white_rids = mk_id_set(config['Aliases']['Path'], config['Aliases']['WhitelistRIDsFile'])
     if white_rids:
         logger.info('ID MAPPER: white_rids dictionary is available')
 
-    black_rids = mk_id_dict(config['Aliases']['Path'], config['Aliases']['WhitelistRIDsFile'])
+    black_rids = mk_id_set(config['Aliases']['Path'], config['Aliases']['BlacklistRIDsFile'])
     if black_rids:
         logger.info('ID MAPPER: black_rids dictionary is available')
     
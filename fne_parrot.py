@@ -30,7 +30,7 @@ import sys
 
 from binascii import b2a_hex as ahex
 from bitarray import bitarray
-from time import time, sleep
+from time import time
 from importlib import import_module
 
 from twisted.python import log
@@ -40,9 +40,86 @@ from twisted.internet import reactor, task
 
 from fne.fne_core import short_to_bytes, coreFNE, systems, fne_shutdown_handler, REPORT_OPCODES, reportFactory, config_reports, setup_activity_log
 from fne import fne_config, fne_log, fne_const
+from fne.fne_log import lazy_ahex
 
 from dmr_utils import lc, bptc, const
 
+# Delay (in seconds) between the end of a call and its playback, and the
+# interval (in seconds) between played back DMR and P25 frames
+PARROT_DELAY = 2
+PARROT_DMR_INTERVAL = 0.06
+PARROT_P25_INTERVAL = 0.12
+
+# Maximum number of frames recorded for a single call (about two minutes of
+# DMR voice), and the time (in seconds) after which a recording that never
+# saw a terminator is dropped
+PARROT_MAX_FRAMES = 2000
+PARROT_TIMEOUT = 5
+
+# Log tag of each call mode
+PARROT_TAGS = {
+    'DMR': 'DMRD',
+    'P25': 'P25D'
+    }
+
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     This implements a single parrot session; the recording of a call from
+#     one source on one slot, and its playback.
+# ---------------------------------------------------------------------------
+
+class parrotSession:
+    def __init__(self, _mode, _rf_src, _slot, _stream_id, _now):
+        self.mode = _mode
+        self.rf_src = _rf_src
+        self.slot = _slot
+        self.stream_id = _stream_id
+        self.start = _now
+        self.time = _now
+        self.lc = 0
+        self.pi_lc = 0
+        self.frames = []
+        self.full = False
+
+        self._timer = None
+        self._send = None
+        self._done = None
+        self._idx = 0
+
+    # Record a frame; returns False if the recording is full
+    def record(self, _data, _now):
+        self.time = _now
+        if len(self.frames) >= PARROT_MAX_FRAMES:
+            return False
+        self.frames.append(_data)
+        return True
+
+    # Start playing back the recording, one frame every _interval seconds;
+    # _done is called with the session once the playback is finished
+    def play(self, _send, _interval, _done):
+        self._send = _send
+        self._done = _done
+        self._idx = 0
+        self._timer = task.LoopingCall(self.play_frame)
+        self._timer.start(_interval)
+
+    def play_frame(self):
+        if self._idx >= len(self.frames):
+            self.stop()
+            return
+
+        self._send(self.frames[self._idx])
+        self._idx += 1
+
+    def stop(self):
+        if (self._timer != None) and self._timer.running:
+            self._timer.stop()
+        self._timer = None
+        self.frames = []
+        if self._done != None:
+            self._done(self)
+            self._done = None
+
 # ---------------------------------------------------------------------------
 #   Class Declaration
 #     This implements the parrot network FNE logic.
@@ -52,88 +129,80 @@ class parrotFNE(coreFNE):
     def __init__(self, _name, _config, _logger, _act_log_file, _report):
         coreFNE.__init__(self, _name, _config, _logger, _act_log_file, _report)
         
-        # Status information for the system, TS1 & TS2
-        # 1 & 2 are "timeslot"
-        # In TX_EMB_LC, 2-5 are burst B-E
-        self.STATUS = {
-            1: {
-                'RX_START':     time(),
-                'RX_SEQ':       0,
-                'RX_RFS':       0,
-                'TX_RFS':       0,
-                'RX_STREAM_ID': 0,
-                'TX_STREAM_ID': 0,
-                'RX_TGID':      0,
-                'TX_TGID':      0,
-                'TX_PI_TGID':   0,
-                'RX_TIME':      time(),
-                'TX_TIME':      time(),
-                'RX_TYPE':      fne_const.DT_TERMINATOR_WITH_LC,
-                'RX_LC':        0,
-                'RX_PI_LC':     0,
-                'TX_H_LC':      0,
-                'TX_P_LC':      0,
-                'TX_T_LC':      0,
-                'TX_EMB_LC': {
-                    1: 0,
-                    2: 0,
-                    3: 0,
-                    4: 0,
-                }
-                },
-            2: {
-                'RX_START':     time(),
-                'RX_SEQ':       0,
-                'RX_RFS':       0,
-                'TX_RFS':       0,
-                'RX_STREAM_ID': 0,
-                'TX_STREAM_ID': 0,
-                'RX_TGID':      0,
-                'TX_TGID':      0,
-                'TX_PI_TGID':   0,
-                'RX_TIME':      time(),
-                'TX_TIME':      time(),
-                'RX_TYPE':      fne_const.DT_TERMINATOR_WITH_LC,
-                'RX_LC':        0,
-                'RX_PI_LC':     0,
-                'TX_H_LC':      0,
-                'TX_P_LC':      0,
-                'TX_T_LC':      0,
-                'TX_EMB_LC': {
-                    1: 0,
-                    2: 0,
-                    3: 0,
-                    4: 0,
-                }
-            }
-        }
-        self.CALL_DATA = []
-        self.LAST_MODE = 'DMR'
-
-    def dmrd_validate(self, _peer_id, _rf_src, _dst_id, _slot, _call_type, _frame_type, _dtype_vseq, _stream_id):
+        # Calls being recorded, keyed by source ID and slot, and calls waiting
+        # for or being played back
+        self.RECORDING = {}
+        self.PLAYBACK = []
+
+        recording_timer = task.LoopingCall(self.recording_loop)
+        recording_timer.start(PARROT_TIMEOUT)
+
+    # Drop recordings that never saw a terminator
+    def recording_loop(self):
+        _now = time()
+        for _key, _session in list(self.RECORDING.items()):
+            if (_now - _session.time) > PARROT_TIMEOUT:
+                self._logger.info('(%s) %s: Transmission from SRC_ID %s timed out, dropping call data [STREAM ID %s]', self._system,
+                                  PARROT_TAGS[_session.mode], _session.rf_src, _session.stream_id)
+                del self.RECORDING[_key]
+
+    # Get the session recording the given stream; if the stream is new, a new
+    # session replaces whatever was being recorded for the source and slot
+    def get_session(self, _mode, _rf_src, _slot, _stream_id, _now):
+        _key = (_rf_src, _slot)
+        _session = self.RECORDING.get(_key)
+        if _session != None:
+            if _session.mode != _mode:
+                self._logger.info('(%s) %s: Previous call was not %s, mixed call modes! Dropping call data.', self._system,
+                                  PARROT_TAGS[_mode], _mode)
+            elif _session.stream_id == _stream_id:
+                return (_session, False)
+
+        _session = parrotSession(_mode, _rf_src, _slot, _stream_id, _now)
+        self.RECORDING[_key] = _session
+        return (_session, True)
+
+    # Schedule the playback of a finished recording
+    def end_session(self, _session, _interval):
+        del self.RECORDING[(_session.rf_src, _session.slot)]
+        self.PLAYBACK.append(_session)
+        reactor.callLater(PARROT_DELAY, self.play_session, _session, _interval)
+
+    def play_session(self, _session, _interval):
+        self._logger.info('(%s) %s: Playing back transmission from SRC_ID %s', self._system, PARROT_TAGS[_session.mode], _session.rf_src)
+        _session.play(self.send_peers, _interval, self.PLAYBACK.remove)
+
+    def record_frame(self, _session, _data, _now):
+        if (_session.record(_data, _now) == False) and (_session.full == False):
+            _session.full = True
+            self._logger.warning('(%s) %s: Transmission from SRC_ID %s is too long, only the first %s frames will be played back', self._system,
+                                 PARROT_TAGS[_session.mode], _session.rf_src, PARROT_MAX_FRAMES)
+
+    def dmrd_validate(self, _frame):
         return True
 
-    def dmrd_received(self, _peer_id, _rf_src, _dst_id, _seq, _slot, _call_type, _frame_type, _dtype_vseq, _stream_id, _data):
+    def dmrd_received(self, _frame):
+        _peer_id, _rf_src, _dst_id, _slot, _call_type, _frame_type, _dtype_vseq, _stream_id, _data = (_frame.peer_id, _frame.rf_src, _frame.dst_id,
+            _frame.slot, _frame.call_type, _frame.frame_type, _frame.dtype_vseq, _frame.stream_id, _frame.data)
         pkt_time = time()
         dmrpkt = _data[20:53]
-        _bits = _data[15]
         
         if _call_type == 'group':
-            if (self.LAST_MODE != 'DMR'):
-                self._logger.info('(%s) DMRD: Previous call was not DMR, mixed call modes! Dropping call data.', self._system)
-                self.CALL_DATA = []
-
             if (_rf_src == 0):
                 self._logger.warning('(%s) DMRD: Received call from SRC_ID %s? Dropping call data.', self._system, _rf_src)
-                self.CALL_DATA = []
-                self.LAST_MODE = 'P25'
                 return
 
-            self.LAST_MODE = 'DMR'
+            _terminator = (_frame_type == fne_const.FT_DATA_SYNC) and (_dtype_vseq == fne_const.DT_TERMINATOR_WITH_LC)
+
+            # a terminator for a call that isn't being recorded (i.e. a repeated
+            # terminator) has nothing to end
+            _session = self.RECORDING.get((_rf_src, _slot))
+            if _terminator and ((_session == None) or (_session.stream_id != _stream_id)):
+                return
 
             # Is this is a new call stream?
-            if (_stream_id != self.STATUS[_slot]['RX_STREAM_ID']):
-                self.STATUS['RX_START'] = pkt_time
+            _session, _new_stream = self.get_session('DMR', _rf_src, _slot, _stream_id, pkt_time)
+            if _new_stream == True:
                 self._logger.info('(%s) DMRD: Traffic *CALL START     * PEER %s SRC_ID %s TGID %s TS %s [STREAM ID %s]', self._system,
                                   _peer_id, _rf_src, _dst_id, _slot, _stream_id)
 
@@ -141,17 +210,18 @@ class parrotFNE(coreFNE):
                 # options intact
                 if _frame_type == fne_const.FT_DATA_SYNC and _dtype_vseq == fne_const.DT_VOICE_LC_HEADER:
                     lcHeader = lc.decode_lc_header(dmrpkt)
-                    self.STATUS[_slot]['RX_LC'] = lcHeader['LC'][:9]
+                    _session.lc = lcHeader['LC'][:9]
                 
                 # If we don't have a voice header then don't wait to decode it
                 # from the Embedded LC
                 # just make a new one from the HBP header.  This is good
                 # enough, and it saves lots of time
                 else:
-                    self.STATUS[_slot]['RX_LC'] = const.LC_OPT + short_to_bytes(_dst_id) + short_to_bytes(_rf_src)
+                    _session.lc = const.LC_OPT + short_to_bytes(_dst_id) + short_to_bytes(_rf_src)
 
-                self.STATUS[_slot]['RX_PI_LC'] = const.LC_PI_OPT + b'\x00\x00\x00' + b'\x00\x00'
-                self._logger.debug('(%s) TS %s [STREAM ID %s] RX_LC %s', self._system, _slot, _stream_id, ahex(self.STATUS[_slot]['RX_LC']))
+                _session.pi_lc = const.LC_PI_OPT + b'\x00\x00\x00' + b'\x00\x00'
+                self._logger.debug('(%s) TS %s [STREAM ID %s] RX_LC %s', self._system, _slot, _stream_id, lazy_ahex(_session.lc))
+                self._logger.info('(%s) DMRD: Receiving transmission to be played back from SRC_ID %s', self._system, _rf_src)
             
             # If we can, use the PI LC from the PI voice header as to keep all
             # options intact
@@ -162,91 +232,62 @@ class parrotFNE(coreFNE):
                 self._logger.info('(%s) DMRD: Traffic *CALL PI PARAMS  * PEER %s DST_ID %s TS %s ALGID %s KID %s [STREAM ID %s]', self._system,
                                         _peer_id, _dst_id, _slot, _alg_id, _key_id, _stream_id)
 
-                self.STATUS[_slot]['RX_PI_LC'] = lcHeader['LC'][:10]
+                _session.pi_lc = lcHeader['LC'][:10]
+
+                self._logger.debug('(%s) TS %s [STREAM ID %s] RX_PI_LC %s', self._system, _slot, _stream_id, lazy_ahex(_session.pi_lc))
 
-                self._logger.debug('(%s) TS %s [STREAM ID %s] RX_PI_LC %s', self._system, _slot, _stream_id, ahex(self.STATUS[_slot]['RX_PI_LC']))
+            self.record_frame(_session, _data, pkt_time)
 
             # Final actions - Is this a voice terminator?
-            if (_frame_type == fne_const.FT_DATA_SYNC) and (_dtype_vseq == fne_const.DT_TERMINATOR_WITH_LC) and (self.STATUS[_slot]['RX_TYPE'] != fne_const.DT_TERMINATOR_WITH_LC):
-                call_duration = pkt_time - self.STATUS['RX_START']
+            if _terminator:
+                call_duration = pkt_time - _session.start
                 self._logger.info('(%s) DMRD: Traffic *CALL END       * PEER %s SRC_ID %s TGID %s TS %s DUR %s [STREAM ID %s]', self._system,
                                   _peer_id, _rf_src, _dst_id, _slot, call_duration, _stream_id)
-                self.CALL_DATA.append(_data)
-                sleep(2)
-                self._logger.info('(%s) DMRD: Playing back transmission from SRC_ID %s', self._system, _rf_src)
-                for _peer in self.CALL_DATA:
-                    self.send_peers(_peer)
-                    sleep(0.06)
-                self.CALL_DATA = []
-            
-            else:
-                if not self.CALL_DATA:
-                    self._logger.info('(%s) DMRD: Receiving transmission to be played back from SRC_ID %s', self._system, _rf_src)
-                self.CALL_DATA.append(_data)
-            
-            # Mark status variables for use later
-            self.STATUS[_slot]['RX_RFS'] = _rf_src
-            self.STATUS[_slot]['RX_TYPE'] = _dtype_vseq
-            self.STATUS[_slot]['RX_TGID'] = _dst_id
-            self.STATUS[_slot]['RX_TIME'] = pkt_time
-            self.STATUS[_slot]['RX_STREAM_ID'] = _stream_id
-
-    def p25d_preprocess(self, _peer_id, _rf_src, _dst_id, _call_type, _duid, _dtype_vseq, _stream_id, _data):
+                self.end_session(_session, PARROT_DMR_INTERVAL)
+
+    def p25d_preprocess(self, _frame):
         return
 
-    def p25d_validate(self, _peer_id, _rf_src, _dst_id, _call_type, _duid, _dtype_vseq, _stream_id):
+    def p25d_validate(self, _frame):
         return True
 
-    def p25d_received(self, _peer_id, _rf_src, _dst_id, _call_type, _duid, _dtype_vseq, _stream_id, _data):
+    def p25d_received(self, _frame):
+        _peer_id, _rf_src, _dst_id, _call_type, _duid, _dtype_vseq, _stream_id, _data = (_frame.peer_id, _frame.rf_src, _frame.dst_id, _frame.call_type,
+            _frame.duid, _frame.dtype_vseq, _frame.stream_id, _frame.data)
         pkt_time = time()
         p25pkt = _data[24:]
         _slot = 1               # fake the slot data, P25 doesn't have this
 
         if _call_type == 'group':
-            if (self.LAST_MODE != 'P25'):
-                self._logger.info('(%s) P25D: Previous call was not P25, mixed call modes! Dropping call data.', self._system)
-                self.CALL_DATA = []
-
             if (_rf_src == 0):
                 self._logger.warning('(%s) P25D: Received call from SRC_ID %s? Dropping call data.', self._system, _rf_src)
-                self.CALL_DATA = []
-                self.LAST_MODE = 'P25'
                 return
 
-            self.LAST_MODE = 'P25'
+            _terminator = (_duid == fne_const.P25_DUID_TDU) or (_duid == fne_const.P25_DUID_TDULC)
+
+            # a terminator for a call that isn't being recorded (i.e. a repeated
+            # terminator) has nothing to end
+            _session = self.RECORDING.get((_rf_src, _slot))
+            if _terminator and ((_session == None) or (_session.stream_id != _stream_id)):
+                return
 
             # Is this is a new call stream?
-            if (_stream_id != self.STATUS[_slot]['RX_STREAM_ID']) and ((_duid != fne_const.P25_DUID_TDU) and (_duid != fne_const.P25_DUID_TDULC)):
-                self.STATUS['RX_START'] = pkt_time
+            _session, _new_stream = self.get_session('P25', _rf_src, _slot, _stream_id, pkt_time)
+            if _new_stream == True:
                 self._logger.info('(%s) P25D: Traffic *CALL START    * PEER %s SRC_ID %s TGID %s [STREAM ID %s]', self._system,
                                   _peer_id, _rf_src, _dst_id, _stream_id)
-        
+                self._logger.info('(%s) P25D: Receiving transmission to be played back from SRC_ID %s', self._system, _rf_src)
+
+            self.record_frame(_session, _data, pkt_time)
+
             # Final actions - Is this a voice terminator?
-            if ((_duid == fne_const.P25_DUID_TDU) or (_duid == fne_const.P25_DUID_TDULC)) and (self.STATUS[_slot]['RX_TYPE'] != fne_const.DT_TERMINATOR_WITH_LC):
-                call_duration = pkt_time - self.STATUS['RX_START']
+            if _terminator:
+                call_duration = pkt_time - _session.start
                 self._logger.info('(%s) P25D: Traffic *CALL END      * PEER %s SRC_ID %s TGID %s DUR %s [STREAM ID %s]', self._system,
                                   _peer_id, _rf_src, _dst_id, call_duration, _stream_id)
-                self.CALL_DATA.append(_data)
-                sleep(2)
-                self._logger.info('(%s) P25D: Playing back transmission from SRC_ID %s', self._system, _rf_src)
-                for _peer in self.CALL_DATA:
-                    self.send_peers(_peer)
-                    sleep(0.12)
-                self.CALL_DATA = []
-            
-            else:
-                if not self.CALL_DATA:
-                    self._logger.info('(%s) P25D: Receiving transmission to be played back from SRC_ID %s', self._system, _rf_src)
-                self.CALL_DATA.append(_data)
-            
-            # Mark status variables for use later
-            self.STATUS[_slot]['RX_RFS'] = _rf_src
-            self.STATUS[_slot]['RX_TYPE'] = _dtype_vseq
-            self.STATUS[_slot]['RX_TGID'] = _dst_id
-            self.STATUS[_slot]['RX_TIME'] = pkt_time
-            self.STATUS[_slot]['RX_STREAM_ID'] = _stream_id
-
-    def peer_ignored(self, _peer_id, _rf_src, _dst_id, _call_type, _slot, _dtype_vseq, _stream_id, _is_source):
+                self.end_session(_session, PARROT_P25_INTERVAL)
+
+    def peer_ignored(self, _peer_id, _frame, _is_source):
         return False
 
     def peer_connected(self, _peer_id, _peer):
@@ -257,7 +298,7 @@ class parrotFNE(coreFNE):
 # ---------------------------------------------------------------------------
 
 if __name__ == '__main__':
-    from fne.fne_core import mk_id_dict
+    from fne.fne_core import mk_id_set
     from fne.fne_core import setup_fne
     
     # perform basic FNE setup
@@ -268,7 +309,7 @@ if __name__ == '__main__':
     report_server = config_reports(config, logger, reportFactory)
     
     # make dictionaries
-    white_rids = mk_id_dict(config['Aliases']['Path'], config['Aliases']['WhitelistRIDsFile'])
+    white_rids = mk_id_set(config['Aliases']['Path'], config['Aliases']['WhitelistRIDsFile'])
     if white_rids:
         logger.info('ID MAPPER: white_rids dictionary is available')
 
@@ -27,21 +27,26 @@
 ###############################################################################
 from __future__ import print_function
 
-import sys, traceback
+import sys, os, traceback
 import pickle
+import logging
 
 from binascii import b2a_hex as ahex
 from bitarray import bitarray
+from collections import OrderedDict
 from time import time
-from importlib import import_module
+from importlib import import_module, reload
 
 from twisted.python import log
-from twisted.internet.protocol import Factory, Protocol
+from twisted.internet.protocol import Factory, Protocol, ProcessProtocol
 from twisted.protocols.basic import NetstringReceiver
 from twisted.internet import reactor, task
 
-from fne.fne_core import int_to_bytes, short_to_bytes, bytes_to_int, coreFNE, systems, fne_shutdown_handler, REPORT_OPCODES, reportFactory, config_reports, setup_activity_log
+from fne.fne_core import slotStatus, callTable, int_to_bytes, short_to_bytes, bytes_to_int, coreFNE, systems, fne_shutdown_handler, REPORT_OPCODES, reportFactory, config_reports, setup_activity_log
 from fne import fne_config, fne_log, fne_const
+from fne.fne_log import lazy_ahex
+from fne.fne_stats import DROP_COLLISION, SKIP_COLLISION, SKIP_HANGTIME
+from fne.fne_state import STATE_ALL
 
 from dmr_utils import lc, bptc, const
 
@@ -69,12 +74,44 @@ def get_valid_ignore(_peer_id, _id, _dict):
         return False
     return False
 
+# Discard the cached repeat fan-out of every system; this must be called
+# whenever the routing rules or affiliations change
+def invalidate_all_fanout():
+    for _system in systems:
+        systems[_system].invalidate_fanout()
+
+# Discard the cached per-stream ACL verdicts of every system; this must be
+# called whenever the ID lists or the active TGIDs change
+def invalidate_all_acl():
+    for _system in systems:
+        systems[_system].ACL_CACHE.clear()
+
+# Systems run by this worker in the multi-process mode (None when this process
+# runs every system)
+SHARD_SYSTEMS = None
+
+# Interval (in seconds) the supervisor re-checks the worker shards against the
+# routing rules; the same interval the rules are reloaded at
+SHARD_UPDATE_TIME = 240
+
+# Build the routing rule lookup index
+# Note: The index maps (system, SRC_GROUP, SRC_TS) to the list of rules that
+# match, in the order they appear in the rules file. P25 has no timeslots, so
+# every rule is additionally indexed under a SRC_TS of None.
+def make_rule_index(_rules):
+    _index = {}
+    for _system in _rules:
+        for _rule in _rules[_system]['GROUP_VOICE']:
+            _index.setdefault((_system, _rule['SRC_GROUP'], _rule['SRC_TS']), []).append(_rule)
+            _index.setdefault((_system, _rule['SRC_GROUP'], None), []).append(_rule)
+    return _index
+
 # Import bridging rules
 # Note: A stanza *must* exist for any MASTER or PEER configured in the main
 # configuration file and listed as "active".  It can be empty,
 # but it has to exist.
 def make_rules(_fne_routing_rules):
-    global RULES, rule_file
+    global RULES, RULE_INDEX, rule_file
     try:
         if _fne_routing_rules not in sys.modules: 
             rule_file = import_module(_fne_routing_rules)
@@ -118,6 +155,13 @@ def make_rules(_fne_routing_rules):
             for i, e in enumerate(_rule['OFF']):
                 _rule['OFF'][i] = _rule['OFF'][i]
             
+            # a target in another worker can't be routed to until the supervisor
+            # restarts the workers with the new shards
+            _target = _rule['DST_NET']
+            if (SHARD_SYSTEMS != None) and (_system in SHARD_SYSTEMS) and (_target not in SHARD_SYSTEMS) and \
+               (_target in config['Systems']) and config['Systems'][_target]['Enabled']:
+                logger.error('(%s) Rule %s targets %s, which runs in another worker; not routed until the workers are restarted', _system, _rule['NAME'], _target)
+
             _rule['TIMEOUT'] = _rule['TIMEOUT'] * 60
             _rule['TIMER'] = time() + _rule['TIMEOUT']
 
@@ -135,6 +179,12 @@ def make_rules(_fne_routing_rules):
     for _system in config['Systems']:
         if _system not in rule_file.RULES:
             logger.error('Routing rules not found for system %s', _system)
+
+    # swap in the new lookup index in one step, so packet processing never
+    # sees a partially built index
+    RULE_INDEX = make_rule_index(rule_file.RULES)
+    invalidate_all_fanout()
+    invalidate_all_acl()
     return rule_file.RULES
 
 # Run this every minute for rule timer updates
@@ -148,6 +198,7 @@ def rule_timer_loop():
                 if _rule['ROUTABLE'] == True:
                     if _rule['TIMER'] < _now:
                         _rule['ROUTABLE'] = False
+                        report_server.changed('RULES', _system)
                         logger.info('(%s) TG Routing timeout DEACTIVATE routing name %s, Target %s, TS %s, TGID %s',  _system, _rule['NAME'], _rule['DST_NET'], _rule['DST_TS'], _rule['DST_GROUP'])
                     else:
                         timeout_in = _rule['TIMER'] - _now
@@ -156,6 +207,7 @@ def rule_timer_loop():
                 if _rule['ROUTABLE'] == False:
                     if _rule['TIMER'] < _now:
                         _rule['ROUTABLE'] = True
+                        report_server.changed('RULES', _system)
                         logger.info('(%s) TG Routing timeout ACTIVATE Rule name %s, Target %s, TS %s, TGID %s', _system, _rule['NAME'], _rule['DST_NET'], _rule['DST_TS'], _rule['DST_GROUP'])
                     else:
                         timeout_in = _rule['TIMER'] - _now
@@ -163,6 +215,147 @@ def rule_timer_loop():
             else:
                 logger.debug('Routable rule timer loop made no rule changes')
 
+# Split the enabled systems into (at most) _workers shards for the multi-process
+# mode. Systems that route traffic to each other, directly or through other
+# systems, need each other's slot status and must share a reactor, so every
+# connected group of systems is kept whole; groups are then spread across the
+# shards, largest first. The result is deterministic, so the supervisor and
+# every worker agree on it.
+def mk_shards(_rules, _systems, _workers):
+    _groups = {}
+    for _system in _systems:
+        _groups[_system] = frozenset([_system])
+
+    for _system in _rules:
+        if _system not in _groups:
+            continue
+        for _rule in _rules[_system]['GROUP_VOICE']:
+            _target = _rule['DST_NET']
+            if (_target in _groups) and (_groups[_target] != _groups[_system]):
+                _merged = _groups[_system] | _groups[_target]
+                for _member in _merged:
+                    _groups[_member] = _merged
+
+    _shards = [[] for _ in range(max(1, _workers))]
+    for _group in sorted(set(_groups.values()), key = lambda _group: (-len(_group), sorted(_group))):
+        min(_shards, key = len).extend(sorted(_group))
+
+    return [_shard for _shard in _shards if _shard] or [[]]
+
+# Generate a mask over a 55 byte DMRD frame (as an integer) with the given bit
+# ranges cleared; the DMR burst bits are offset by the 20 byte DMRD header
+def mk_frame_mask(_ranges):
+    _mask = bitarray(55 * 8, endian='big')
+    _mask.setall(1)
+    for _start, _end in _ranges:
+        _mask[_start:_end] = 0
+    return int.from_bytes(_mask.tobytes(), 'big')
+
+# DMRD header destination ID and peer ID are always rewritten, the full LC
+# occupies burst bits 0-97 and 166-263 (sync and slot type are kept) and the
+# embedded LC occupies burst bits 116-147
+DMRD_HDR_RANGE = (8 * 8, 15 * 8)
+
+# Length of a full DMRD frame (the LC rewrite works on the whole frame)
+DMRD_FRAME_LEN = 55
+DMRD_KEEP = mk_frame_mask([DMRD_HDR_RANGE])
+DMRD_FULL_LC_KEEP = mk_frame_mask([DMRD_HDR_RANGE, (160, 160 + 98), (160 + 166, 160 + 264)])
+DMRD_EMB_LC_KEEP = mk_frame_mask([DMRD_HDR_RANGE, (160 + 116, 160 + 148)])
+
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     This implements a per-stream LC rewrite for a single routing target.
+# ---------------------------------------------------------------------------
+
+class lcRewrite:
+    def __init__(self, _dst_group, _flip_slot, _tx_status):
+        self._dst = _dst_group << (8 * (55 - 11))
+        if _flip_slot == True:
+            self._flip = 0x80 << (8 * (55 - 16))
+        else:
+            self._flip = 0
+
+        # (keep mask, patch) pairs for the header, PI header, terminator and
+        # bursts B-E; the patches are generated once and then OR'ed into every
+        # frame of the stream
+        self.full_lc = {
+            fne_const.DT_VOICE_LC_HEADER:       self.mk_full_lc_patch(_tx_status.TX_H_LC),
+            fne_const.DT_VOICE_PI_HEADER:       self.mk_full_lc_patch(_tx_status.TX_P_LC),
+            fne_const.DT_TERMINATOR_WITH_LC:    self.mk_full_lc_patch(_tx_status.TX_T_LC)
+        }
+        self.emb_lc = {}
+        for _vseq in [1,2,3,4]:
+            self.emb_lc[_vseq] = self.mk_emb_lc_patch(_tx_status.TX_EMB_LC[_vseq])
+
+    def mk_full_lc_patch(self, _lc):
+        if not isinstance(_lc, bitarray):
+            return (DMRD_KEEP, self._dst)
+        _bits = bitarray(160, endian='big')
+        _bits.setall(0)
+        _bits.extend(_lc[0:98] + bitarray(68 * '0') + _lc[98:196] + bitarray(16 * '0'))
+        return (DMRD_FULL_LC_KEEP, int.from_bytes(_bits.tobytes(), 'big') | self._dst)
+
+    def mk_emb_lc_patch(self, _emb):
+        if not isinstance(_emb, bitarray):
+            return (DMRD_KEEP, self._dst)
+        _bits = bitarray(160 + 116, endian='big')
+        _bits.setall(0)
+        _bits.extend(_emb + bitarray((116 + 16) * '0'))
+        return (DMRD_EMB_LC_KEEP, int.from_bytes(_bits.tobytes(), 'big') | self._dst)
+
+    # Rewrite the given DMRD frame for the target
+    def rewrite(self, _data, _peer_id, _frame_type, _dtype_vseq):
+        if _frame_type == fne_const.FT_DATA_SYNC and _dtype_vseq in self.full_lc:
+            _keep, _patch = self.full_lc[_dtype_vseq]
+        elif _dtype_vseq in self.emb_lc:
+            _keep, _patch = self.emb_lc[_dtype_vseq]
+        else:
+            _keep, _patch = (DMRD_KEEP, self._dst)
+
+        _frame = ((int.from_bytes(_data[:55], 'big') & _keep) | _patch | (_peer_id << (8 * (55 - 15)))) ^ self._flip
+        return _frame.to_bytes(55, 'big')
+
+# Maximum number of streams and maximum age (in seconds) of a cached ACL verdict
+ACL_CACHE_SIZE = 512
+ACL_CACHE_TIMEOUT = 60
+
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     This implements a bounded cache of per-stream ACL verdicts. Verdicts
+#     expire a fixed time after they were cached (so a long running stream is
+#     simply re-checked), and the oldest verdict is dropped when full.
+# ---------------------------------------------------------------------------
+
+class aclCache:
+    def __init__(self, _size = ACL_CACHE_SIZE, _timeout = ACL_CACHE_TIMEOUT):
+        self._size = _size
+        self._timeout = _timeout
+        self._verdicts = OrderedDict()
+
+    def get(self, _key, _now):
+        _entry = self._verdicts.get(_key)
+        if _entry == None:
+            return None
+        if _entry[1] < _now:
+            del self._verdicts[_key]
+            return None
+        return _entry[0]
+
+    def put(self, _key, _verdict, _now):
+        self._verdicts[_key] = (_verdict, _now + self._timeout)
+        self._verdicts.move_to_end(_key)
+        if len(self._verdicts) > self._size:
+            self._verdicts.popitem(last = False)
+
+    def remove(self, _key):
+        self._verdicts.pop(_key, None)
+
+    def clear(self):
+        self._verdicts.clear()
+
+    def __len__(self):
+        return len(self._verdicts)
+
 # ---------------------------------------------------------------------------
 #   Class Declaration
 #     This implements the router network FNE logic.
@@ -174,79 +367,53 @@ class routerFNE(coreFNE):
         
         # Status information for the system, TS1 & TS2
         # 1 & 2 are "timeslot"
-        # In TX_EMB_LC, 2-5 are burst B-E
         self.STATUS = {
-            1: {
-                'RX_START':     time(),
-                'RX_PEER_ID':   0,
-                'RX_SEQ':       0,
-                'RX_RFS':       0,
-                'TX_RFS':       0,
-                'RX_STREAM_ID': 0,
-                'TX_STREAM_ID': 0,
-                'RX_TGID':      0,
-                'TX_TGID':      0,
-                'TX_PI_TGID':   0,
-                'RX_TIME':      time(),
-                'TX_TIME':      time(),
-                'RX_TYPE':      fne_const.DT_TERMINATOR_WITH_LC,
-                'RX_LC':        0,
-                'RX_PI_LC':     0,
-                'TX_H_LC':      0,
-                'TX_P_LC':      0,
-                'TX_T_LC':      0,
-                'TX_EMB_LC': {
-                    1: 0,
-                    2: 0,
-                    3: 0,
-                    4: 0,
-                    },
-                'P25_RX_CT':    'group'
-                },
-            2: {
-                'RX_START':     time(),
-                'RX_PEER_ID':   0,
-                'RX_SEQ':       0,
-                'RX_RFS':       0,
-                'TX_RFS':       0,
-                'RX_STREAM_ID': 0,
-                'TX_STREAM_ID': 0,
-                'RX_TGID':      0,
-                'TX_TGID':      0,
-                'TX_PI_TGID':   0,
-                'RX_TIME':      time(),
-                'TX_TIME':      time(),
-                'RX_TYPE':      fne_const.DT_TERMINATOR_WITH_LC,
-                'RX_LC':        0,
-                'RX_PI_LC':     0,
-                'TX_H_LC':      0,
-                'TX_P_LC':      0,
-                'TX_T_LC':      0,
-                'TX_EMB_LC': {
-                    1: 0,
-                    2: 0,
-                    3: 0,
-                    4: 0,
-                    },
-                'P25_RX_CT':    'group'
-                }
+            1: slotStatus(),
+            2: slotStatus()
             }
 
+        # Calls being received from the peers of the system
+        self.CALLS = callTable()
+        call_expire_timer = task.LoopingCall(self.CALLS.tick)
+        call_expire_timer.start(self.CALLS._tick)
+
+        # ACL verdicts of the streams being received, keyed by peer ID, slot
+        # and stream ID (the cache is per system)
+        self.ACL_CACHE = aclCache()
+
         rid_tid_update_timer = task.LoopingCall(self.rid_tid_update_loop)
         rid_tid_update_timer.start(240)
 
-    def dmrd_validate(self, _peer_id, _rf_src, _dst_id, _slot, _call_type, _frame_type, _dtype_vseq, _stream_id):
+    def dmrd_validate(self, _frame):
+        _key = (_frame.peer_id, _frame.slot, _frame.stream_id)
+
+        # The verdict can't change within a stream; so only check the first
+        # frame, and forget the stream again at its terminator
+        if (_frame.frame_type == fne_const.FT_DATA_SYNC) and (_frame.dtype_vseq == fne_const.DT_TERMINATOR_WITH_LC):
+            self.ACL_CACHE.remove(_key)
+            return self.dmrd_check_acl(_frame)
+
+        _now = time()
+        _verdict = self.ACL_CACHE.get(_key, _now)
+        if _verdict == None:
+            _verdict = self.dmrd_check_acl(_frame)
+            self.ACL_CACHE.put(_key, _verdict, _now)
+        return _verdict
+
+    def dmrd_check_acl(self, _frame):
+        _peer_id, _rf_src, _dst_id, _slot, _call_type, _frame_type, _dtype_vseq, _stream_id = (_frame.peer_id, _frame.rf_src, _frame.dst_id, _frame.slot,
+            _frame.call_type, _frame.frame_type, _frame.dtype_vseq, _frame.stream_id)
         pkt_time = time()
 
         if get_valid(_rf_src, black_rids) == True:
-            if (_stream_id != self.STATUS[_slot]['RX_STREAM_ID']):
+            if (_stream_id != self.STATUS[_slot].RX_STREAM_ID):
                 # Mark status variables for use later
-                self.STATUS[_slot]['RX_START'] = pkt_time
-                self.STATUS[_slot]['RX_PEER_ID'] = _peer_id
-                self.STATUS[_slot]['RX_RFS'] = _rf_src
-                self.STATUS[_slot]['RX_TYPE'] = _dtype_vseq
-                self.STATUS[_slot]['RX_TGID'] = _dst_id
-                self.STATUS[_slot]['RX_STREAM_ID'] = _stream_id
+                self.STATUS[_slot].RX_START = pkt_time
+                self.STATUS[_slot].RX_PEER_ID = _peer_id
+                self.STATUS[_slot].RX_RFS = _rf_src
+                self.STATUS[_slot].RX_TYPE = _dtype_vseq
+                self.STATUS[_slot].RX_TGID = _dst_id
+                self.STATUS[_slot].RX_STREAM_ID = _stream_id
                 self._logger.warning('(%s) DMRD: Traffic *REJECT ACL      * PEER %s SRC_ID %s DST_ID %s [STREAM ID %s] (Blacklisted RID)', self._system,
                                      _peer_id, _rf_src, _dst_id, _stream_id)
                 
@@ -260,14 +427,14 @@ class routerFNE(coreFNE):
         
         if _call_type == 'group':
             if (RULES[self._system]['SEND_TGID'] == True) and (get_valid(_dst_id, config['Systems'][self._system]['ACTIVE_TG_IDS']) == False):
-                if (_stream_id != self.STATUS[_slot]['RX_STREAM_ID']):
+                if (_stream_id != self.STATUS[_slot].RX_STREAM_ID):
                     # Mark status variables for use later
-                    self.STATUS[_slot]['RX_START'] = pkt_time
-                    self.STATUS[_slot]['RX_PEER_ID'] = _peer_id
-                    self.STATUS[_slot]['RX_RFS'] = _rf_src
-                    self.STATUS[_slot]['RX_TYPE'] = _dtype_vseq
-                    self.STATUS[_slot]['RX_TGID'] = _dst_id
-                    self.STATUS[_slot]['RX_STREAM_ID'] = _stream_id
+                    self.STATUS[_slot].RX_START = pkt_time
+                    self.STATUS[_slot].RX_PEER_ID = _peer_id
+                    self.STATUS[_slot].RX_RFS = _rf_src
+                    self.STATUS[_slot].RX_TYPE = _dtype_vseq
+                    self.STATUS[_slot].RX_TGID = _dst_id
+                    self.STATUS[_slot].RX_STREAM_ID = _stream_id
                     self._logger.warning('(%s) DMRD: Traffic *REJECT ACL      * PEER %s SRC_ID %s DST_ID %s [STREAM ID %s] (Illegal TGID)', self._system,
                                          _peer_id, _rf_src, _dst_id, _stream_id)
             
@@ -277,10 +444,11 @@ class routerFNE(coreFNE):
 
         return True
 
-    def dmrd_received(self, _peer_id, _rf_src, _dst_id, _seq, _slot, _call_type, _frame_type, _dtype_vseq, _stream_id, _data):
+    def dmrd_received(self, _frame):
+        _peer_id, _rf_src, _dst_id, _slot, _call_type, _frame_type, _dtype_vseq, _stream_id, _data = (_frame.peer_id, _frame.rf_src, _frame.dst_id,
+            _frame.slot, _frame.call_type, _frame.frame_type, _frame.dtype_vseq, _frame.stream_id, _frame.data)
         pkt_time = time()
         dmrpkt = _data[20:53]
-        _bits = _data[15]
 
         if ((_frame_type == fne_const.FT_DATA_SYNC) and ((_dtype_vseq == fne_const.DT_DATA_HEADER) or (_dtype_vseq == fne_const.DT_RATE_12_DATA) or
                                                          (_dtype_vseq == fne_const.DT_RATE_34_DATA) or (_dtype_vseq == fne_const.DT_RATE_1_DATA))):
@@ -291,19 +459,29 @@ class routerFNE(coreFNE):
                 self._report.send_routeEvent('PDU,DATA,DMR,{},{},{},{},{},{}'.format(self._system, _stream_id, _peer_id, _rf_src, _slot, _dst_id))
             return
 
+        if len(_data) < DMRD_FRAME_LEN:
+            self._logger.warning('(%s) DMRD: Dropped short frame (%s bytes) PEER %s SRC_ID %s DST_ID %s [STREAM ID %s]', self._system,
+                                 len(_data), _peer_id, _rf_src, _dst_id, _stream_id)
+            return
+
         if _call_type == 'group':
             # Is this a new call stream?
-            if (_stream_id != self.STATUS[_slot]['RX_STREAM_ID']):
-                if (self.STATUS[_slot]['RX_TYPE'] != fne_const.DT_TERMINATOR_WITH_LC) and (pkt_time < (self.STATUS[_slot]['RX_TIME'] + fne_const.STREAM_TO)) and (_rf_src != self.STATUS[_slot]['RX_RFS']):
+            _call = self.CALLS.get(_peer_id, _slot, _stream_id)
+            _new_stream = (_call == None)
+            if _new_stream == True:
+                _last = self.CALLS.last(_peer_id, _slot)
+                if (_last != None) and (_last.RX_TYPE != fne_const.DT_TERMINATOR_WITH_LC) and (pkt_time < (_last.RX_TIME + fne_const.STREAM_TO)) and (_rf_src != _last.RX_RFS):
                     self._logger.warning('(%s) DMRD: Traffic *CALL COLLISION  * PEER %s SRC_ID %s TGID %s TS %s [STREAM ID %s] (Collided with existing call)', self._system,
                                          _peer_id, _rf_src, _dst_id, _slot, _stream_id)
                     
                     if config['Reports']['Report']:
                         self._report.send_routeEvent('GROUP VOICE,CALL COLLISION,DMR,{},{},{},{},{},{}'.format(self._system, _stream_id, _peer_id, _rf_src, _slot, _dst_id))
+                    if self._hook_stats != None:
+                        self._hook_stats.drop(DROP_COLLISION)
                     return
                 
                 # This is a new call stream
-                self.STATUS[_slot]['RX_START'] = pkt_time
+                _call = self.CALLS.start(_peer_id, _slot, _stream_id, pkt_time)
                 self._logger.info('(%s) DMRD: Traffic *CALL START      * PEER %s SRC_ID %s TGID %s TS %s [STREAM ID %s]', self._system,
                                   _peer_id, _rf_src, _dst_id, _slot, _stream_id)
 
@@ -314,17 +492,17 @@ class routerFNE(coreFNE):
                 # options intact
                 if _frame_type == fne_const.FT_DATA_SYNC and _dtype_vseq == fne_const.DT_VOICE_LC_HEADER:
                     lcHeader = lc.decode_lc_header(dmrpkt)
-                    self.STATUS[_slot]['RX_LC'] = lcHeader['LC'][:9]
+                    _call.RX_LC = lcHeader['LC'][:9]
                 
                 # If we don't have a voice header then don't wait to decode it
                 # from the Embedded LC
                 # just make a new one from the HBP header.  This is good
                 # enough, and it saves lots of time
                 else:
-                    self.STATUS[_slot]['RX_LC'] = const.LC_OPT + short_to_bytes(_dst_id) + short_to_bytes(_rf_src)
+                    _call.RX_LC = const.LC_OPT + short_to_bytes(_dst_id) + short_to_bytes(_rf_src)
 
-                self.STATUS[_slot]['RX_PI_LC'] = const.LC_PI_OPT + b'\x00\x00\x00' + b'\x00\x00'
-                self._logger.debug('(%s) TS %s [STREAM ID %s] RX_LC %s', self._system, _slot, _stream_id, ahex(self.STATUS[_slot]['RX_LC']))
+                _call.RX_PI_LC = const.LC_PI_OPT + b'\x00\x00\x00' + b'\x00\x00'
+                self._logger.debug('(%s) TS %s [STREAM ID %s] RX_LC %s', self._system, _slot, _stream_id, lazy_ahex(_call.RX_LC))
 
             # If we can, use the PI LC from the PI voice header as to keep all
             # options intact
@@ -335,20 +513,20 @@ class routerFNE(coreFNE):
                 self._logger.info('(%s) DMRD: Traffic *CALL PI PARAMS  * PEER %s DST_ID %s TS %s ALGID %s KID %s [STREAM ID %s]', self._system,
                                         _peer_id, _dst_id, _slot, _alg_id, _key_id, _stream_id)
 
-                self.STATUS[_slot]['RX_PI_LC'] = lcHeader['LC'][:10]
+                _call.RX_PI_LC = lcHeader['LC'][:10]
 
-                self._logger.debug('(%s) TS %s [STREAM ID %s] RX_PI_LC %s', self._system, _slot, _stream_id, ahex(self.STATUS[_slot]['RX_PI_LC']))
+                self._logger.debug('(%s) TS %s [STREAM ID %s] RX_PI_LC %s', self._system, _slot, _stream_id, lazy_ahex(_call.RX_PI_LC))
 
-            for rule in RULES[self._system]['GROUP_VOICE']:
+            for rule in RULE_INDEX.get((self._system, _dst_id, _slot), ()):
                 _target = rule['DST_NET']
 
                 # skip if the target doesn't exist
                 if not (_target in systems):
                     continue
 
-                _target_status = systems[_target].STATUS
+                _tx_status = systems[_target].STATUS[rule['DST_TS']]
                 
-                if (rule['SRC_GROUP'] == _dst_id and rule['SRC_TS'] == _slot and rule['ACTIVE'] == True and rule['ROUTABLE'] == True):
+                if (rule['ACTIVE'] == True and rule['ROUTABLE'] == True):
                     
                     # BEGIN CONTENTION HANDLING
                     #
@@ -367,61 +545,72 @@ class routerFNE(coreFNE):
                     # The "continue" at the end of each means the next
                     # iteration of the for loop that tests for matching rules
                     #
-                    if ((rule['DST_GROUP'] != _target_status[rule['DST_TS']]['RX_TGID']) and ((pkt_time - _target_status[rule['DST_TS']]['RX_TIME']) < RULES[_target]['GROUP_HANGTIME'])):
+                    if ((rule['DST_GROUP'] != _tx_status.RX_TGID) and ((pkt_time - _tx_status.RX_TIME) < RULES[_target]['GROUP_HANGTIME'])):
                         if _frame_type == fne_const.FT_DATA_SYNC and _dtype_vseq == fne_const.DT_VOICE_LC_HEADER:
                             self._logger.info('(%s) DMRD: Call not routed to TGID %s, target active or in group hangtime: PRID %s TS %s TGID %s', self._system,
-                                              rule['DST_GROUP'], _target, rule['DST_TS'], _target_status[rule['DST_TS']]['RX_TGID'])
+                                              rule['DST_GROUP'], _target, rule['DST_TS'], _tx_status.RX_TGID)
 
                             if config['Reports']['Report']:
                                 self._report.send_routeEvent('CALL ROUTE,FAILED,DMR,{},{},{},{}'.format(self._system, _target, rule['DST_TS'], rule['DST_GROUP']))
+                        if self._hook_stats != None:
+                            self._hook_stats.skip(SKIP_HANGTIME)
                         continue    
-                    if ((rule['DST_GROUP'] != _target_status[rule['DST_TS']]['TX_TGID']) and ((pkt_time - _target_status[rule['DST_TS']]['TX_TIME']) < RULES[_target]['GROUP_HANGTIME'])):
+                    if ((rule['DST_GROUP'] != _tx_status.TX_TGID) and ((pkt_time - _tx_status.TX_TIME) < RULES[_target]['GROUP_HANGTIME'])):
                         if _frame_type == fne_const.FT_DATA_SYNC and _dtype_vseq == fne_const.DT_VOICE_LC_HEADER:
                             self._logger.info('(%s) DMRD: Call not routed to TGID %s, target in group hangtime: PRID %s TS %s TGID %s', self._system,
-                                              rule['DST_GROUP'], _target, rule['DST_TS'], _target_status[rule['DST_TS']]['TX_TGID'])
+                                              rule['DST_GROUP'], _target, rule['DST_TS'], _tx_status.TX_TGID)
                             
                             if config['Reports']['Report']:
                                 self._report.send_routeEvent('CALL ROUTE,FAILED,DMR,{},{},{},{}'.format(self._system, _target, rule['DST_TS'], rule['DST_GROUP']))
+                        if self._hook_stats != None:
+                            self._hook_stats.skip(SKIP_HANGTIME)
                         continue
-                    if (rule['DST_GROUP'] == _target_status[rule['DST_TS']]['RX_TGID']) and ((pkt_time - _target_status[rule['DST_TS']]['RX_TIME']) < fne_const.STREAM_TO):
+                    if (rule['DST_GROUP'] == _tx_status.RX_TGID) and ((pkt_time - _tx_status.RX_TIME) < fne_const.STREAM_TO):
                         if _frame_type == fne_const.FT_DATA_SYNC and _dtype_vseq == fne_const.DT_VOICE_LC_HEADER:
                             self._logger.info('(%s) DMRD: Call not routed to TGID %s, matching call already active on target: PRID %s TS %s TGID %s', self._system,
-                                              rule['DST_GROUP'], _target, rule['DST_TS'], _target_status[rule['DST_TS']]['RX_TGID'])
+                                              rule['DST_GROUP'], _target, rule['DST_TS'], _tx_status.RX_TGID)
 
                             if config['Reports']['Report']:
                                 self._report.send_routeEvent('CALL ROUTE,FAILED,DMR,{},{},{},{}'.format(self._system, _target, rule['DST_TS'], rule['DST_GROUP']))
+                        if self._hook_stats != None:
+                            self._hook_stats.skip(SKIP_COLLISION)
                         continue
-                    if (rule['DST_GROUP'] == _target_status[rule['DST_TS']]['TX_TGID']) and (_rf_src != _target_status[rule['DST_TS']]['TX_RFS']) and ((pkt_time - _target_status[rule['DST_TS']]['TX_TIME']) < fne_const.STREAM_TO):
+                    if (rule['DST_GROUP'] == _tx_status.TX_TGID) and (_rf_src != _tx_status.TX_RFS) and ((pkt_time - _tx_status.TX_TIME) < fne_const.STREAM_TO):
                         if _frame_type == fne_const.FT_DATA_SYNC and _dtype_vseq == fne_const.DT_VOICE_LC_HEADER:
                             self._logger.info('(%s) DMRD: Call not routed for SUB %s, call route in progress on target: PRID %s TS %s TGID %s SUB %s', self._system,
-                                              _rf_src, _target, rule['DST_TS'], _target_status[rule['DST_TS']]['TX_TGID'], _target_status[rule['DST_TS']]['TX_RFS'])
+                                              _rf_src, _target, rule['DST_TS'], _tx_status.TX_TGID, _tx_status.TX_RFS)
 
                             if config['Reports']['Report']:
                                 self._report.send_routeEvent('CALL ROUTE,FAILED,DMR,{},{},{},{}'.format(self._system, _target, rule['DST_TS'], rule['DST_GROUP']))
+                        if self._hook_stats != None:
+                            self._hook_stats.skip(SKIP_COLLISION)
                         continue
 
                     # Set values for the contention handler to test next time
                     # there is a frame to forward
-                    _target_status[rule['DST_TS']]['TX_TIME'] = pkt_time
+                    _tx_status.TX_TIME = pkt_time
+                    _lc_changed = False
                     
-                    if (_stream_id != self.STATUS[_slot]['RX_STREAM_ID']) or (_target_status[rule['DST_TS']]['TX_RFS'] != _rf_src) or (_target_status[rule['DST_TS']]['TX_TGID'] != rule['DST_GROUP']):
+                    if (_new_stream == True) or (_tx_status.TX_RFS != _rf_src) or (_tx_status.TX_TGID != rule['DST_GROUP']):
+                        _lc_changed = True
+
                         # Record the DST TGID and Stream ID
-                        _target_status[rule['DST_TS']]['TX_TGID'] = rule['DST_GROUP']
-                        _target_status[rule['DST_TS']]['TX_PI_TGID'] = 0
-                        _target_status[rule['DST_TS']]['TX_STREAM_ID'] = _stream_id
-                        _target_status[rule['DST_TS']]['TX_RFS'] = _rf_src
+                        _tx_status.TX_TGID = rule['DST_GROUP']
+                        _tx_status.TX_PI_TGID = 0
+                        _tx_status.TX_STREAM_ID = _stream_id
+                        _tx_status.TX_RFS = _rf_src
 
                         # Generate LCs (full and EMB) for the TX stream
-                        dst_lc = self.STATUS[_slot]['RX_LC'][0:3] + short_to_bytes(rule['DST_GROUP']) + short_to_bytes(_rf_src)
-                        _target_status[rule['DST_TS']]['TX_H_LC'] = bptc.encode_header_lc(dst_lc)
-                        _target_status[rule['DST_TS']]['TX_T_LC'] = bptc.encode_terminator_lc(dst_lc)
-                        _target_status[rule['DST_TS']]['TX_EMB_LC'] = bptc.encode_emblc(dst_lc)
+                        dst_lc = _call.RX_LC[0:3] + short_to_bytes(rule['DST_GROUP']) + short_to_bytes(_rf_src)
+                        _tx_status.TX_H_LC = bptc.encode_header_lc(dst_lc)
+                        _tx_status.TX_T_LC = bptc.encode_terminator_lc(dst_lc)
+                        _tx_status.TX_EMB_LC = bptc.encode_emblc(dst_lc)
 
-                        dst_pi_lc = self.STATUS[_slot]['RX_PI_LC'][0:7] + short_to_bytes(rule['DST_GROUP']) + b'\x00\x00'
-                        _target_status[rule['DST_TS']]['TX_P_LC'] = bptc.encode_header_pi(dst_pi_lc)
+                        dst_pi_lc = _call.RX_PI_LC[0:7] + short_to_bytes(rule['DST_GROUP']) + b'\x00\x00'
+                        _tx_status.TX_P_LC = bptc.encode_header_pi(dst_pi_lc)
 
-                        self._logger.debug('(%s) TS %s [STREAM ID %s] TX_H_LC %s', self._system, _slot, _stream_id, ahex(dst_lc))
-                        self._logger.debug('(%s) TS %s [STREAM ID %s] TX_P_LC %s', self._system, _slot, _stream_id, ahex(dst_pi_lc))
+                        self._logger.debug('(%s) TS %s [STREAM ID %s] TX_H_LC %s', self._system, _slot, _stream_id, lazy_ahex(dst_lc))
+                        self._logger.debug('(%s) TS %s [STREAM ID %s] TX_P_LC %s', self._system, _slot, _stream_id, lazy_ahex(dst_pi_lc))
 
                         self._logger.debug('(%s) DMR Packet DST TGID %s does not match SRC TGID %s - Generating FULL and EMB LCs', 
                                            self._system, rule['DST_GROUP'], _dst_id)
@@ -430,29 +619,25 @@ class routerFNE(coreFNE):
                         if config['Reports']['Report']:
                             self._report.send_routeEvent('CALL ROUTE,TO,DMR,{},{},{},{}'.format(self._system, _target, rule['DST_TS'], rule['DST_GROUP']))
 
-                    _pi_dst_id = bytes_to_int(self.STATUS[_slot]['RX_PI_LC'][7:10])
-                    if (_pi_dst_id != 0) and (_target_status[rule['DST_TS']]['TX_PI_TGID'] != rule['DST_GROUP']):
+                    _pi_dst_id = bytes_to_int(_call.RX_PI_LC[7:10])
+                    if (_pi_dst_id != 0) and (_tx_status.TX_PI_TGID != rule['DST_GROUP']):
+                        _lc_changed = True
+
                         # Record the DST TGID and Stream ID
-                        _target_status[rule['DST_TS']]['TX_PI_TGID'] = rule['DST_GROUP']
+                        _tx_status.TX_PI_TGID = rule['DST_GROUP']
 
                         # Generate LCs (full and EMB) for the TX stream
-                        dst_pi_lc = self.STATUS[_slot]['RX_PI_LC'][0:7] + short_to_bytes(rule['DST_GROUP']) + b'\x00\x00'
-                        _target_status[rule['DST_TS']]['TX_P_LC'] = bptc.encode_header_pi(dst_pi_lc)
+                        dst_pi_lc = _call.RX_PI_LC[0:7] + short_to_bytes(rule['DST_GROUP']) + b'\x00\x00'
+                        _tx_status.TX_P_LC = bptc.encode_header_pi(dst_pi_lc)
 
-                        self._logger.debug('(%s) TS %s [STREAM ID %s] TX_P_LC %s', self._system, _slot, _stream_id, ahex(dst_pi_lc))
+                        self._logger.debug('(%s) TS %s [STREAM ID %s] TX_P_LC %s', self._system, _slot, _stream_id, lazy_ahex(dst_pi_lc))
                         self._logger.info('(%s) DMRD: Call PI parameters routed to SYSTEM %s TS %s TGID %s',
                                           self._system, _target, rule['DST_TS'], rule['DST_GROUP'])
                     
-                    # Handle any necessary re-writes for the destination
-                    if rule['SRC_TS'] != rule['DST_TS']:
-                        _tmp_bits = _bits ^ 1 << 7
-                    else:
-                        _tmp_bits = _bits
-                    
                     try:
                         _tgt_peer_id = self._CONFIG['Systems'][_target]['PeerId']
                     except KeyError:
-                        _tgt_peer_id = self.STATUS[_slot]['RX_PEER_ID']
+                        _tgt_peer_id = _call.RX_PEER_ID
 
                     # somehow we've gotten a 0 for the peer ID -- so now we'll spoof the bitch
                     if (_tgt_peer_id == 0):
@@ -460,41 +645,35 @@ class routerFNE(coreFNE):
                                             self._system, _peer_id)
                         _tgt_peer_id = _peer_id
 
-                    _tmp_data = _data[:8] + short_to_bytes(rule['DST_GROUP']) + int_to_bytes(_tgt_peer_id) + _tmp_bits.to_bytes(1, "big") + _data[16:20]
-                    
                     # MUST TEST FOR NEW STREAM AND IF SO, RE-WRITE THE LC FOR THE TARGET
                     # MUST RE-WRITE DESTINATION TGID IF DIFFERENT
-                    # if _dst_id != rule['DST_GROUP']:
-                    dmrbits = bitarray(endian='big')
-                    dmrbits.frombytes(dmrpkt)
-                    # Create a voice header packet (FULL LC)
-                    if _frame_type == fne_const.FT_DATA_SYNC and _dtype_vseq == fne_const.DT_VOICE_LC_HEADER:
-                        dmrbits = _target_status[rule['DST_TS']]['TX_H_LC'][0:98] + dmrbits[98:166] + _target_status[rule['DST_TS']]['TX_H_LC'][98:197]
-                    # Create a voice PI header packet (FULL LC)
-                    elif _frame_type == fne_const.FT_DATA_SYNC and _dtype_vseq == fne_const.DT_VOICE_PI_HEADER:
-                        dmrbits = _target_status[rule['DST_TS']]['TX_P_LC'][0:98] + dmrbits[98:166] + _target_status[rule['DST_TS']]['TX_P_LC'][98:197]
-                    # Create a voice terminator packet (FULL LC)
-                    elif _frame_type == fne_const.FT_DATA_SYNC and _dtype_vseq == fne_const.DT_TERMINATOR_WITH_LC:
-                        dmrbits = _target_status[rule['DST_TS']]['TX_T_LC'][0:98] + dmrbits[98:166] + _target_status[rule['DST_TS']]['TX_T_LC'][98:197]
-                    # Create a Burst B-E packet (Embedded LC)
-                    elif _dtype_vseq in [1,2,3,4]:
-                        dmrbits = dmrbits[0:116] + _target_status[rule['DST_TS']]['TX_EMB_LC'][_dtype_vseq] + dmrbits[148:264]
-                    dmrpkt = dmrbits.tobytes()
-                    _tmp_data = _tmp_data + dmrpkt + _data[53:55]
+                    # The LC patches are generated once per stream and target,
+                    # and then applied to every header, terminator and burst B-E
+                    _rewrite_key = (_target, rule['DST_TS'], rule['DST_GROUP'])
+                    _rewrite = _call.LC_REWRITE.get(_rewrite_key)
+                    if (_rewrite == None) or (_lc_changed == True):
+                        _rewrite = lcRewrite(rule['DST_GROUP'], rule['SRC_TS'] != rule['DST_TS'], _tx_status)
+                        _call.LC_REWRITE[_rewrite_key] = _rewrite
+
+                    _tmp_data = _rewrite.rewrite(_data, _tgt_peer_id, _frame_type, _dtype_vseq)
                     
                     # Transmit the packet to the destination system
                     systems[_target].send_system(_tmp_data)
-                    self._logger.debug('(%s) DMR Packet routed by rule %s to %s SYSTEM %s',
-                                    self._system, rule['NAME'], self._CONFIG['Systems'][_target]['Mode'], _target)
+                    if self._logger.isEnabledFor(logging.DEBUG):
+                        self._logger.debug('(%s) DMR Packet routed by rule %s to %s SYSTEM %s',
+                                        self._system, rule['NAME'], self._CONFIG['Systems'][_target]['Mode'], _target)
 
             # Final actions - Is this a voice terminator?
-            if (_frame_type == fne_const.FT_DATA_SYNC) and (_dtype_vseq == fne_const.DT_TERMINATOR_WITH_LC) and (self.STATUS[_slot]['RX_TYPE'] != fne_const.DT_TERMINATOR_WITH_LC):
-                call_duration = pkt_time - self.STATUS[_slot]['RX_START']
+            if (_frame_type == fne_const.FT_DATA_SYNC) and (_dtype_vseq == fne_const.DT_TERMINATOR_WITH_LC) and (_call.RX_TYPE != fne_const.DT_TERMINATOR_WITH_LC):
+                call_duration = pkt_time - _call.RX_START
                 self._logger.info('(%s) DMRD: Traffic *CALL END        * PEER %s SRC_ID %s TGID %s TS %s DUR %s [STREAM ID: %s]', self._system,
                                   _peer_id, _rf_src, _dst_id, _slot, call_duration, _stream_id)
 
                 if config['Reports']['Report']:
                     self._report.send_routeEvent('GROUP VOICE,END,DMR,{},{},{},{},{},{},{:.2f}'.format(self._system, _stream_id, _peer_id, _rf_src, _slot, _dst_id, call_duration))
+
+                # the stream is over, drop its LC rewrites
+                _call.LC_REWRITE.clear()
                 
                 #
                 # Begin in-band signalling for call end.  This has nothign to
@@ -509,6 +688,7 @@ class routerFNE(coreFNE):
                     if _slot == rule['SRC_TS'] and _dst_id == rule['SRC_GROUP'] and ((rule['TO_TYPE'] == 'ON' and (rule['ROUTABLE'] == True)) or (rule['TO_TYPE'] == 'OFF' and rule['ROUTABLE'] == False)):
                         rule['TIMER'] = pkt_time + rule['TIMEOUT']
                         self._logger.info('(%s) DMRD: Source group transmission match for rule %s. Reset timeout to %s', self._system, rule['NAME'], rule['TIMER'])
+                        self.report_changed('RULES', self._system)
                 
                         # Scan for reciprocal rules and reset their timers as
                         # well.
@@ -516,6 +696,7 @@ class routerFNE(coreFNE):
                             if target_rule['NAME'] == rule['NAME']:
                                 target_rule['TIMER'] = pkt_time + target_rule['TIMEOUT']
                                 self._logger.info('(%s) DMRD: Reciprocal group transmission match for rule %s on IPSC %s. Reset timeout to %s', self._system, target_rule['NAME'], _target, rule['TIMER'])
+                                self.report_changed('RULES', _target)
             
                     # TGID matches an ACTIVATION trigger
                     if _dst_id in rule['ON']:
@@ -523,6 +704,7 @@ class routerFNE(coreFNE):
                         rule['ROUTABLE'] = True
                         rule['TIMER'] = pkt_time + rule['TIMEOUT']
                         self._logger.info('(%s) DMRD: Primary routing Rule %s changed to state: %s', self._system, rule['NAME'], rule['ROUTABLE'])
+                        self.report_changed('RULES', self._system)
                 
                         # Set reciprocal rules for other IPSCs as ROUTABLE
                         for target_rule in RULES[_target]['GROUP_VOICE']:
@@ -530,12 +712,14 @@ class routerFNE(coreFNE):
                                 target_rule['ROUTABLE'] = True
                                 target_rule['TIMER'] = pkt_time + target_rule['TIMEOUT']
                                 self._logger.info('(%s) DMRD: Reciprocal routing Rule %s in IPSC %s changed to state: %s', self._system, target_rule['NAME'], _target, rule['ROUTABLE'])
+                                self.report_changed('RULES', _target)
                         
                     # TGID matches an DE-ACTIVATION trigger
                     if _dst_id in rule['OFF']:
                         # Set the matching rule as ROUTABLE
                         rule['ROUTABLE'] = False
                         self._logger.info('(%s) DMRD: Routing Rule %s changed to state: %s', self._system, rule['NAME'], rule['ROUTABLE'])
+                        self.report_changed('RULES', self._system)
                 
                         # Set reciprocal rules for other IPSCs as ROUTABLE
                         _target = rule['DST_NET']
@@ -543,31 +727,42 @@ class routerFNE(coreFNE):
                             if target_rule['NAME'] == rule['NAME']:
                                 target_rule['ROUTABLE'] = False
                                 self._logger.info('(%s) DMRD: DMR Reciprocal routing Rule %s in IPSC %s changed to state: %s', self._system, target_rule['NAME'], _target, rule['ROUTABLE'])
+                                self.report_changed('RULES', _target)
                 #
                 # END IN-BAND SIGNALLING
                 #
                 
             # Mark status variables for use later
-            self.STATUS[_slot]['RX_PEER_ID'] = _peer_id
-            self.STATUS[_slot]['RX_RFS'] = _rf_src
-            self.STATUS[_slot]['RX_TYPE'] = _dtype_vseq
-            self.STATUS[_slot]['RX_TGID'] = _dst_id
-            self.STATUS[_slot]['RX_TIME'] = pkt_time
-            self.STATUS[_slot]['RX_STREAM_ID'] = _stream_id
+            _call.RX_RFS = _rf_src
+            _call.RX_TYPE = _dtype_vseq
+            _call.RX_TGID = _dst_id
+            _call.RX_TIME = pkt_time
+
+            self.STATUS[_slot].RX_PEER_ID = _peer_id
+            self.STATUS[_slot].RX_RFS = _rf_src
+            self.STATUS[_slot].RX_TYPE = _dtype_vseq
+            self.STATUS[_slot].RX_TGID = _dst_id
+            self.STATUS[_slot].RX_TIME = pkt_time
+            self.STATUS[_slot].RX_STREAM_ID = _stream_id
 
         elif _call_type == 'unit':
             # Is this a new call stream?
-            if (_stream_id != self.STATUS[_slot]['RX_STREAM_ID']):
-                if (self.STATUS[_slot]['RX_TYPE'] != fne_const.DT_TERMINATOR_WITH_LC) and (pkt_time < (self.STATUS[_slot]['RX_TIME'] + fne_const.STREAM_TO)) and (_rf_src != self.STATUS[_slot]['RX_RFS']):
+            _call = self.CALLS.get(_peer_id, _slot, _stream_id)
+            _new_stream = (_call == None)
+            if _new_stream == True:
+                _last = self.CALLS.last(_peer_id, _slot)
+                if (_last != None) and (_last.RX_TYPE != fne_const.DT_TERMINATOR_WITH_LC) and (pkt_time < (_last.RX_TIME + fne_const.STREAM_TO)) and (_rf_src != _last.RX_RFS):
                     self._logger.warning('(%s) DMRD: Traffic *CALL COLLISION  * PEER %s SRC_ID %s DST_ID %s TS %s [STREAM ID %s] (Collided with existing call)', self._system,
                                          _peer_id, _rf_src, _dst_id, _slot, _stream_id)
 
                     if config['Reports']['Report']:
                         self._report.send_routeEvent('PRV VOICE,CALL COLLISION,DMR,{},{},{},{},{},{}'.format(self._system, _stream_id, _peer_id, _rf_src, _slot, _dst_id))
+                    if self._hook_stats != None:
+                        self._hook_stats.drop(DROP_COLLISION)
                     return
                 
                 # This is a new call stream
-                self.STATUS[_slot]['RX_START'] = pkt_time
+                _call = self.CALLS.start(_peer_id, _slot, _stream_id, pkt_time)
                 self._logger.info('(%s) DMRD: Traffic *PRV CALL START  * PEER %s SRC_ID %s DST_ID %s TS %s [STREAM ID %s]', self._system,
                                   _peer_id, _rf_src, _dst_id, _slot, _stream_id)
 
@@ -575,8 +770,8 @@ class routerFNE(coreFNE):
                     self._report.send_routeEvent('PRV VOICE,START,DMR,{},{},{},{},{},{}'.format(self._system, _stream_id, _peer_id, _rf_src, _slot, _dst_id))
 
             # Final actions - Is this a voice terminator?
-            if (_frame_type == fne_const.FT_DATA_SYNC) and (_dtype_vseq == fne_const.DT_TERMINATOR_WITH_LC) and (self.STATUS[_slot]['RX_TYPE'] != fne_const.DT_TERMINATOR_WITH_LC):
-                call_duration = pkt_time - self.STATUS[_slot]['RX_START']
+            if (_frame_type == fne_const.FT_DATA_SYNC) and (_dtype_vseq == fne_const.DT_TERMINATOR_WITH_LC) and (_call.RX_TYPE != fne_const.DT_TERMINATOR_WITH_LC):
+                call_duration = pkt_time - _call.RX_START
                 self._logger.info('(%s) DMRD: Traffic *PRV CALL END    * PEER %s SRC_ID %s DST_ID %s TS %s DUR %s [STREAM ID: %s]', self._system,
                                   _peer_id, _rf_src, _dst_id, _slot, call_duration, _stream_id)
 
@@ -584,17 +779,23 @@ class routerFNE(coreFNE):
                     self._report.send_routeEvent('PRV VOICE,END,DMR,{},{},{},{},{},{},{:.2f}'.format(self._system, _stream_id, _peer_id, _rf_src, _slot, _dst_id, call_duration))
 
             # Mark status variables for use later
-            self.STATUS[_slot]['RX_PEER_ID'] = _peer_id
-            self.STATUS[_slot]['RX_RFS'] = _rf_src
-            self.STATUS[_slot]['RX_TYPE'] = _dtype_vseq
-            self.STATUS[_slot]['RX_TGID'] = _dst_id
-            self.STATUS[_slot]['RX_TIME'] = pkt_time
-            self.STATUS[_slot]['RX_STREAM_ID'] = _stream_id
-
-    def p25d_preprocess(self, _peer_id, _rf_src, _dst_id, _call_type, _duid, _dtype_vseq, _stream_id, _data):
+            _call.RX_RFS = _rf_src
+            _call.RX_TYPE = _dtype_vseq
+            _call.RX_TGID = _dst_id
+            _call.RX_TIME = pkt_time
+
+            self.STATUS[_slot].RX_PEER_ID = _peer_id
+            self.STATUS[_slot].RX_RFS = _rf_src
+            self.STATUS[_slot].RX_TYPE = _dtype_vseq
+            self.STATUS[_slot].RX_TGID = _dst_id
+            self.STATUS[_slot].RX_TIME = pkt_time
+            self.STATUS[_slot].RX_STREAM_ID = _stream_id
+
+    def p25d_preprocess(self, _frame):
+        _peer_id, _rf_src, _dst_id, _duid, _stream_id, _data = _frame.peer_id, _frame.rf_src, _frame.dst_id, _frame.duid, _frame.stream_id, _frame.data
         pkt_time = time()
         p25pkt = _data[24:]
-        _lcf = int(_data[4])
+        _lcf = _frame.lcf
         _slot = 1               # fake the slot data, P25 doesn't have this
 
         # Log but ignore TSDU or PDU packets here
@@ -642,19 +843,41 @@ class routerFNE(coreFNE):
 
         return
 
-    def p25d_validate(self, _peer_id, _rf_src, _dst_id, _call_type, _duid, _dtype_vseq, _stream_id):
+    def p25d_validate(self, _frame):
+        _key = (_frame.peer_id, 1, _frame.stream_id)
+
+        # TSDUs and PDUs aren't part of a call stream, they are always checked
+        if ((_frame.duid == fne_const.P25_DUID_TSDU) or (_frame.duid == fne_const.P25_DUID_PDU)):
+            return self.p25d_check_acl(_frame)
+
+        # The verdict can't change within a stream; so only check the first
+        # frame, and forget the stream again at its terminator
+        if ((_frame.duid == fne_const.P25_DUID_TDU) or (_frame.duid == fne_const.P25_DUID_TDULC)):
+            self.ACL_CACHE.remove(_key)
+            return self.p25d_check_acl(_frame)
+
+        _now = time()
+        _verdict = self.ACL_CACHE.get(_key, _now)
+        if _verdict == None:
+            _verdict = self.p25d_check_acl(_frame)
+            self.ACL_CACHE.put(_key, _verdict, _now)
+        return _verdict
+
+    def p25d_check_acl(self, _frame):
+        _peer_id, _rf_src, _dst_id, _call_type, _duid, _dtype_vseq, _stream_id = (_frame.peer_id, _frame.rf_src, _frame.dst_id, _frame.call_type,
+            _frame.duid, _frame.dtype_vseq, _frame.stream_id)
         pkt_time = time()
         _slot = 1
 
         if get_valid(_rf_src, black_rids) == True:
-            if (_stream_id != self.STATUS[_slot]['RX_STREAM_ID']):
+            if (_stream_id != self.STATUS[_slot].RX_STREAM_ID):
                 # Mark status variables for use later
-                self.STATUS[_slot]['RX_START'] = pkt_time
-                self.STATUS[_slot]['RX_PEER_ID'] = _peer_id
-                self.STATUS[_slot]['RX_RFS'] = _rf_src
-                self.STATUS[_slot]['RX_TYPE'] = _dtype_vseq
-                self.STATUS[_slot]['RX_TGID'] = _dst_id
-                self.STATUS[_slot]['RX_STREAM_ID'] = _stream_id
+                self.STATUS[_slot].RX_START = pkt_time
+                self.STATUS[_slot].RX_PEER_ID = _peer_id
+                self.STATUS[_slot].RX_RFS = _rf_src
+                self.STATUS[_slot].RX_TYPE = _dtype_vseq
+                self.STATUS[_slot].RX_TGID = _dst_id
+                self.STATUS[_slot].RX_STREAM_ID = _stream_id
                 self._logger.warning('(%s) P25D: Traffic *REJECT ACL      * PEER %s SRC_ID %s DST_ID %s DUID %s [STREAM ID %s] (Blacklisted RID)', self._system,
                                      _peer_id, _rf_src, _dst_id, _duid, _stream_id)
 
@@ -672,15 +895,15 @@ class routerFNE(coreFNE):
         
         if _call_type == 'group':
             if (RULES[self._system]['SEND_TGID'] == True) and (get_valid(_dst_id, config['Systems'][self._system]['ACTIVE_TG_IDS']) == False):
-                if (_stream_id != self.STATUS[_slot]['RX_STREAM_ID']):
+                if (_stream_id != self.STATUS[_slot].RX_STREAM_ID):
                     # Mark status variables for use later
-                    self.STATUS[_slot]['RX_START'] = pkt_time
-                    self.STATUS[_slot]['RX_PEER_ID'] = _peer_id
-                    self.STATUS[_slot]['RX_RFS'] = _rf_src
-                    self.STATUS[_slot]['RX_TYPE'] = _dtype_vseq
-                    self.STATUS[_slot]['RX_TGID'] = _dst_id
-                    self.STATUS[_slot]['RX_STREAM_ID'] = _stream_id
-                    self.STATUS[_slot]['P25_RX_CT'] = 'group'
+                    self.STATUS[_slot].RX_START = pkt_time
+                    self.STATUS[_slot].RX_PEER_ID = _peer_id
+                    self.STATUS[_slot].RX_RFS = _rf_src
+                    self.STATUS[_slot].RX_TYPE = _dtype_vseq
+                    self.STATUS[_slot].RX_TGID = _dst_id
+                    self.STATUS[_slot].RX_STREAM_ID = _stream_id
+                    self.STATUS[_slot].P25_RX_CT = 'group'
                     self._logger.warning('(%s) P25D: Traffic *REJECT ACL      * PEER %s SRC_ID %s DST_ID %s DUID %s [STREAM ID %s] (Illegal TGID)', self._system,
                                          _peer_id, _rf_src, _dst_id, _duid, _stream_id)
 
@@ -691,15 +914,15 @@ class routerFNE(coreFNE):
         elif _call_type == 'unit':
             if ((get_valid(_rf_src, white_rids) == False and get_valid(_dst_id, white_rids) == False) or
                (get_valid(_rf_src, white_rids) == False or get_valid(_dst_id, white_rids) == False)):
-                if (_stream_id != self.STATUS[_slot]['RX_STREAM_ID']):
+                if (_stream_id != self.STATUS[_slot].RX_STREAM_ID):
                     # Mark status variables for use later
-                    self.STATUS[_slot]['RX_START'] = pkt_time
-                    self.STATUS[_slot]['RX_PEER_ID'] = _peer_id
-                    self.STATUS[_slot]['RX_RFS'] = _rf_src
-                    self.STATUS[_slot]['RX_TYPE'] = _dtype_vseq
-                    self.STATUS[_slot]['RX_TGID'] = _dst_id
-                    self.STATUS[_slot]['RX_STREAM_ID'] = _stream_id
-                    self.STATUS[_slot]['P25_RX_CT'] = 'unit'
+                    self.STATUS[_slot].RX_START = pkt_time
+                    self.STATUS[_slot].RX_PEER_ID = _peer_id
+                    self.STATUS[_slot].RX_RFS = _rf_src
+                    self.STATUS[_slot].RX_TYPE = _dtype_vseq
+                    self.STATUS[_slot].RX_TGID = _dst_id
+                    self.STATUS[_slot].RX_STREAM_ID = _stream_id
+                    self.STATUS[_slot].P25_RX_CT = 'unit'
                     self._logger.warning('(%s) P25D: Traffic *REJECT ACL      * PEER %s SRC_ID %s DST_ID %s DUID %s [STREAM ID %s] (Illegal RID)', self._system,
                                          _peer_id, _rf_src, _dst_id, _duid, _stream_id)
 
@@ -709,56 +932,68 @@ class routerFNE(coreFNE):
         
         return True
 
-    def p25d_received(self, _peer_id, _rf_src, _dst_id, _call_type, _duid, _dtype_vseq, _stream_id, _data):
+    def p25d_received(self, _frame):
+        _peer_id, _rf_src, _dst_id, _call_type, _duid, _dtype_vseq, _stream_id, _data = (_frame.peer_id, _frame.rf_src, _frame.dst_id, _frame.call_type,
+            _frame.duid, _frame.dtype_vseq, _frame.stream_id, _frame.data)
         pkt_time = time()
         p25pkt = _data[24:]
-        _lcf = int(_data[4])
+        _lcf = _frame.lcf
         _slot = 1               # fake the slot data, P25 doesn't have this
 
         # Ignore TSDU or PDU packets here
         if ((_duid == fne_const.P25_DUID_TSDU) or (_duid == fne_const.P25_DUID_PDU)):
             return
 
+        _call = self.CALLS.get(_peer_id, _slot, _stream_id)
+        _new_stream = (_call == None)
+
         # Override call type if necessary
-        if ((_duid == fne_const.P25_DUID_TDU) or (_duid == fne_const.P25_DUID_TDULC)) and (self.STATUS[_slot]['RX_TYPE'] != fne_const.DT_TERMINATOR_WITH_LC):
-            if self.STATUS[_slot]['P25_RX_CT'] != _call_type:
-                _call_type = self.STATUS[_slot]['P25_RX_CT']
+        if ((_duid == fne_const.P25_DUID_TDU) or (_duid == fne_const.P25_DUID_TDULC)):
+            # a terminator can only end a call we know about
+            if _new_stream == True:
+                return
+
+            if (_call.RX_TYPE != fne_const.DT_TERMINATOR_WITH_LC) and (_call.P25_RX_CT != _call_type):
+                _call_type = _call.P25_RX_CT
 
         if _call_type == 'group':
             # Is this a new call stream?
-            if (_stream_id != self.STATUS[_slot]['RX_STREAM_ID']) and ((_duid != fne_const.P25_DUID_TDU) and (_duid != fne_const.P25_DUID_TDULC)):
-                if (self.STATUS[_slot]['RX_TYPE'] != fne_const.DT_TERMINATOR_WITH_LC) and (pkt_time < (self.STATUS[_slot]['RX_TIME'] + fne_const.STREAM_TO)) and (_rf_src != self.STATUS[_slot]['RX_RFS']):
+            if _new_stream == True:
+                _last = self.CALLS.last(_peer_id, _slot)
+                if (_last != None) and (_last.RX_TYPE != fne_const.DT_TERMINATOR_WITH_LC) and (pkt_time < (_last.RX_TIME + fne_const.STREAM_TO)) and (_rf_src != _last.RX_RFS):
                     self._logger.warning('(%s) P25D: Traffic *CALL COLLISION  * PEER %s SRC_ID %s TGID %s [STREAM ID %s] (Collided with existing call)', self._system,
                                          _peer_id, _rf_src, _dst_id, _stream_id)
 
                     if config['Reports']['Report']:
                         self._report.send_routeEvent('GROUP VOICE,CALL COLLISION,P25,{},{},{},{},{},{}'.format(self._system, _stream_id, _peer_id, _rf_src, _slot, _dst_id))
+                    if self._hook_stats != None:
+                        self._hook_stats.drop(DROP_COLLISION)
                     return
                 
                 # This is a new call stream
-                self.STATUS[_slot]['RX_START'] = pkt_time
+                _call = self.CALLS.start(_peer_id, _slot, _stream_id, pkt_time)
                 self._logger.info('(%s) P25D: Traffic *CALL START      * PEER %s SRC_ID %s TGID %s [STREAM ID %s]', self._system,
                                   _peer_id, _rf_src, _dst_id, _stream_id)
 
-                self.STATUS[_slot]['P25_RX_CT'] = 'group'
+                _call.P25_RX_CT = 'group'
 
                 if config['Reports']['Report']:
                     self._report.send_routeEvent('GROUP VOICE,START,P25,{},{},{},{},{},{}'.format(self._system, _stream_id, _peer_id, _rf_src, _slot, _dst_id))
 
-            for rule in RULES[self._system]['GROUP_VOICE']:
+            if ((_duid == fne_const.P25_DUID_TDU) or (_duid == fne_const.P25_DUID_TDULC)):
+                _dst_id = _call.RX_TGID
+                _rf_src = _call.RX_RFS
+
+            for rule in RULE_INDEX.get((self._system, _dst_id, None), ()):
                 _target = rule['DST_NET']
 
                 # skip if the target doesn't exist
                 if not (_target in systems):
                     continue
 
-                _target_status = systems[_target].STATUS
-               
-                if ((_duid == fne_const.P25_DUID_TDU) or (_duid == fne_const.P25_DUID_TDULC)):
-                    _dst_id = self.STATUS[_slot]['RX_TGID']
-                    _rf_src = self.STATUS[_slot]['RX_RFS']
+                _tx_status = systems[_target].STATUS[rule['DST_TS']]
  
-                if (rule['SRC_GROUP'] == _dst_id and rule['ACTIVE'] == True and rule['ROUTABLE'] == True):
+                if (rule['ACTIVE'] == True and rule['ROUTABLE'] == True):
                         
                     # BEGIN CONTENTION HANDLING
                     #
@@ -777,37 +1012,43 @@ class routerFNE(coreFNE):
                     # The "continue" at the end of each means the next
                     # iteration of the for loop that tests for matching rules
                     #
-                    if ((rule['DST_GROUP'] != _target_status[rule['DST_TS']]['RX_TGID']) and ((pkt_time - _target_status[rule['DST_TS']]['RX_TIME']) < RULES[_target]['GROUP_HANGTIME'])):
+                    if ((rule['DST_GROUP'] != _tx_status.RX_TGID) and ((pkt_time - _tx_status.RX_TIME) < RULES[_target]['GROUP_HANGTIME'])):
                         self._logger.info('(%s) P25D: Call not routed to TGID %s, target active or in group hangtime: PRID %s TGID %s', self._system,
-                                          rule['DST_GROUP'], _target, _target_status[rule['DST_TS']]['RX_TGID'])
+                                          rule['DST_GROUP'], _target, _tx_status.RX_TGID)
                         
                         if config['Reports']['Report']:
                             self._report.send_routeEvent('CALL ROUTE,FAILED,P25,{},{},{},{}'.format(self._system, _target, 1, rule['DST_GROUP']))
+                        if self._hook_stats != None:
+                            self._hook_stats.skip(SKIP_HANGTIME)
                         continue    
-                    if ((rule['DST_GROUP'] != _target_status[rule['DST_TS']]['TX_TGID']) and ((pkt_time - _target_status[rule['DST_TS']]['TX_TIME']) < RULES[_target]['GROUP_HANGTIME'])):
+                    if ((rule['DST_GROUP'] != _tx_status.TX_TGID) and ((pkt_time - _tx_status.TX_TIME) < RULES[_target]['GROUP_HANGTIME'])):
                         self._logger.info('(%s) P25D: Call not routed to TGID %s, target in group hangtime: PRID %s TGID %s', self._system,
-                                          rule['DST_GROUP'], _target, _target_status[rule['DST_TS']]['TX_TGID'])
+                                          rule['DST_GROUP'], _target, _tx_status.TX_TGID)
                         
                         if config['Reports']['Report']:
                             self._report.send_routeEvent('CALL ROUTE,FAILED,P25,{},{},{},{}'.format(self._system, _target, 1, rule['DST_GROUP']))
+                        if self._hook_stats != None:
+                            self._hook_stats.skip(SKIP_HANGTIME)
                         continue
-                    if (rule['DST_GROUP'] == _target_status[rule['DST_TS']]['TX_TGID']) and (_rf_src != _target_status[rule['DST_TS']]['TX_RFS']) and ((pkt_time - _target_status[rule['DST_TS']]['TX_TIME']) < fne_const.STREAM_TO):
+                    if (rule['DST_GROUP'] == _tx_status.TX_TGID) and (_rf_src != _tx_status.TX_RFS) and ((pkt_time - _tx_status.TX_TIME) < fne_const.STREAM_TO):
                         self._logger.info('(%s) P25D: Call not routed for SRC_ID %s, call route in progress on target: PRID %s TGID %s SRC_ID %s', self._system,
-                                          _rf_src, _target, _target_status[rule['DST_TS']]['TX_TGID'], _target_status[rule['DST_TS']]['TX_RFS'])
+                                          _rf_src, _target, _tx_status.TX_TGID, _tx_status.TX_RFS)
                         
                         if config['Reports']['Report']:
                             self._report.send_routeEvent('CALL ROUTE,FAILED,P25,{},{},{},{}'.format(self._system, _target, 1, rule['DST_GROUP']))
+                        if self._hook_stats != None:
+                            self._hook_stats.skip(SKIP_COLLISION)
                         continue
 
                     # Set values for the contention handler to test next time
                     # there is a frame to forward
-                    _target_status[rule['DST_TS']]['TX_TIME'] = pkt_time
+                    _tx_status.TX_TIME = pkt_time
                     
-                    if (_stream_id != self.STATUS[_slot]['RX_STREAM_ID']) or (_target_status[rule['DST_TS']]['TX_RFS'] != _rf_src) or (_target_status[rule['DST_TS']]['TX_TGID'] != rule['DST_GROUP']):       
+                    if (_new_stream == True) or (_tx_status.TX_RFS != _rf_src) or (_tx_status.TX_TGID != rule['DST_GROUP']):       
                         # Record the DST TGID and Stream ID
-                        _target_status[rule['DST_TS']]['TX_TGID'] = rule['DST_GROUP']
-                        _target_status[rule['DST_TS']]['TX_STREAM_ID'] = _stream_id
-                        _target_status[rule['DST_TS']]['TX_RFS'] = _rf_src
+                        _tx_status.TX_TGID = rule['DST_GROUP']
+                        _tx_status.TX_STREAM_ID = _stream_id
+                        _tx_status.TX_RFS = _rf_src
                         self._logger.info('(%s) P25D: Call routed to SYSTEM %s TGID %s', self._system, _target, rule['DST_GROUP'])
 
                         if config['Reports']['Report']:
@@ -816,7 +1057,7 @@ class routerFNE(coreFNE):
                     try:
                         _tgt_peer_id = self._CONFIG['Systems'][_target]['PeerId']
                     except KeyError:
-                        _tgt_peer_id = self.STATUS[_slot]['RX_PEER_ID']
+                        _tgt_peer_id = _call.RX_PEER_ID
 
                     # somehow we've gotten a 0 for the peer ID -- so now we'll spoof the bitch
                     if (_tgt_peer_id == 0):
@@ -829,18 +1070,17 @@ class routerFNE(coreFNE):
                     
                     # Transmit the packet to the destination system
                     systems[_target].send_system(_tmp_data)
-                    self._logger.debug('(%s) P25 Packet routed by rule %s to %s SYSTEM %s', self._system, rule['NAME'], self._CONFIG['Systems'][_target]['Mode'], _target)
+                    if self._logger.isEnabledFor(logging.DEBUG):
+                        self._logger.debug('(%s) P25 Packet routed by rule %s to %s SYSTEM %s', self._system, rule['NAME'], self._CONFIG['Systems'][_target]['Mode'], _target)
             
             # Final actions - Is this a voice terminator?
-            if ((_duid == fne_const.P25_DUID_TDU) or (_duid == fne_const.P25_DUID_TDULC)) and (self.STATUS[_slot]['RX_TYPE'] != fne_const.DT_TERMINATOR_WITH_LC):
-                call_duration = pkt_time - self.STATUS[_slot]['RX_START']
-                _dst_id = self.STATUS[_slot]['RX_TGID']
-                _rf_src = self.STATUS[_slot]['RX_RFS']
+            if ((_duid == fne_const.P25_DUID_TDU) or (_duid == fne_const.P25_DUID_TDULC)) and (_call.RX_TYPE != fne_const.DT_TERMINATOR_WITH_LC):
+                call_duration = pkt_time - _call.RX_START
+                _dst_id = _call.RX_TGID
+                _rf_src = _call.RX_RFS
                 self._logger.info('(%s) P25D: Traffic *CALL END        * PEER %s SRC_ID %s TGID %s DUR %s [STREAM ID %s]', self._system,
                                   _peer_id, _rf_src, _dst_id, call_duration, _stream_id)
 
-                self.STATUS[_slot]['P25_RX_CT'] = 'group'
-
                 if config['Reports']['Report']:
                     self._report.send_routeEvent('GROUP VOICE,END,P25,{},{},{},{},{},{},{:.2f}'.format(self._system, _stream_id, _peer_id, _rf_src, _slot, _dst_id, call_duration))
 
@@ -857,6 +1097,7 @@ class routerFNE(coreFNE):
                     if _dst_id == rule['SRC_GROUP'] and ((rule['TO_TYPE'] == 'ON' and (rule['ROUTABLE'] == True)) or (rule['TO_TYPE'] == 'OFF' and rule['ROUTABLE'] == False)):
                         rule['TIMER'] = pkt_time + rule['TIMEOUT']
                         self._logger.info('(%s) P25D: Source group transmission match for rule %s. Reset timeout to %s', self._system, rule['NAME'], rule['TIMER'])
+                        self.report_changed('RULES', self._system)
                 
                         # Scan for reciprocal rules and reset their timers as
                         # well.
@@ -864,6 +1105,7 @@ class routerFNE(coreFNE):
                             if target_rule['NAME'] == rule['NAME']:
                                 target_rule['TIMER'] = pkt_time + target_rule['TIMEOUT']
                                 self._logger.info('(%s) P25D: Reciprocal group transmission match for rule %s on IPSC %s. Reset timeout to %s', self._system, target_rule['NAME'], _target, rule['TIMER'])
+                                self.report_changed('RULES', _target)
             
                     # TGID matches an ACTIVATION trigger
                     if _dst_id in rule['ON']:
@@ -871,6 +1113,7 @@ class routerFNE(coreFNE):
                         rule['ROUTABLE'] = True
                         rule['TIMER'] = pkt_time + rule['TIMEOUT']
                         self._logger.info('(%s) P25D: Primary routing Rule %s changed to state: %s', self._system, rule['NAME'], rule['ROUTABLE'])
+                        self.report_changed('RULES', self._system)
                 
                         # Set reciprocal rules for other IPSCs as ROUTABLE
                         for target_rule in RULES[_target]['GROUP_VOICE']:
@@ -878,12 +1121,14 @@ class routerFNE(coreFNE):
                                 target_rule['ROUTABLE'] = True
                                 target_rule['TIMER'] = pkt_time + target_rule['TIMEOUT']
                                 self._logger.info('(%s) P25D: Reciprocal routing Rule %s in IPSC %s changed to state: %s', self._system, target_rule['NAME'], _target, rule['ROUTABLE'])
+                                self.report_changed('RULES', _target)
                         
                     # TGID matches an DE-ACTIVATION trigger
                     if _dst_id in rule['OFF']:
                         # Set the matching rule as ROUTABLE
                         rule['ROUTABLE'] = False
                         self._logger.info('(%s) P25D: Routing Rule %s changed to state: %s', self._system, rule['NAME'], rule['ROUTABLE'])
+                        self.report_changed('RULES', self._system)
                 
                         # Set reciprocal rules for other IPSCs as ROUTABLE
                         _target = rule['DST_NET']
@@ -891,61 +1136,75 @@ class routerFNE(coreFNE):
                             if target_rule['NAME'] == rule['NAME']:
                                 target_rule['ROUTABLE'] = False
                                 self._logger.info('(%s) P25D: Reciprocal routing Rule %s in IPSC %s changed to state: %s', self._system, target_rule['NAME'], _target, rule['ROUTABLE'])
+                                self.report_changed('RULES', _target)
                 #
                 # END IN-BAND SIGNALLING
                 #
 
             # Mark status variables for use later
-            self.STATUS[_slot]['RX_PEER_ID'] = _peer_id
-            self.STATUS[_slot]['RX_RFS'] = _rf_src
-            self.STATUS[_slot]['RX_TYPE'] = _dtype_vseq
-            self.STATUS[_slot]['RX_TGID'] = _dst_id
-            self.STATUS[_slot]['RX_TIME'] = pkt_time
-            self.STATUS[_slot]['RX_STREAM_ID'] = _stream_id
+            _call.RX_RFS = _rf_src
+            _call.RX_TYPE = _dtype_vseq
+            _call.RX_TGID = _dst_id
+            _call.RX_TIME = pkt_time
+
+            self.STATUS[_slot].RX_PEER_ID = _peer_id
+            self.STATUS[_slot].RX_RFS = _rf_src
+            self.STATUS[_slot].RX_TYPE = _dtype_vseq
+            self.STATUS[_slot].RX_TGID = _dst_id
+            self.STATUS[_slot].RX_TIME = pkt_time
+            self.STATUS[_slot].RX_STREAM_ID = _stream_id
 
         elif _call_type == 'unit':
             # Is this a new call stream?
-            if (_stream_id != self.STATUS[_slot]['RX_STREAM_ID']) and ((_duid != fne_const.P25_DUID_TDU) and (_duid != fne_const.P25_DUID_TDULC)):
-                if (self.STATUS[_slot]['RX_TYPE'] != fne_const.DT_TERMINATOR_WITH_LC) and (pkt_time < (self.STATUS[_slot]['RX_TIME'] + fne_const.STREAM_TO)) and (_rf_src != self.STATUS[_slot]['RX_RFS']):
+            if _new_stream == True:
+                _last = self.CALLS.last(_peer_id, _slot)
+                if (_last != None) and (_last.RX_TYPE != fne_const.DT_TERMINATOR_WITH_LC) and (pkt_time < (_last.RX_TIME + fne_const.STREAM_TO)) and (_rf_src != _last.RX_RFS):
                     self._logger.warning('(%s) P25D: Traffic *CALL COLLISION  * PEER %s SRC_ID %s DST_ID %s [STREAM ID %s] (Collided with existing call)', self._system,
                                          _peer_id, _rf_src, _dst_id, _stream_id)
 
                     if config['Reports']['Report']:
                         self._report.send_routeEvent('PRV VOICE,CALL COLLISION,P25,{},{},{},{},{},{}'.format(self._system, _stream_id, _peer_id, _rf_src, _slot, _dst_id))
+                    if self._hook_stats != None:
+                        self._hook_stats.drop(DROP_COLLISION)
                     return
                 
                 # This is a new call stream
-                self.STATUS[_slot]['RX_START'] = pkt_time
+                _call = self.CALLS.start(_peer_id, _slot, _stream_id, pkt_time)
                 self._logger.info('(%s) P25D: Traffic *PRV CALL START  * PEER %s SRC_ID %s DST_ID %s [STREAM ID %s]', self._system,
                                   _peer_id, _rf_src, _dst_id, _stream_id)
 
-                self.STATUS[_slot]['P25_RX_CT'] = 'unit'
+                _call.P25_RX_CT = 'unit'
 
                 if config['Reports']['Report']:
                     self._report.send_routeEvent('PRV VOICE,START,P25,{},{},{},{},{},{}'.format(self._system, _stream_id, _peer_id, _rf_src, _slot, _dst_id))
 
             # Final actions - Is this a voice terminator?
-            if ((_duid == fne_const.P25_DUID_TDU) or (_duid == fne_const.P25_DUID_TDULC)) and (self.STATUS[_slot]['RX_TYPE'] != fne_const.DT_TERMINATOR_WITH_LC):
-                call_duration = pkt_time - self.STATUS[_slot]['RX_START']
-                _dst_id = self.STATUS[_slot]['RX_TGID']
-                _rf_src = self.STATUS[_slot]['RX_RFS']
+            if ((_duid == fne_const.P25_DUID_TDU) or (_duid == fne_const.P25_DUID_TDULC)) and (_call.RX_TYPE != fne_const.DT_TERMINATOR_WITH_LC):
+                call_duration = pkt_time - _call.RX_START
+                _dst_id = _call.RX_TGID
+                _rf_src = _call.RX_RFS
                 self._logger.info('(%s) P25D: Traffic *PRV CALL END    * PEER %s SRC_ID %s DST_ID %s DUR %s [STREAM ID %s]', self._system,
                                   _peer_id, _rf_src, _dst_id, call_duration, _stream_id)
 
-                self.STATUS[_slot]['P25_RX_CT'] = 'group'
-
                 if config['Reports']['Report']:
                     self._report.send_routeEvent('PRV VOICE,END,P25,{},{},{},{},{},{},{:.2f}'.format(self._system, _stream_id, _peer_id, _rf_src, _slot, _dst_id, call_duration))
 
             # Mark status variables for use later
-            self.STATUS[_slot]['RX_PEER_ID'] = _peer_id
-            self.STATUS[_slot]['RX_RFS'] = _rf_src
-            self.STATUS[_slot]['RX_TYPE'] = _dtype_vseq
-            self.STATUS[_slot]['RX_TGID'] = _dst_id
-            self.STATUS[_slot]['RX_TIME'] = pkt_time
-            self.STATUS[_slot]['RX_STREAM_ID'] = _stream_id
-
-    def peer_ignored(self, _peer_id, _rf_src, _dst_id, _call_type, _slot, _dtype_vseq, _stream_id, _is_source):
+            _call.RX_RFS = _rf_src
+            _call.RX_TYPE = _dtype_vseq
+            _call.RX_TGID = _dst_id
+            _call.RX_TIME = pkt_time
+
+            self.STATUS[_slot].RX_PEER_ID = _peer_id
+            self.STATUS[_slot].RX_RFS = _rf_src
+            self.STATUS[_slot].RX_TYPE = _dtype_vseq
+            self.STATUS[_slot].RX_TGID = _dst_id
+            self.STATUS[_slot].RX_TIME = pkt_time
+            self.STATUS[_slot].RX_STREAM_ID = _stream_id
+
+    def peer_ignored(self, _peer_id, _frame, _is_source):
+        _rf_src, _dst_id, _call_type, _slot, _dtype_vseq, _stream_id = (_frame.rf_src, _frame.dst_id, _frame.call_type, _frame.slot,
+            _frame.dtype_vseq, _frame.stream_id)
         # Unit to unit call is always passed...
         if _call_type == 'unit':
             return False
@@ -957,14 +1216,14 @@ class routerFNE(coreFNE):
                         if (len(GRP_AFF[_peer_id][_dst_id]) > 0):
                             return False
 
-            if (_stream_id != self.STATUS[_slot]['RX_STREAM_ID']):
+            if (_stream_id != self.STATUS[_slot].RX_STREAM_ID):
                 if _is_source == True:
                     # Mark status variables for use later
-                    self.STATUS[_slot]['RX_PEER_ID'] = _peer_id
-                    self.STATUS[_slot]['RX_RFS'] = _rf_src
-                    self.STATUS[_slot]['RX_TYPE'] = _dtype_vseq
-                    self.STATUS[_slot]['RX_TGID'] = _dst_id
-                    self.STATUS[_slot]['RX_STREAM_ID'] = _stream_id
+                    self.STATUS[_slot].RX_PEER_ID = _peer_id
+                    self.STATUS[_slot].RX_RFS = _rf_src
+                    self.STATUS[_slot].RX_TYPE = _dtype_vseq
+                    self.STATUS[_slot].RX_TGID = _dst_id
+                    self.STATUS[_slot].RX_STREAM_ID = _stream_id
 
                 self._logger.warning('(%s) Traffic *REJECT ACL      * PEER %s SRC_ID %s DST_ID %s [STREAM ID %s] (Ignored Peer)', self._system,
                                      _peer_id, _rf_src, _dst_id, _stream_id)
@@ -1011,7 +1270,9 @@ class routerFNE(coreFNE):
 
         # add the source RID to the affiliated TGs
         GRP_AFF[_peer_id][_dst_id].append(_rf_src)
+        self.report_changed('GRP_AFF', _peer_id)
         self._logger.info('(%s) P25D: PEER %s Added SRC_ID %s affiliation to TGID %s [STREAM ID %s]', self._system, _peer_id, _rf_src, _dst_id, _stream_id)
+        invalidate_all_fanout()
 
     def remove_grp_aff(self, _peer_id, _rf_src, _stream_id):
         _dst_id = 0
@@ -1026,6 +1287,7 @@ class routerFNE(coreFNE):
                 try:
                     idx = GRP_AFF[_peer_id][tgid].index(_rf_src)
                     del GRP_AFF[_peer_id][tgid][idx]
+                    self.report_changed('GRP_AFF', _peer_id)
                     self._logger.info('(%s) P25D: PEER %s Removed SRC_ID %s affiliation from TGID %s [STREAM ID %s]', self._system, _peer_id, _rf_src, tgid, _stream_id)
 
                     # if there are no more affiliations delete the TG from the affiliations table
@@ -1038,15 +1300,18 @@ class routerFNE(coreFNE):
         if _dst_id != 0:
             del GRP_AFF[_peer_id][_dst_id]
             self._logger.info('(%s) P25D: PEER %s Removed TGID %s from affiliations table [STREAM ID %s]', self._system, _peer_id, _dst_id, _stream_id)
+            invalidate_all_fanout()
 
     def rid_tid_update_loop(self):
-        from fne.fne_core import mk_id_dict
+        from fne.fne_core import mk_id_set
 
         self._logger.debug('(ALL SYSTEMS) RID/TID update timer loop started')
         global RULES
         try:
             if RULES[self._system]['MASTER'] == True:
                 RULES = make_rules('fne_routing_rules')
+                self.report_changed('RULES', STATE_ALL)
+                self.report_changed('SYSTEMS', STATE_ALL)
 
             if RULES[self._system]['SEND_TGID'] == True:
                 _tg_ids = config['Systems'][self._system]['ACTIVE_TG_IDS']
@@ -1061,17 +1326,22 @@ class routerFNE(coreFNE):
         except Exception:
             logger.error('Failed processing and sending rules for %s', self._system)
 
-        global white_rids
-        white_rids = mk_id_dict(self._CONFIG['Aliases']['Path'], self._CONFIG['Aliases']['WhitelistRIDsFile'])
+        global white_rids, black_rids
+        _white_rids, _black_rids = white_rids, black_rids
+
+        white_rids = mk_id_set(self._CONFIG['Aliases']['Path'], self._CONFIG['Aliases']['WhitelistRIDsFile'], white_rids)
         if white_rids:
             self._logger.debug('ID MAPPER: white_rids dictionary is available, and being sent to peers')
             self.master_send_wrids(white_rids)
 
-        global black_rids
-        black_rids = mk_id_dict(self._CONFIG['Aliases']['Path'], self._CONFIG['Aliases']['BlacklistRIDsFile'])
+        black_rids = mk_id_set(self._CONFIG['Aliases']['Path'], self._CONFIG['Aliases']['BlacklistRIDsFile'], black_rids)
         if black_rids:
             self._logger.debug('ID MAPPER: black_rids dictionary is available, and being sent to peers')
             self.master_send_brids(black_rids)
+
+        # cached verdicts were made against the old ID lists
+        if (white_rids is not _white_rids) or (black_rids is not _black_rids):
+            invalidate_all_acl()
         
 # ---------------------------------------------------------------------------
 #   Class Declaration
@@ -1079,6 +1349,17 @@ class routerFNE(coreFNE):
 # ---------------------------------------------------------------------------
 
 class routeReportFactory(reportFactory):
+    # Routing rules are published per system, affiliations per peer and the
+    # RID whitelist per RID (and only when the whitelist is reloaded)
+    def __init__(self, config, logger):
+        reportFactory.__init__(self, config, logger)
+        self._state.register('RULES', lambda: RULES.keys(), lambda _system: RULES[_system])
+        self._state.register('GRP_AFF', lambda: GRP_AFF.keys(), lambda _peer_id: GRP_AFF[_peer_id])
+
+    def update_state(self):
+        reportFactory.update_state(self)
+        self._state.update_source('WHITELIST_RID', white_rids, lambda _rids: _rids.as_dict() if _rids else {})
+
     def send_timed(self):
         rulesSerialized = pickle.dumps(RULES, protocol=pickle.HIGHEST_PROTOCOL)
         self.send_clients(REPORT_OPCODES['RRULES_RSP'] + rulesSerialized)
@@ -1087,18 +1368,61 @@ class routeReportFactory(reportFactory):
         self.send_clients(REPORT_OPCODES['GRP_AFF_UPD'] + grpAffSerialized)
 
         if white_rids:
-            wridSerialized = pickle.dumps(white_rids, protocol=pickle.HIGHEST_PROTOCOL)
+            wridSerialized = pickle.dumps(white_rids.as_dict(), protocol=pickle.HIGHEST_PROTOCOL)
             self.send_clients(REPORT_OPCODES['WHITELIST_RID_UPD'] + wridSerialized)
-        
+
     def send_routeEvent(self, _data):
         self.send_clients(REPORT_OPCODES['CALL_EVENT'] + _data.encode())
 
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     This implements the supervisor side of a worker process in the
+#     multi-process mode; a worker that exits unexpectedly is restarted.
+# ---------------------------------------------------------------------------
+
+class workerProcess(ProcessProtocol):
+    def __init__(self, _shard, _args, _logger):
+        self._shard = _shard
+        self._args = _args
+        self._logger = _logger
+        self.stopping = False
+        self._ended = None
+
+    def start(self):
+        # a restart pending from an unexpected exit is dropped once stopped
+        if self.stopping:
+            return
+        reactor.spawnProcess(self, sys.executable, self._args, env = os.environ, childFDs = {0: 0, 1: 1, 2: 2})
+
+    # Stop the worker; _ended (if given) is called once it has exited
+    def stop(self, _ended = None):
+        self.stopping = True
+        self._ended = _ended
+        if self.transport != None and self.transport.pid != None:
+            self.transport.signalProcess('TERM')
+        elif _ended != None:
+            _ended()
+
+    def connectionMade(self):
+        self._logger.info('Worker %s started, PID %s', self._shard, self.transport.pid)
+
+    def processEnded(self, reason):
+        if self.stopping:
+            self._logger.info('Worker %s stopped', self._shard)
+            if self._ended != None:
+                self._ended()
+            return
+
+        # give it a few seconds, so a worker that can't start doesn't spin
+        self._logger.error('Worker %s exited unexpectedly (%s), restarting', self._shard, reason.value)
+        reactor.callLater(5, self.start)
+
 # ---------------------------------------------------------------------------
 #   Program Entry Point
 # ---------------------------------------------------------------------------
 
 if __name__ == '__main__':
-    from fne.fne_core import mk_id_dict
+    from fne.fne_core import mk_id_set
     from fne.fne_core import setup_fne
 
     # perform basic FNE setup
@@ -1106,11 +1430,11 @@ if __name__ == '__main__':
     logger.info('Digital Voice Modem FNE Router Service R02.50')
     
     # make dictionaries
-    white_rids = mk_id_dict(config['Aliases']['Path'], config['Aliases']['WhitelistRIDsFile'])
+    white_rids = mk_id_set(config['Aliases']['Path'], config['Aliases']['WhitelistRIDsFile'])
     if white_rids:
         logger.info('ID MAPPER: white_rids dictionary is available')
 
-    black_rids = mk_id_dict(config['Aliases']['Path'], config['Aliases']['WhitelistRIDsFile'])
+    black_rids = mk_id_set(config['Aliases']['Path'], config['Aliases']['BlacklistRIDsFile'])
     if black_rids:
         logger.info('ID MAPPER: black_rids dictionary is available')
 
@@ -1121,16 +1445,101 @@ if __name__ == '__main__':
         config['Systems'][system]['TG_ALLOW_AFF'] = []
     
     RULES = {}
+    RULE_INDEX = {}
     GRP_AFF = {}
 
     # build the routing rules file
     RULES = make_rules('fne_routing_rules')
 
+    # split the systems into shards for the multi-process mode; with a single
+    # shard everything runs in this process
+    enabled_systems = [system for system in config['Systems'] if config['Systems'][system]['Enabled']]
+    shards = mk_shards(RULES, enabled_systems, config['Global']['Workers'])
+    shard = config['Global']['Shard']
+    if shard == None and len(shards) > 1:
+        # this process is the supervisor, it only starts the workers
+        workers = []
+
+        def start_worker(_shard):
+            logger.info('Worker %s systems: %s', _shard, ', '.join(shards[_shard]))
+            _worker = workerProcess(_shard, [sys.executable, os.path.realpath(sys.argv[0]), '-c', config['Global']['ConfigFile'],
+                                             '-l', config['Log']['LogLevel'], '--shard', str(_shard)], logger)
+            if _shard < len(workers):
+                workers[_shard] = _worker
+            else:
+                workers.append(_worker)
+            _worker.start()
+
+        for shard in range(len(shards)):
+            start_worker(shard)
+
+        # Reload the routing rules and restart the workers whose systems changed;
+        # every affected worker is stopped before any is started again, so a
+        # system moving between workers has its port released first
+        def shard_update_loop():
+            global RULES, shards
+            RULES = make_rules('fne_routing_rules')
+            _shards = mk_shards(RULES, enabled_systems, config['Global']['Workers'])
+            if _shards == shards:
+                return
+
+            _affected = [_shard for _shard in range(max(len(shards), len(_shards)))
+                         if (_shard >= len(shards)) or (_shard >= len(_shards)) or (shards[_shard] != _shards[_shard])]
+            logger.warning('Routing rules changed the worker shards, restarting workers %s', ', '.join(str(_shard) for _shard in _affected))
+            shards = _shards
+
+            _stopping = [workers[_shard] for _shard in _affected if _shard < len(workers)]
+            _pending = [len(_stopping)]
+
+            def start_affected():
+                del workers[len(shards):]
+                for _shard in _affected:
+                    if _shard < len(shards):
+                        start_worker(_shard)
+
+            def worker_ended():
+                _pending[0] -= 1
+                if _pending[0] == 0:
+                    start_affected()
+
+            if not _stopping:
+                start_affected()
+            for _worker in _stopping:
+                _worker.stop(worker_ended)
+
+        shard_update = task.LoopingCall(shard_update_loop)
+        shard_update.start(SHARD_UPDATE_TIME, now = False)
+
+        def stop_workers():
+            shard_update.stop()
+            for worker in workers:
+                worker.stop()
+
+        reactor.addSystemEventTrigger('before', 'shutdown', stop_workers)
+        reactor.run()
+        sys.exit(0)
+
+    if shard != None:
+        if shard >= len(shards):
+            logger.error('Worker %s has no systems to run (only %s shards), exiting', shard, len(shards))
+            sys.exit(1)
+
+        logger.info('Worker %s running systems: %s', shard, ', '.join(shards[shard]))
+        SHARD_SYSTEMS = frozenset(shards[shard])
+
+        # every worker runs its own report server, on consecutive ports
+        config['Reports']['ReportPort'] += shard
+
+        # and captures to its own packet capture ring
+        config['Log']['CaptureFile'] += '.' + str(shard)
+    else:
+        shard = 0
+
     # setup FNE report server
     report_server = config_reports(config, logger, routeReportFactory)
     
     # FNE instance creation
-    for system in config['Systems']:
+    for system in shards[shard]:
         if config['Systems'][system]['Enabled']:
             systems[system] = routerFNE(system, config, logger, act_log_file, report_server)
             reactor.listenUDP(config['Systems'][system]['Port'], systems[system], interface = config['Systems'][system]['Address'])
@@ -39,6 +39,7 @@ from binascii import b2a_hex as ahex
 from binascii import a2b_hex as bhex
 from os.path import getmtime
 from collections import deque
+from copy import deepcopy
 
 from zope.interface import implementer
 
@@ -81,6 +82,9 @@ REPORT_OPCODES = {
     'GRP_AFF_UPD': b'\x08',
     'RCON_REQ': b'\x09',
     'WHITELIST_RID_UPD': b'\x10',
+    'HOOK_STATS': b'\x11',
+    'STATE_SNAPSHOT': b'\x12',
+    'STATE_DELTA': b'\x13',
 }
 
 WEBSOCK_OPCODES = {
@@ -93,6 +97,7 @@ WEBSOCK_OPCODES = {
     'DIAG_LOG': b'd',
     'MESSAGE': b'm',
     'WHITELIST_RID': b'w',
+    'HOOK_STATS': b's',
 }
 
 # Global Variables
@@ -109,6 +114,14 @@ GATABLE          = {}
 WLIST_RID        = {}
 WRIDTABLE        = {}
 
+HOOK_STATS       = {}
+HSTABLE          = {}
+
+# Published FNE state (section -> {key: item}) and the version held; None
+# until a snapshot has been received
+STATE            = {}
+STATE_VERSION    = None
+
 RULES_RX         = ''
 CONFIG_RX        = ''
 LOGBUF           = deque(100*[''], 100)
@@ -423,6 +436,46 @@ def build_whitelist_rid_table(_whitelist_rid):
   
     return _table
 
+# ---------------------------------------------------------------------------
+#   Hook Statistics Table Routines
+# ---------------------------------------------------------------------------
+
+# Percentiles shown for each hook (as published by the FNE)
+HOOK_PERCENTILES = ('P50', 'P90', 'P99', 'P99.9')
+
+def build_hook_stats_table(_hook_stats):
+    _table = {'SYSTEMS': {}, 'HOOKS': []}
+
+    for _system, _stats in _hook_stats.items():
+        _interval = _stats['INTERVAL'] if _stats['INTERVAL'] > 0 else 1
+        _table['SYSTEMS'][_system] = {
+            'UPTIME': int(_stats['UPTIME']),
+            'FRAMES_IN': _stats['FRAMES_IN'],
+            'BYTES_IN': _stats['BYTES_IN'],
+            'FRAMES_OUT': _stats['FRAMES_OUT'],
+            'BYTES_OUT': _stats['BYTES_OUT'],
+            'DROPS': _stats['DROPS'],
+            'SKIPS': _stats['SKIPS'],
+        }
+
+        for _hook, _hist in _stats['HOOKS'].items():
+            if _hist['COUNT'] == 0:
+                continue
+
+            _entry = {
+                'SYSTEM': _system,
+                'HOOK': _hook,
+                'COUNT': _hist['COUNT'],
+                'RATE': round(_hist['COUNT'] / _interval, 1),
+                'MEAN': round(_hist['MEAN'], 1),
+                'MAX': _hist['MAX'],
+            }
+            for _pct in HOOK_PERCENTILES:
+                _entry[_pct] = _hist.get(_pct, 0)
+            _table['HOOKS'].append(_entry)
+
+    return _table
+
 # ---------------------------------------------------------------------------
 #   Connections Table Routines
 # ---------------------------------------------------------------------------
@@ -549,10 +602,77 @@ def websock_update():
     if WLIST_RID:
         table = WEBSOCK_OPCODES['WHITELIST_RID'] + json.dumps(WRIDTABLE).encode()
         dashboard_server.broadcast(table)
+    if HOOK_STATS:
+        table = WEBSOCK_OPCODES['HOOK_STATS'] + json.dumps(HSTABLE).encode()
+        dashboard_server.broadcast(table)
+
+# Rebuild the globals (and tables) for the given sections of the published
+# FNE state
+def rebuild_state(_sections):
+    global CTABLE, CONFIG, RULES, RTABLE, GRP_AFF, GATABLE, WLIST_RID, WRIDTABLE, CONFIG_RX, RULES_RX
+    if 'SYSTEMS' in _sections or 'PEERS' in _sections:
+        CONFIG = {}
+        for _system, _system_config in STATE.get('SYSTEMS', {}).items():
+            CONFIG[_system] = dict(_system_config)
+            if _system_config['Mode'] == 'master':
+                CONFIG[_system]['PEERS'] = {}
+        for (_system, _peer_id), _peer in STATE.get('PEERS', {}).items():
+            if _system in CONFIG and 'PEERS' in CONFIG[_system]:
+                CONFIG[_system]['PEERS'][_peer_id] = _peer
+        CONFIG_RX = strftime('%Y-%m-%d %H:%M:%S', localtime(time()))
+        CTABLE = build_ctable(CONFIG)
+
+    if 'RULES' in _sections:
+        # build_rules_table() rewrites the rules it is given
+        RULES = deepcopy(STATE['RULES'])
+        RULES_RX = strftime('%Y-%m-%d %H:%M:%S', localtime(time()))
+        RTABLE['RULES'] = build_rules_table(RULES)
+
+    if 'GRP_AFF' in _sections:
+        GRP_AFF = STATE['GRP_AFF']
+        GATABLE = build_grp_aff_table(GRP_AFF)
+
+    if 'WHITELIST_RID' in _sections:
+        WLIST_RID = STATE['WHITELIST_RID']
+        WRIDTABLE = build_whitelist_rid_table(WLIST_RID)
+
+def process_state_snapshot(_message):
+    global STATE, STATE_VERSION
+    _snapshot = load_dictionary(_message)
+    STATE = {}
+    for _section, _items in _snapshot['SECTIONS'].items():
+        STATE[_section] = {_key: loads(_item) for _key, _item in _items.items()}
+    STATE_VERSION = _snapshot['VERSION']
+    rebuild_state(STATE.keys())
+
+def process_state_delta(_message):
+    global STATE_VERSION
+    _delta = load_dictionary(_message)
+    if STATE_VERSION == None:
+        # the snapshot sent on connect hasn't arrived yet
+        return
+    if _delta['BASE'] != STATE_VERSION:
+        logging.warning('State version gap (have %s, delta from %s); requesting snapshot', STATE_VERSION, _delta['BASE'])
+        STATE_VERSION = None
+        report_client.send_message(REPORT_OPCODES['CONFIG_REQ'])
+        return
+
+    # removals are applied first, an item may be removed and added again
+    # within one version
+    for _section, _keys in _delta['DEL'].items():
+        for _key in _keys:
+            STATE.setdefault(_section, {}).pop(_key, None)
+    for _section, _items in _delta['SET'].items():
+        _state = STATE.setdefault(_section, {})
+        for _key, _item in _items.items():
+            _state[_key] = loads(_item)
+
+    STATE_VERSION = _delta['VERSION']
+    rebuild_state(set(_delta['DEL']) | set(_delta['SET']))
 
 # Process in coming messages and take the correct action depending on the opcode
 def process_message(_message):
-    global CTABLE, CONFIG, RULES, RTABLE, GRP_AFF, GATABLE, WLIST_RID, WRIDTABLE, CONFIG_RX, RULES_RX, WEBSOCK_OPCODES
+    global CTABLE, CONFIG, RULES, RTABLE, GRP_AFF, GATABLE, WLIST_RID, WRIDTABLE, HOOK_STATS, HSTABLE, CONFIG_RX, RULES_RX, WEBSOCK_OPCODES
     opcode = _message[:1]
     _now = strftime('%Y-%m-%d %H:%M:%S %Z', localtime(time()))
     
@@ -620,6 +740,19 @@ def process_message(_message):
         WLIST_RID = load_dictionary(_message)
         WRIDTABLE = build_whitelist_rid_table(WLIST_RID)
 
+    elif opcode == REPORT_OPCODES['HOOK_STATS']:
+        logging.debug('got HOOK_STATS opcode')
+        HOOK_STATS = load_dictionary(_message)
+        HSTABLE = build_hook_stats_table(HOOK_STATS)
+
+    elif opcode == REPORT_OPCODES['STATE_SNAPSHOT']:
+        logging.debug('got STATE_SNAPSHOT opcode')
+        process_state_snapshot(_message)
+
+    elif opcode == REPORT_OPCODES['STATE_DELTA']:
+        logging.debug('got STATE_DELTA opcode')
+        process_state_delta(_message)
+
     else:
         logging.error('Report unrecognized opcode %s PACKET %s', opcode, ahex(_message))
         
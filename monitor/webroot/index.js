@@ -24,7 +24,8 @@ var WEBSOCK_OPCODES = {
     'LOG': 'l',
     'DIAG_LOG': 'd',
     'MESSAGE': 'm',
-    'WHITELIST_RID': 'w'
+    'WHITELIST_RID': 'w',
+    'HOOK_STATS': 's'
 };
 
 var NO_CONN_MSG = 'No connection to Fixed Network Equipment!';
@@ -35,6 +36,7 @@ var rules = {};
 var affiliations = {};
 var activity = {};
 var whitelist_rid = [];
+var hookStats = {};
 
 var trafficTrace = [];
 var trafficTraceMaxLines = 65535;
@@ -392,6 +394,9 @@ function handleWebsock() {
             else if (opcode === WEBSOCK_OPCODES['WHITELIST_RID']) {
                 whitelist_rid = JSON.parse(message);
             }
+            else if (opcode === WEBSOCK_OPCODES['HOOK_STATS']) {
+                hookStats = JSON.parse(message);
+            }
             else if (opcode === WEBSOCK_OPCODES['LOG']) {
                 trafficTrace.reverse();
                 if (trafficTrace.length >= trafficTraceMaxLines) {
@@ -423,6 +428,10 @@ function handleWebsock() {
                 onRefresh();
             }
 
+            if (getInfo() === 'performance' && opcode === WEBSOCK_OPCODES['HOOK_STATS']) {
+                onRefresh();
+            }
+
             if (getInfo() === 'diag-trace' && opcode === WEBSOCK_OPCODES['DIAG_LOG']) {
                 onRefresh(JSON.parse(message));
             }
@@ -0,0 +1,108 @@
+/**
+ * Digital Voice Modem - Fixed Network Equipment
+ * GPLv2 Open Source. Use is subject to license terms.
+ * DO NOT ALTER OR REMOVE COPYRIGHT NOTICES OR THIS FILE HEADER.
+ *
+ * @package DVM / FNE
+ */
+
+/*
+** Page View Routines
+*/
+
+/**
+ * 
+ * @returns {any} string
+ */
+function getInfo() {
+    return "performance";
+}
+
+/**
+ * 
+ */
+function onLoad() {
+    $.get("performance.html", function(data) {
+        $('#content-section').html(data);
+
+        showTableLoading('#perf-systems');
+        showTableLoading('#perf-hooks');
+        onRefresh();
+    });
+}
+
+/**
+ * 
+ */
+function onUnload() {
+    /* stub */
+}
+
+/**
+ * 
+ */
+function onRefresh() {
+    // parse data
+    if (!$.isEmptyObject(hookStats)) {
+        var systemsData = [];
+        var hooksData = [];
+
+        // iterate over systems
+        $.each(hookStats.SYSTEMS, function (key, value) {
+            systemsData.push({
+                'system': key,
+                'uptime': value.UPTIME,
+                'framesIn': value.FRAMES_IN,
+                'bytesIn': value.BYTES_IN,
+                'framesOut': value.FRAMES_OUT,
+                'bytesOut': value.BYTES_OUT,
+                'dropACL': value.DROPS.ACL,
+                'dropIgnored': value.DROPS.IGNORED,
+                'dropCollision': value.DROPS.COLLISION,
+                'skipCollision': value.SKIPS.COLLISION,
+                'skipHangtime': value.SKIPS.HANGTIME
+            });
+        });
+
+        // iterate over hooks
+        for (var i = 0; i < hookStats.HOOKS.length; i++) {
+            var data = hookStats.HOOKS[i];
+            hooksData.push({
+                'system': data.SYSTEM,
+                'hook': data.HOOK,
+                'count': data.COUNT,
+                'rate': data.RATE,
+                'mean': data.MEAN,
+                'p50': data.P50,
+                'p90': data.P90,
+                'p99': data.P99,
+                'p999': data['P99.9'],
+                'max': data.MAX
+            });
+        }
+
+        // populate bootstrap tables
+        $('#perf-systems').bootstrapTable("destroy");
+        $('#perf-systems').bootstrapTable({
+            data: systemsData
+        });
+
+        $('#perf-hooks').bootstrapTable("destroy");
+        $('#perf-hooks').bootstrapTable({
+            data: hooksData
+        });
+    } else {
+        // populate bootstrap tables
+        $('#perf-systems').bootstrapTable("destroy");
+        $('#perf-systems').bootstrapTable({
+            data: []
+        });
+        $('#perf-systems').bootstrapTable("showLoading");
+
+        $('#perf-hooks').bootstrapTable("destroy");
+        $('#perf-hooks').bootstrapTable({
+            data: []
+        });
+        $('#perf-hooks').bootstrapTable("showLoading");
+    }
+}
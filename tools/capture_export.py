@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+#
+# Digital Voice Modem - Fixed Network Equipment
+# GPLv2 Open Source. Use is subject to license terms.
+# DO NOT ALTER OR REMOVE COPYRIGHT NOTICES OR THIS FILE HEADER.
+#
+# @package DVM / FNE
+#
+###############################################################################
+#   Copyright (C) 2017-2021 Bryan Biedenkapp <gatekeep@gmail.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+from __future__ import print_function
+
+import os
+import sys
+import socket
+import struct
+import argparse
+
+from binascii import b2a_hex as ahex
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fne.fne_capture import read_capture, CAPTURE_RX
+
+# pcap global header; magic, version 2.4, GMT offset, accuracy, snap length
+# and link type (LINKTYPE_RAW, a bare IPv4 header)
+PCAP_HEADER = struct.Struct('<IHHiIII')
+PCAP_RECORD = struct.Struct('<IIII')
+PCAP_LINKTYPE_RAW = 101
+
+IP_HEADER = struct.Struct('>BBHHHBBH4s4s')
+UDP_HEADER = struct.Struct('>HHHH')
+
+# Address used for the FNE side of captured datagrams (the capture only
+# records the local port)
+LOCAL_ADDRESS = '127.0.0.1'
+
+# ---------------------------------------------------------------------------
+#   Module Routines
+# ---------------------------------------------------------------------------
+
+def inet_aton(_host):
+    try:
+        return socket.inet_aton(_host)
+    except (OSError, TypeError):
+        return b'\x00\x00\x00\x00'
+
+def ip_checksum(_header):
+    _sum = sum(struct.unpack('>10H', _header))
+    _sum = (_sum >> 16) + (_sum & 0xFFFF)
+    _sum += _sum >> 16
+    return ~_sum & 0xFFFF
+
+# Wraps a captured datagram in IPv4 and UDP headers (UDP checksum left unset)
+def mk_ip_packet(_dir, _addr, _lport, _data):
+    _local = inet_aton(LOCAL_ADDRESS)
+    _remote = inet_aton(_addr[0])
+    if _dir == CAPTURE_RX:
+        _src, _sport, _dst, _dport = _remote, _addr[1], _local, _lport
+    else:
+        _src, _sport, _dst, _dport = _local, _lport, _remote, _addr[1]
+
+    _udp = UDP_HEADER.pack(_sport, _dport, UDP_HEADER.size + len(_data), 0)
+    _total = IP_HEADER.size + len(_udp) + len(_data)
+    _ip = IP_HEADER.pack(0x45, 0, _total, 0, 0, 64, socket.IPPROTO_UDP, 0, _src, _dst)
+    _ip = IP_HEADER.pack(0x45, 0, _total, 0, 0, 64, socket.IPPROTO_UDP, ip_checksum(_ip), _src, _dst)
+    return _ip + _udp + _data
+
+def export_pcap(_records, _out):
+    _out.write(PCAP_HEADER.pack(0xA1B2C3D4, 2, 4, 0, 0, 65535, PCAP_LINKTYPE_RAW))
+    _count = 0
+    for _ts, _dir, _system, _addr, _lport, _data in _records:
+        _packet = mk_ip_packet(_dir, _addr, _lport, _data)
+        _out.write(PCAP_RECORD.pack(int(_ts), int((_ts % 1) * 1000000), len(_packet), len(_packet)))
+        _out.write(_packet)
+        _count += 1
+    return _count
+
+def export_text(_records, _out):
+    _count = 0
+    for _ts, _dir, _system, _addr, _lport, _data in _records:
+        _time = datetime.fromtimestamp(_ts).strftime('%Y-%m-%d %H:%M:%S.%f')
+        if _dir == CAPTURE_RX:
+            _line = '{} ({}) Network Received (from {}:{}) -- {}\n'.format(_time, _system, _addr[0], _addr[1], ahex(_data).decode())
+        else:
+            _line = '{} ({}) Network Transmitted (to {}:{}) -- {}\n'.format(_time, _system, _addr[0], _addr[1], ahex(_data).decode())
+        _out.write(_line.encode())
+        _count += 1
+    return _count
+
+# ---------------------------------------------------------------------------
+#   Program Entry Point
+# ---------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Export an FNE packet capture ring to pcap or text')
+    parser.add_argument('capture', help = 'Capture ring file (Log CaptureFile).')
+    parser.add_argument('-f', '--format', action = 'store', dest = 'Format', choices = ['pcap', 'text'], default = 'text', help = 'Output format.')
+    parser.add_argument('-o', '--output', action = 'store', dest = 'Output', default = None, help = 'Output file (standard output if not given).')
+    parser.add_argument('-s', '--system', action = 'store', dest = 'System', default = None, help = 'Only export datagrams for this system.')
+    cli_args = parser.parse_args()
+
+    try:
+        _records = read_capture(cli_args.capture)
+        if cli_args.System != None:
+            _records = (_record for _record in _records if _record[2] == cli_args.System)
+
+        _out = open(cli_args.Output, 'wb') if cli_args.Output else sys.stdout.buffer
+        try:
+            if cli_args.Format == 'pcap':
+                _count = export_pcap(_records, _out)
+            else:
+                _count = export_text(_records, _out)
+        finally:
+            if cli_args.Output:
+                _out.close()
+    except (IOError, ValueError) as e:
+        sys.exit('Cannot export capture: {}'.format(e))
+
+    print('Exported {} datagrams'.format(_count), file = sys.stderr)
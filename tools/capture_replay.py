@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+#
+# Digital Voice Modem - Fixed Network Equipment
+# GPLv2 Open Source. Use is subject to license terms.
+# DO NOT ALTER OR REMOVE COPYRIGHT NOTICES OR THIS FILE HEADER.
+#
+# @package DVM / FNE
+#
+###############################################################################
+#   Copyright (C) 2017-2021 Bryan Biedenkapp <gatekeep@gmail.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+from __future__ import print_function
+
+import os
+import sys
+import argparse
+import logging
+
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from twisted.internet import reactor
+
+from fne import fne_config, fne_const, fne_core
+from fne.fne_capture import read_capture, CAPTURE_RX, CAPTURE_TX
+
+# Number of datagrams replayed per reactor iteration when running at maximum
+# speed (so timers still get a chance to run)
+REPLAY_BATCH = 500
+
+# Latency percentiles reported
+REPLAY_PERCENTILES = (50, 90, 99, 99.9)
+
+# ---------------------------------------------------------------------------
+#   Module Routines
+# ---------------------------------------------------------------------------
+
+# Returns the datagrams received by the given systems in a capture file, as
+# (timestamp, system, (host, port), data, salt) tuples. The salt is the login
+# challenge the master answered an RPTL with, so the captured RPTK can be
+# accepted again on replay
+def load_replay(_path, _systems):
+    _records = []
+    _logins = {}
+    for _ts, _dir, _system, _addr, _lport, _data in read_capture(_path):
+        if _system not in _systems:
+            continue
+
+        if _dir == CAPTURE_RX:
+            _records.append([_ts, _system, _addr, _data, None])
+            if _data.startswith(fne_const.TAG_REPEATER_LOGIN):
+                _logins[(_system, _addr)] = _records[-1]
+
+        elif _dir == CAPTURE_TX and _data.startswith(fne_const.TAG_REPEATER_ACK):
+            _login = _logins.pop((_system, _addr), None)
+            if _login != None:
+                _login[4] = int.from_bytes(_data[6:10], 'big')
+
+    return [tuple(_record) for _record in _records]
+
+def percentile(_sorted, _pct):
+    if not _sorted:
+        return 0
+    return _sorted[min(len(_sorted) - 1, int(len(_sorted) * _pct / 100))]
+
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     Stands in for a system's UDP transport; datagrams are counted (per
+#     opcode) instead of being sent.
+# ---------------------------------------------------------------------------
+
+class replayTransport(object):
+    def __init__(self):
+        self.packets = 0
+        self.bytes = 0
+        self.opcodes = {}
+
+    def write(self, _data, _addr):
+        self.packets += 1
+        self.bytes += len(_data)
+        _opcode = _data[:4]
+        self.opcodes[_opcode] = self.opcodes.get(_opcode, 0) + 1
+
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     Clock handed to the FNE modules in place of time(); it follows the
+#     capture timestamps, so hang times and timeouts behave the same at any
+#     replay speed.
+# ---------------------------------------------------------------------------
+
+class replayClock(object):
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     Feeds captured datagrams to the systems from the reactor, at the
+#     captured pace scaled by the replay speed (or as fast as possible with
+#     a speed of 0), timing how long each datagram takes to process.
+# ---------------------------------------------------------------------------
+
+class replayDriver(object):
+    def __init__(self, _systems, _records, _speed, _clock, _logger):
+        self._systems = _systems
+        self._records = _records
+        self._speed = _speed
+        self._clock = _clock
+        self._logger = _logger
+
+        self._idx = 0
+        self._start = 0
+        self.elapsed = 0
+        self.latency = []
+        self.received = {}
+
+    def start(self):
+        self._start = perf_counter()
+        reactor.callLater(0, self.run)
+
+    def run(self):
+        _count = 0
+        _base = self._records[0][0] if self._records else 0
+        while self._idx < len(self._records):
+            _ts, _system, _addr, _data, _salt = self._records[self._idx]
+            if self._speed > 0:
+                _due = (_ts - _base) / self._speed - (perf_counter() - self._start)
+                if _due > 0:
+                    reactor.callLater(_due, self.run)
+                    return
+            elif _count >= REPLAY_BATCH:
+                reactor.callLater(0, self.run)
+                return
+
+            self.replay(_ts, _system, _addr, _data, _salt)
+            self._idx += 1
+            _count += 1
+
+        self.elapsed = perf_counter() - self._start
+        reactor.stop()
+
+    def replay(self, _ts, _system, _addr, _data, _salt):
+        self._clock.now = _ts
+        _fne = self._systems[_system]
+
+        _start = perf_counter()
+        try:
+            _fne.datagramReceived(_data, _addr)
+        except Exception:
+            self._logger.exception('(%s) Failed to replay datagram %s', _system, _data[:8])
+        self.latency.append(perf_counter() - _start)
+
+        _opcode = _data[:4]
+        self.received[_opcode] = self.received.get(_opcode, 0) + 1
+
+        # restore the captured login challenge, so the captured RPTK is valid
+        if _salt != None:
+            _peer_id = int.from_bytes(_data[4:8], 'big')
+            if _fne._config['Mode'] == 'master' and _peer_id in _fne._peers:
+                _fne._peers[_peer_id]['SALT'] = _salt
+
+    def report(self):
+        _total = len(self.latency)
+        _busy = sum(self.latency)
+        _sorted = sorted(self.latency)
+
+        print('Replayed {} datagrams in {:.3f}s; {:.0f} frames/s ({:.0f} frames/s processing only)'.format(_total, self.elapsed,
+              _total / self.elapsed if self.elapsed else 0, _total / _busy if _busy else 0))
+        print('Latency (us): ' + ', '.join('p{} {:.1f}'.format(_pct, percentile(_sorted, _pct) * 1e6) for _pct in REPLAY_PERCENTILES) +
+              ', max {:.1f}'.format(_sorted[-1] * 1e6 if _sorted else 0))
+        print('Received: ' + ', '.join('{} {}'.format(_opcode.decode(errors = 'replace'), _count) for _opcode, _count in sorted(self.received.items())))
+        print()
+        print('{:<20} {:<7} {:>10} {:>12}  {}'.format('System', 'Mode', 'TX', 'TX bytes', 'TX by opcode'))
+        for _system in sorted(self._systems):
+            _transport = self._systems[_system].transport
+            print('{:<20} {:<7} {:>10} {:>12}  {}'.format(_system, self._systems[_system]._config['Mode'], _transport.packets, _transport.bytes,
+                  ', '.join('{} {}'.format(_opcode.decode(errors = 'replace'), _count) for _opcode, _count in sorted(_transport.opcodes.items()))))
+
+# ---------------------------------------------------------------------------
+#   Program Entry Point
+# ---------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Replay an FNE packet capture through the router, through a fake transport')
+    parser.add_argument('capture', help = 'Capture ring file (Log CaptureFile) to replay.')
+    parser.add_argument('-c', '--config', action = 'store', dest = 'ConfigFile', required = True, help = 'fne_router configuration file.')
+    parser.add_argument('-r', '--rules', action = 'store', dest = 'Rules', default = 'fne_routing_rules', help = 'Routing rules module.')
+    parser.add_argument('-s', '--speed', action = 'store', dest = 'Speed', type = float, default = 0, help = 'Replay speed (1 = as captured, 0 = as fast as possible).')
+    parser.add_argument('-l', '--logging', action = 'store', dest = 'LogLevel', default = 'WARNING', help = 'Logging level.')
+    cli_args = parser.parse_args()
+
+    logging.basicConfig(level = cli_args.LogLevel, format = '%(levelname)s %(message)s')
+    logger = logging.getLogger('replay')
+
+    # the router reads these as module globals (as set up by its __main__)
+    import fne_router
+
+    config = fne_config.build_config(cli_args.ConfigFile)
+    config['Global']['ConfigFile'] = os.path.abspath(cli_args.ConfigFile)
+    config['Global']['Shard'] = None
+    config['Global']['BatchSend'] = False
+    # the jitter buffer releases frames from its own wall-clock timer, which
+    # the replay clock doesn't drive
+    config['Global']['JitterBuffer'] = False
+    config['Log']['RawPacketTrace'] = False
+    config['Reports']['Report'] = False
+    for system in config['Systems']:
+        config['Systems'][system]['ACTIVE_TG_IDS'] = {}
+        config['Systems'][system]['DEACTIVE_TG_IDS'] = {}
+        config['Systems'][system]['TG_IGNORE_IDS'] = {}
+        config['Systems'][system]['TG_ALLOW_AFF'] = []
+
+    fne_router.config = config
+    fne_router.logger = logger
+    fne_router.white_rids = fne_core.mk_id_set(config['Aliases']['Path'], config['Aliases']['WhitelistRIDsFile'])
+    fne_router.black_rids = fne_core.mk_id_set(config['Aliases']['Path'], config['Aliases']['BlacklistRIDsFile'])
+    fne_router.RULES = {}
+    fne_router.RULE_INDEX = {}
+    fne_router.GRP_AFF = {}
+    fne_router.RULES = fne_router.make_rules(cli_args.Rules)
+
+    clock = replayClock()
+    fne_core.time = clock
+    fne_router.time = clock
+
+    for system in config['Systems']:
+        if config['Systems'][system]['Enabled']:
+            fne_core.systems[system] = fne_router.routerFNE(system, config, logger, None, None)
+            fne_core.systems[system].transport = replayTransport()
+
+    try:
+        records = load_replay(cli_args.capture, fne_core.systems)
+    except (IOError, ValueError) as e:
+        sys.exit('Cannot load capture: {}'.format(e))
+    if not records:
+        sys.exit('Capture has no datagrams received by the configured systems')
+
+    clock.now = records[0][0]
+    driver = replayDriver(fne_core.systems, records, cli_args.Speed, clock, logger)
+    driver.start()
+    reactor.run()
+
+    driver.report()
@@ -0,0 +1,499 @@
+#!/usr/bin/env python
+#
+# Digital Voice Modem - Fixed Network Equipment
+# GPLv2 Open Source. Use is subject to license terms.
+# DO NOT ALTER OR REMOVE COPYRIGHT NOTICES OR THIS FILE HEADER.
+#
+# @package DVM / FNE
+#
+###############################################################################
+#   Copyright (C) 2016  Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#   Copyright (C) 2017-2021 Bryan Biedenkapp <gatekeep@gmail.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import random
+import argparse
+import platform
+import timeit
+
+from bitarray import bitarray
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dmr_utils import bptc, golay, hamming, crc, rs129, qr, lc, const
+
+# ambe_utils needs the old bitstring BitString class (bitstring < 4)
+try:
+    from dmr_utils import ambe_utils
+except ImportError:
+    ambe_utils = None
+
+# Golden vectors, kept with this tool
+GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dmr_golden.json')
+
+# ---------------------------------------------------------------------------
+#   Reference Routines
+#     These are the original bitarray based BPTC(196,96) and embedded LC
+#     routines, kept to prove the table driven routines are bit-exact.
+# ---------------------------------------------------------------------------
+
+REF_INDEX_181 = (
+    0, 181, 166, 151, 136, 121, 106, 91, 76, 61, 46, 31, 16, 1, 182, 167, 152, 137,
+    122, 107, 92, 77, 62, 47, 32, 17, 2, 183, 168, 153, 138, 123, 108, 93, 78, 63,
+    48, 33, 18, 3, 184, 169, 154, 139, 124, 109, 94, 79, 64, 49, 34, 19, 4, 185, 170,
+    155, 140, 125, 110, 95, 80, 65, 50, 35, 20, 5, 186, 171, 156, 141, 126, 111, 96,
+    81, 66, 51, 36, 21, 6, 187, 172, 157, 142, 127, 112, 97, 82, 67, 52, 37, 22, 7,
+    188, 173, 158, 143, 128, 113, 98, 83, 68, 53, 38, 23, 8, 189, 174, 159, 144, 129,
+    114, 99, 84, 69, 54, 39, 24, 9, 190, 175, 160, 145, 130, 115, 100, 85, 70, 55, 40,
+    25, 10, 191, 176, 161, 146, 131, 116, 101, 86, 71, 56, 41, 26, 11, 192, 177, 162,
+    147, 132, 117, 102, 87, 72, 57, 42, 27, 12, 193, 178, 163, 148, 133, 118, 103, 88,
+    73, 58, 43, 28, 13, 194, 179, 164, 149, 134, 119, 104, 89, 74, 59, 44, 29, 14,
+    195, 180, 165, 150, 135, 120, 105, 90, 75, 60, 45, 30, 15
+)
+
+def ref_decode_full_lc(_data):
+    binlc = bitarray(endian='big')
+
+    binlc.extend([_data[136],_data[121],_data[106],_data[91], _data[76], _data[61], _data[46], _data[31]])
+    binlc.extend([_data[152],_data[137],_data[122],_data[107],_data[92], _data[77], _data[62], _data[47], _data[32], _data[17], _data[2]  ])
+    binlc.extend([_data[123],_data[108],_data[93], _data[78], _data[63], _data[48], _data[33], _data[18], _data[3],  _data[184],_data[169]])
+    binlc.extend([_data[94], _data[79], _data[64], _data[49], _data[34], _data[19], _data[4],  _data[185],_data[170],_data[155],_data[140]])
+    binlc.extend([_data[65], _data[50], _data[35], _data[20], _data[5],  _data[186],_data[171],_data[156],_data[141],_data[126],_data[111]])
+    binlc.extend([_data[36], _data[21], _data[6],  _data[187],_data[172],_data[157],_data[142],_data[127],_data[112],_data[97], _data[82] ])
+    binlc.extend([_data[7],  _data[188],_data[173],_data[158],_data[143],_data[128],_data[113],_data[98], _data[83]])
+    binlc.extend([_data[68],_data[53],_data[174],_data[159],_data[144],_data[129],_data[114],_data[99],_data[84],_data[69],_data[54],_data[39]])
+    binlc.extend([_data[24],_data[145],_data[130],_data[115],_data[100],_data[85],_data[70],_data[55],_data[40],_data[25],_data[10],_data[191]])
+
+    return binlc
+
+def ref_interleave_19696(_data):
+    inter = bitarray(196, endian='big')
+    for index in range(196):
+        inter[REF_INDEX_181[index]] = _data[index]  # the real math is slower: deint[index] = _data[(index * 181) % 196]
+    return inter
+
+# Accepts 12 byte LC header + RS1293, converts to binary and pads for 196 bit
+# encode hamming 15113 to rows and 1393 to columns
+def ref_encode_19696(_data):
+    # Create a bitarray from the 4 bytes of LC data (includes RS1293 ECC)
+    _bdata = bitarray(endian='big')
+    _bdata.frombytes(_data)
+    
+    # Insert R0-R3 bits
+    for i in range(4):
+        _bdata.insert(0, 0)
+    
+    # Get row hamming 15,11,3 and append. +1 is to account for R3 that makes an even 196bit string
+    for index in range(9):
+        spos = (index*15) + 1
+        epos= spos + 11
+        _rowp = hamming.enc_15113(_bdata[spos:epos])
+        for pbit in range(4):
+            _bdata.insert(epos+pbit,_rowp[pbit])
+    
+    # Get column hamming 13,9,3 and append. +1 is to account for R3 that makes an even 196bit string
+    # Pad out the bitarray to a full 196 bits. Can't insert into 'columns'
+    for i in range(60):
+        _bdata.append(0)
+    
+    column = bitarray(9, endian='big')  # Temporary bitarray to hold column data
+    for col in range(15):
+        spos = col + 1
+        for index in range(9):
+            column[index] = _bdata[spos]
+            spos += 15
+        _colp = hamming.enc_1393(column)
+        
+        # Insert bits into matrix...
+        cpar = 136 + col                # Starting location in the matrix for column bits
+        for pbit in range(4):
+            _bdata[cpar] =  _colp[pbit]
+            cpar += 15
+
+    return _bdata
+
+def ref_encode_header_lc(_lc):
+    full_lc = _lc + rs129.lc_header_encode(_lc)
+    full_lc = ref_encode_19696(full_lc)
+    full_lc = ref_interleave_19696(full_lc)
+    return full_lc
+
+def ref_encode_header_pi(_lc):
+    full_lc = _lc
+    full_lc = ref_encode_19696(full_lc)
+    full_lc = ref_interleave_19696(full_lc)
+    return full_lc
+    
+def ref_encode_terminator_lc(_lc):
+    full_lc = _lc + rs129.lc_terminator_encode(_lc)
+    full_lc = ref_encode_19696(full_lc)
+    full_lc = ref_interleave_19696(full_lc)
+    return full_lc
+
+def ref_decode_emblc(_elc):
+    _binlc = bitarray(endian='big')
+
+    _binlc.extend([_elc[0],_elc[8], _elc[16],_elc[24],_elc[32],_elc[40],_elc[48],_elc[56],_elc[64],_elc[72] ,_elc[80]])
+    _binlc.extend([_elc[1],_elc[9], _elc[17],_elc[25],_elc[33],_elc[41],_elc[49],_elc[57],_elc[65],_elc[73] ,_elc[81]])
+    _binlc.extend([_elc[2],_elc[10],_elc[18],_elc[26],_elc[34],_elc[42],_elc[50],_elc[58],_elc[66],_elc[74]])
+    _binlc.extend([_elc[3],_elc[11],_elc[19],_elc[27],_elc[35],_elc[43],_elc[51],_elc[59],_elc[67],_elc[75]])
+    _binlc.extend([_elc[4],_elc[12],_elc[20],_elc[28],_elc[36],_elc[44],_elc[52],_elc[60],_elc[68],_elc[76]])
+    _binlc.extend([_elc[5],_elc[13],_elc[21],_elc[29],_elc[37],_elc[45],_elc[53],_elc[61],_elc[69],_elc[77]])
+    _binlc.extend([_elc[6],_elc[14],_elc[22],_elc[30],_elc[38],_elc[46],_elc[54],_elc[62],_elc[70],_elc[78]])
+    
+    return(_binlc.tobytes())
+
+# Accepts 12 byte LC header + 5-bit checksum, converts to binary and builts out the BPTC
+# encoded result with hamming(16,11,4) and parity.
+def ref_encode_emblc(_lc):
+    # Get the 5-bit checksum for the Embedded LC
+    _csum = crc.csum5(_lc)
+    
+    # Create a bitarray from the 4 bytes of LC data (includes 5-bit checksum).
+    _binlc = bitarray(endian='big')
+    _binlc.frombytes(_lc)
+    
+    # Insert the checksum bits at the right location in the matrix (this is actually faster than with a for loop)
+    _binlc.insert(32,_csum[0])
+    _binlc.insert(43,_csum[1])
+    _binlc.insert(54,_csum[2])
+    _binlc.insert(65,_csum[3])
+    _binlc.insert(76,_csum[4])
+
+    # Insert the hamming bits at the right location in the matrix
+    for index in range(0,112,16):
+        for hindex,hbit in zip(range(index+11,index+16), hamming.enc_16114(_binlc[index:index+11])):
+            _binlc.insert(hindex,hbit)
+    
+    # Insert the column parity bits at the right location in the matrix
+    for index in range(0,16):
+        _binlc.insert(index+112, _binlc[index+0] ^ _binlc[index+16] ^ _binlc[index+32] ^ _binlc[index+48] ^ _binlc[index+64] ^ _binlc[index+80] ^ _binlc[index+96])
+    
+    # Create Embedded LC segments in 48 bit blocks
+    emblc_b = bitarray(endian='big')
+    emblc_b.extend([_binlc[0], _binlc[16],_binlc[32],_binlc[48],_binlc[64],_binlc[80],_binlc[96], _binlc[112]])
+    emblc_b.extend([_binlc[1], _binlc[17],_binlc[33],_binlc[49],_binlc[65],_binlc[81],_binlc[97], _binlc[113]])
+    emblc_b.extend([_binlc[2], _binlc[18],_binlc[34],_binlc[50],_binlc[66],_binlc[82],_binlc[98], _binlc[114]])
+    emblc_b.extend([_binlc[3], _binlc[19],_binlc[35],_binlc[51],_binlc[67],_binlc[83],_binlc[99], _binlc[115]])
+    
+    emblc_c = bitarray(endian='big')
+    emblc_c.extend([_binlc[4], _binlc[20],_binlc[36],_binlc[52],_binlc[68],_binlc[84],_binlc[100],_binlc[116]])
+    emblc_c.extend([_binlc[5], _binlc[21],_binlc[37],_binlc[53],_binlc[69],_binlc[85],_binlc[101],_binlc[117]])
+    emblc_c.extend([_binlc[6], _binlc[22],_binlc[38],_binlc[54],_binlc[70],_binlc[86],_binlc[102],_binlc[118]])
+    emblc_c.extend([_binlc[7], _binlc[23],_binlc[39],_binlc[55],_binlc[71],_binlc[87],_binlc[103],_binlc[119]])
+    
+    emblc_d = bitarray(endian='big')
+    emblc_d.extend([_binlc[8], _binlc[24],_binlc[40],_binlc[56],_binlc[72],_binlc[88],_binlc[104],_binlc[120]])
+    emblc_d.extend([_binlc[9], _binlc[24],_binlc[41],_binlc[57],_binlc[73],_binlc[89],_binlc[105],_binlc[121]])
+    emblc_d.extend([_binlc[10],_binlc[26],_binlc[42],_binlc[58],_binlc[74],_binlc[90],_binlc[106],_binlc[122]])
+    emblc_d.extend([_binlc[11],_binlc[27],_binlc[43],_binlc[59],_binlc[75],_binlc[91],_binlc[107],_binlc[123]])
+    
+    emblc_e = bitarray(endian='big')
+    emblc_e.extend([_binlc[12],_binlc[28],_binlc[44],_binlc[60],_binlc[76],_binlc[92],_binlc[108],_binlc[124]])
+    emblc_e.extend([_binlc[13],_binlc[29],_binlc[45],_binlc[61],_binlc[77],_binlc[93],_binlc[109],_binlc[125]])
+    emblc_e.extend([_binlc[14],_binlc[30],_binlc[46],_binlc[62],_binlc[78],_binlc[94],_binlc[110],_binlc[126]])
+    emblc_e.extend([_binlc[15],_binlc[31],_binlc[47],_binlc[63],_binlc[79],_binlc[95],_binlc[111],_binlc[127]])
+    
+    return({1: emblc_b, 2: emblc_c, 3: emblc_d, 4: emblc_e})
+
+# ---------------------------------------------------------------------------
+#   Vector Routines
+#     Inputs and results are stored in the golden vector file (and compared)
+#     in a JSON form that keeps their type.
+# ---------------------------------------------------------------------------
+
+def random_bytes(_rand, _len):
+    return bytes(_rand.getrandbits(8) for _ in range(_len))
+
+def random_bits(_rand, _len):
+    return bptc.int_to_bits(_rand.getrandbits(_len), _len)
+
+def to_json(_value):
+    if isinstance(_value, bitarray):
+        return {'bits': _value.to01()}
+    if isinstance(_value, bytearray):
+        return {'bytearray': _value.hex()}
+    if isinstance(_value, bytes):
+        return {'bytes': _value.hex()}
+    if isinstance(_value, dict):
+        return {'dict': [[_key, to_json(_item)] for _key, _item in sorted(_value.items())]}
+    if isinstance(_value, (list, tuple)):
+        return [to_json(_item) for _item in _value]
+    return _value
+
+def from_json(_value):
+    if isinstance(_value, dict):
+        if 'bits' in _value:
+            return bitarray(_value['bits'], endian='big')
+        if 'bytearray' in _value:
+            return bytearray.fromhex(_value['bytearray'])
+        if 'bytes' in _value:
+            return bytes.fromhex(_value['bytes'])
+        if 'dict' in _value:
+            return dict((_key, from_json(_item)) for _key, _item in _value['dict'])
+    if isinstance(_value, list):
+        return [from_json(_item) for _item in _value]
+    return _value
+
+# ---------------------------------------------------------------------------
+#   Routine Table
+#     (name, routine, input generator); the generator returns the positional
+#     arguments for the routine.
+# ---------------------------------------------------------------------------
+
+ROUTINES = [
+    ('bptc.encode_19696',               bptc.encode_19696,                  lambda _r: (random_bytes(_r, 12),)),
+    ('bptc.encode_19696_int',           bptc.encode_19696_int,              lambda _r: (random_bytes(_r, 12),)),
+    ('bptc.interleave_19696',           bptc.interleave_19696,              lambda _r: (random_bits(_r, 196),)),
+    ('bptc.interleave_19696_int',       bptc.interleave_19696_int,          lambda _r: (_r.getrandbits(196),)),
+    ('bptc.decode_full_lc',             bptc.decode_full_lc,                lambda _r: (random_bits(_r, 196),)),
+    ('bptc.decode_full_lc_int',         bptc.decode_full_lc_int,            lambda _r: (random_bytes(_r, 25),)),
+    ('bptc.encode_header_lc',           bptc.encode_header_lc,              lambda _r: (random_bytes(_r, 9),)),
+    ('bptc.encode_header_lc_int',       bptc.encode_header_lc_int,          lambda _r: (random_bytes(_r, 9),)),
+    ('bptc.encode_header_pi',           bptc.encode_header_pi,              lambda _r: (random_bytes(_r, 12),)),
+    ('bptc.encode_terminator_lc',       bptc.encode_terminator_lc,          lambda _r: (random_bytes(_r, 9),)),
+    ('bptc.encode_emblc',               bptc.encode_emblc,                  lambda _r: (random_bytes(_r, 9),)),
+    ('bptc.encode_emblc_int',           bptc.encode_emblc_int,              lambda _r: (random_bytes(_r, 9),)),
+    ('bptc.decode_emblc',               bptc.decode_emblc,                  lambda _r: (random_bits(_r, 128),)),
+    ('bptc.decode_emblc_int',           bptc.decode_emblc_int,              lambda _r: (random_bytes(_r, 16),)),
+    ('golay.encode_2087',               golay.encode_2087,                  lambda _r: (random_bytes(_r, 1),)),
+    ('golay.decode_2087',               golay.decode_2087,                  lambda _r: (random_bytes(_r, 3),)),
+    ('golay.get_synd_1987',             golay.get_synd_1987,                lambda _r: (_r.getrandbits(19),)),
+    ('golay.get_synd_23127',            golay.get_synd_23127,               lambda _r: (_r.getrandbits(23),)),
+    ('hamming.enc_15113',               hamming.enc_15113,                  lambda _r: (random_bits(_r, 11),)),
+    ('hamming.enc_1393',                hamming.enc_1393,                   lambda _r: (random_bits(_r, 9),)),
+    ('hamming.enc_16114',               hamming.enc_16114,                  lambda _r: (random_bits(_r, 11),)),
+    ('rs129.encode',                    rs129.encode,                       lambda _r: (random_bytes(_r, 9),)),
+    ('rs129.lc_header_encode',          rs129.lc_header_encode,             lambda _r: (random_bytes(_r, 9),)),
+    ('rs129.lc_terminator_encode',      rs129.lc_terminator_encode,         lambda _r: (random_bytes(_r, 9),)),
+    ('qr.encode',                       qr.encode,                          lambda _r: (bytearray(random_bytes(_r, 2)),)),
+    ('qr.decode',                       qr.decode,                          lambda _r: (bytearray(random_bytes(_r, 2)),)),
+    ('qr.get_synd_1576',                qr.get_synd_1576,                   lambda _r: (_r.getrandbits(15),)),
+    ('crc.csum5',                       crc.csum5,                          lambda _r: (random_bytes(_r, 9),)),
+    ('crc.csum5_int',                   crc.csum5_int,                      lambda _r: (random_bytes(_r, 9),)),
+    ('lc.encode_lc_header',             lc.encode_lc_header,                lambda _r: (random_bytes(_r, 9), _r.getrandbits(4), const.DT_VOICE_LC_HEADER, random_bits(_r, 48))),
+    ('lc.encode_pi_header',             lc.encode_pi_header,                lambda _r: (random_bytes(_r, 12), _r.getrandbits(4), const.DT_VOICE_PI_HEADER, random_bits(_r, 48))),
+    ('lc.decode_lc_header',             lc.decode_lc_header,                lambda _r: (random_bytes(_r, 33),)),
+]
+
+if ambe_utils != None:
+    ROUTINES += [
+        ('ambe_utils.golay2312',            ambe_utils.golay2312,               lambda _r: (_r.getrandbits(12),)),
+        ('ambe_utils.parity',               ambe_utils.parity,                  lambda _r: (_r.getrandbits(24),)),
+        ('ambe_utils.interleave',           ambe_utils.interleave,              lambda _r: ([[_r.getrandbits(1) for _ in range(24)] for _ in range(4)],)),
+        ('ambe_utils.deinterleave',         ambe_utils.deinterleave,            lambda _r: (random_bits(_r, 72),)),
+        ('ambe_utils.convert49BitTo72BitAMBE', ambe_utils.convert49BitTo72BitAMBE, lambda _r: (random_bits(_r, 49),)),
+        ('ambe_utils.convert72BitTo49BitAMBE', ambe_utils.convert72BitTo49BitAMBE, lambda _r: (random_bits(_r, 72),)),
+    ]
+
+# Routines that do not run under Python 3; they have no golden vectors and are
+# not benchmarked
+UNSUPPORTED = {
+    'golay.decode_2087':            'float division in get_synd_1987',
+    'golay.get_synd_1987':          'float division in the syndrome loop',
+    'golay.get_synd_23127':         'float division in the syndrome loop',
+    'qr.decode':                    'float division in get_synd_1576',
+    'qr.get_synd_1576':             'float division in the syndrome loop',
+    'lc.encode_lc_header':          'bitstring cannot build from a bitarray',
+    'lc.encode_pi_header':          'bitstring cannot build from a bitarray',
+}
+
+# The original bitarray based routines the table driven BPTC routines must be
+# bit-exact with
+REFERENCES = {
+    'bptc.encode_19696':            ref_encode_19696,
+    'bptc.interleave_19696':        ref_interleave_19696,
+    'bptc.decode_full_lc':          ref_decode_full_lc,
+    'bptc.encode_header_lc':        ref_encode_header_lc,
+    'bptc.encode_header_pi':        ref_encode_header_pi,
+    'bptc.encode_terminator_lc':    ref_encode_terminator_lc,
+    'bptc.encode_emblc':            ref_encode_emblc,
+    'bptc.decode_emblc':            ref_decode_emblc,
+}
+
+# ---------------------------------------------------------------------------
+#   Verify Routines
+# ---------------------------------------------------------------------------
+
+# Generate the golden vectors from the current routines; vectors for routines
+# that cannot be loaded here are kept from the existing file
+def write_golden(_path, _vectors, _seed):
+    _rand = random.Random(_seed)
+    _golden = {'seed': _seed, 'vectors': {}}
+    if os.path.exists(_path):
+        with open(_path) as _file:
+            _golden['vectors'] = json.load(_file)['vectors']
+    for _name, _routine, _gen in ROUTINES:
+        _golden['vectors'].pop(_name, None)
+        for _ in range(_vectors):
+            _args = _gen(_rand)
+            # still drawn for unsupported routines, so the inputs of the others do not move
+            if _name in UNSUPPORTED:
+                continue
+            _input = to_json(_args)
+            _golden['vectors'].setdefault(_name, []).append({'args': _input, 'result': to_json(_routine(*from_json(_input)))})
+
+    with open(_path, 'w') as _file:
+        json.dump(_golden, _file, indent = 1, sort_keys = True)
+        _file.write('\n')
+
+# Check every routine against the golden vectors, and the table driven BPTC
+# routines against the reference routines over random vectors
+def verify(_path, _vectors, _seed):
+    _failed = 0
+
+    with open(_path) as _file:
+        _golden = json.load(_file)
+
+    for _name, _routine, _gen in ROUTINES:
+        if _name in UNSUPPORTED:
+            print('UNSUPPORTED {} ({})'.format(_name, UNSUPPORTED[_name]))
+            continue
+        if _name not in _golden['vectors']:
+            print('NO VECTORS {} (regenerate the golden vectors)'.format(_name))
+            continue
+
+        for _vector in _golden['vectors'][_name]:
+            try:
+                _result = to_json(_routine(*from_json(_vector['args'])))
+            except Exception as e:
+                print('RAISES {} args {} {}: {}'.format(_name, _vector['args'], type(e).__name__, e))
+                _failed += 1
+                break
+            if _result != _vector['result']:
+                print('MISMATCH {} args {} expected {} got {}'.format(_name, _vector['args'], _vector['result'], _result))
+                _failed += 1
+                break
+
+    _rand = random.Random(_seed)
+    for _name, _routine, _gen in ROUTINES:
+        if _name not in REFERENCES:
+            continue
+
+        for _ in range(_vectors):
+            _args = _gen(_rand)
+            _expect = REFERENCES[_name](*_args)
+            _result = _routine(*_args)
+            if _result != _expect:
+                print('MISMATCH {} (reference) args {} expected {} got {}'.format(_name, to_json(_args), _expect, _result))
+                _failed += 1
+                break
+
+    return _failed
+
+# ---------------------------------------------------------------------------
+#   Benchmark Routines
+# ---------------------------------------------------------------------------
+
+def time_routine(_routine, _args, _iterations):
+    return timeit.timeit(lambda: _routine(*_args), number = _iterations) / _iterations * 1e6
+
+def benchmark(_iterations, _seed, _filter = None):
+    _rand = random.Random(_seed)
+    _results = {}
+    print('{:<38}{:>12}{:>14}{:>10}'.format('routine', 'us', 'reference us', 'speedup'))
+    for _name, _routine, _gen in ROUTINES:
+        _args = _gen(_rand)
+        if _filter != None and _filter not in _name:
+            continue
+
+        if _name in UNSUPPORTED:
+            print('{:<38}{:>12}'.format(_name, 'unsupported'))
+            continue
+
+        _results[_name] = {'us': time_routine(_routine, _args, _iterations)}
+        if _name in REFERENCES:
+            _results[_name]['reference_us'] = time_routine(REFERENCES[_name], _args, _iterations)
+            print('{:<38}{:>12.2f}{:>14.2f}{:>9.1f}x'.format(_name, _results[_name]['us'], _results[_name]['reference_us'],
+                                                          _results[_name]['reference_us'] / _results[_name]['us']))
+        else:
+            print('{:<38}{:>12.2f}'.format(_name, _results[_name]['us']))
+
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'iterations': _iterations,
+        'seed': _seed,
+        'routines': _results,
+    }
+
+# Compare benchmark results against an earlier run; returns the number of
+# routines that got slower by more than the threshold (in percent)
+def compare(_results, _baseline, _threshold):
+    _regressed = 0
+    print()
+    print('{:<38}{:>12}{:>12}{:>10}'.format('routine', 'baseline us', 'us', 'change'))
+    for _name, _result in _results['routines'].items():
+        _base = _baseline['routines'].get(_name)
+        if _base == None or 'us' not in _base or 'us' not in _result:
+            continue
+
+        _change = (_result['us'] - _base['us']) / _base['us'] * 100
+        _flag = ''
+        if _change > _threshold:
+            _flag = '  REGRESSION'
+            _regressed += 1
+        print('{:<38}{:>12.2f}{:>12.2f}{:>+9.1f}%{}'.format(_name, _base['us'], _result['us'], _change, _flag))
+    return _regressed
+
+# ---------------------------------------------------------------------------
+#   Program Entry Point
+# ---------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'dmr_utils codec benchmarks and golden vector verification')
+    parser.add_argument('mode', nargs = '?', choices = ['bench', 'verify', 'golden'], default = 'bench',
+                        help = 'bench - time every routine, verify - check the golden vectors and reference routines, golden - regenerate the golden vectors.')
+    parser.add_argument('-n', '--iterations', action = 'store', dest = 'Iterations', type = int, default = 10000, help = 'Iterations per timed routine.')
+    parser.add_argument('-v', '--vectors', action = 'store', dest = 'Vectors', type = int, default = None,
+                        help = 'Random vectors per routine (default 1000 for verify, 8 for golden).')
+    parser.add_argument('-s', '--seed', action = 'store', dest = 'Seed', type = int, default = 1, help = 'Random seed.')
+    parser.add_argument('-g', '--golden', action = 'store', dest = 'Golden', default = GOLDEN_FILE, help = 'Golden vector file.')
+    parser.add_argument('-r', '--routine', action = 'store', dest = 'Routine', default = None, help = 'Only benchmark routines containing this name.')
+    parser.add_argument('-o', '--output', action = 'store', dest = 'Output', default = None, help = 'Write the benchmark results to this JSON file.')
+    parser.add_argument('-c', '--compare', action = 'store', dest = 'Compare', default = None, help = 'Compare the benchmark results to this JSON file.')
+    parser.add_argument('-t', '--threshold', action = 'store', dest = 'Threshold', type = float, default = 10, help = 'Slowdown (percent) reported as a regression.')
+    cli_args = parser.parse_args()
+
+    if cli_args.mode == 'golden':
+        write_golden(cli_args.Golden, cli_args.Vectors or 8, cli_args.Seed)
+        print('Golden vectors written to {}'.format(cli_args.Golden))
+
+    elif cli_args.mode == 'verify':
+        _vectors = cli_args.Vectors or 1000
+        _failed = verify(cli_args.Golden, _vectors, cli_args.Seed)
+        if _failed:
+            sys.exit('{} routine(s) do not match the golden vectors or reference routines'.format(_failed))
+        print('All routines match the golden vectors, BPTC routines bit-exact over {} random vectors each'.format(_vectors))
+
+    else:
+        _results = benchmark(cli_args.Iterations, cli_args.Seed, cli_args.Routine)
+        if cli_args.Output:
+            with open(cli_args.Output, 'w') as _file:
+                json.dump(_results, _file, indent = 2, sort_keys = True)
+                _file.write('\n')
+
+        if cli_args.Compare:
+            with open(cli_args.Compare) as _file:
+                _baseline = json.load(_file)
+            if compare(_results, _baseline, cli_args.Threshold):
+                sys.exit(1)
@@ -0,0 +1,400 @@
+#!/usr/bin/env python
+#
+# Digital Voice Modem - Fixed Network Equipment
+# GPLv2 Open Source. Use is subject to license terms.
+# DO NOT ALTER OR REMOVE COPYRIGHT NOTICES OR THIS FILE HEADER.
+#
+# @package DVM / FNE
+#
+###############################################################################
+#   Copyright (C) 2017-2021 Bryan Biedenkapp <gatekeep@gmail.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import random
+import argparse
+
+from hashlib import sha256
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bitarray import bitarray
+
+from twisted.internet.protocol import DatagramProtocol
+from twisted.internet import reactor, task, defer
+
+from fne import fne_const
+from dmr_utils import bptc
+
+# Frame intervals (one DMR burst, one P25 LDU)
+DMR_INTERVAL = 0.06
+P25_INTERVAL = 0.18
+
+# Time (in seconds) the peers are given to log in, and to drain frames still
+# in flight once the streams stop
+LOGIN_TIMEOUT = 10
+DRAIN_TIME = 1
+
+# Size of the generated P25 payloads (after the 24 byte P25D header)
+P25_HDU_LEN = 24
+P25_LDU_LEN = 216
+P25_TDU_LEN = 4
+
+# Latency percentiles reported
+LOADGEN_PERCENTILES = (50, 99)
+
+# ---------------------------------------------------------------------------
+#   Module Routines
+# ---------------------------------------------------------------------------
+
+def percentile(_sorted, _pct):
+    if not _sorted:
+        return 0
+    return _sorted[min(len(_sorted) - 1, int(len(_sorted) * _pct / 100))]
+
+# The RPTC configuration JSON a dvmhost peer sends
+def mk_peer_config(_peer_id):
+    return json.dumps({
+        'identity': 'LOADGEN{}'.format(_peer_id)[:8],
+        'rxFrequency': 449000000,
+        'txFrequency': 444000000,
+        'info': {'latitude': 0, 'longitude': 0, 'height': 0, 'location': 'Load Generator'},
+        'channel': {'txOffsetMhz': 5, 'chBandwidthKhz': 12.5, 'channelId': 1, 'channelNo': 1, 'txPower': 1},
+        'rcon': {'password': 'LOADGEN', 'port': 0}
+    }).encode()
+
+# Returns the (frame type, data type/voice sequence, 33 byte burst) list for a
+# DMR voice call of the given number of superframes; the header and
+# terminator carry a full LC, and bursts B-E the embedded LC
+def mk_dmr_call(_src, _dst, _unit, _superframes):
+    _lc = (b'\x03' if _unit else b'\x00') + b'\x00\x00' + _dst.to_bytes(3, 'big') + _src.to_bytes(3, 'big')
+    _emb = bptc.encode_emblc(_lc)
+
+    def full_lc(_bits):
+        return (_bits[0:98] + bitarray(68 * '0') + _bits[98:196]).tobytes()
+
+    _frames = [(fne_const.FT_DATA_SYNC, fne_const.DT_VOICE_LC_HEADER, full_lc(bptc.encode_header_lc(_lc)))]
+    for _superframe in range(_superframes):
+        for _vseq in range(6):
+            _burst = bitarray(endian='big')
+            _burst.frombytes(bytes(random.getrandbits(8) for _ in range(33)))
+            if _vseq in _emb:
+                _burst[116:148] = _emb[_vseq]
+            _frames.append((fne_const.FT_VOICE_SYNC if _vseq == 0 else fne_const.FT_VOICE, _vseq, _burst.tobytes()))
+    _frames.append((fne_const.FT_DATA_SYNC, fne_const.DT_TERMINATOR_WITH_LC, full_lc(bptc.encode_terminator_lc(_lc))))
+    return _frames
+
+# Returns the (DUID, payload) list for a P25 voice call of the given number of
+# LDU1/LDU2 pairs
+def mk_p25_call(_ldus):
+    _frames = [(fne_const.P25_DUID_HDU, bytes(P25_HDU_LEN))]
+    for _ldu in range(_ldus):
+        _frames.append((fne_const.P25_DUID_LDU1, bytes(random.getrandbits(8) for _ in range(P25_LDU_LEN))))
+        _frames.append((fne_const.P25_DUID_LDU2, bytes(random.getrandbits(8) for _ in range(P25_LDU_LEN))))
+    _frames.append((fne_const.P25_DUID_TDU, bytes(P25_TDU_LEN)))
+    return _frames
+
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     A simulated dvmhost peer; logs in to the master (RPTL, RPTK, RPTC),
+#     pings it, and hands any DMRD/P25D frames it is sent to the generator.
+# ---------------------------------------------------------------------------
+
+class virtualPeer(DatagramProtocol):
+    def __init__(self, _gen, _peer_id):
+        self._gen = _gen
+        self.peer_id = _peer_id
+        self._peer_bytes = _peer_id.to_bytes(4, 'big')
+        self._master = (_gen.address, _gen.port)
+        self._ping = task.LoopingCall(self.send_ping)
+
+        self.state = 'NO'
+        self.login_start = 0
+        self.login_time = None
+        self.pings = 0
+        self.pongs = 0
+
+    def send(self, _data):
+        self.transport.write(_data, self._master)
+
+    def login(self):
+        self.state = 'RPTL_SENT'
+        self.login_start = perf_counter()
+        self.send(fne_const.TAG_REPEATER_LOGIN + self._peer_bytes)
+
+    def logout(self):
+        if self._ping.running:
+            self._ping.stop()
+        if self.state == 'YES':
+            self.send(fne_const.TAG_REPEATER_CLOSING + self._peer_bytes)
+        self.state = 'NO'
+
+    def send_ping(self):
+        self.pings += 1
+        self.send(fne_const.TAG_REPEATER_PING + self._peer_bytes)
+
+    def datagramReceived(self, _data, _addr):
+        if _data[:4] == fne_const.TAG_DMR_DATA or _data[:4] == fne_const.TAG_P25_DATA:
+            self._gen.frame_received(self, _data)
+
+        elif _data.startswith(fne_const.TAG_REPEATER_ACK):
+            if self.state == 'RPTL_SENT':
+                self.state = 'AUTHENTICATED'
+                self.send(fne_const.TAG_REPEATER_AUTH + self._peer_bytes + sha256(_data[6:10] + self._gen.passphrase).digest())
+            elif self.state == 'AUTHENTICATED':
+                self.state = 'CONFIG_SENT'
+                self.send(fne_const.TAG_REPEATER_CONFIG + self._peer_bytes + mk_peer_config(self.peer_id))
+            elif self.state == 'CONFIG_SENT':
+                self.state = 'YES'
+                self.login_time = perf_counter() - self.login_start
+                self._ping.start(self._gen.ping_time, now = False)
+
+        elif _data.startswith(fne_const.TAG_MASTER_PONG):
+            self.pongs += 1
+
+        elif _data.startswith(fne_const.TAG_MASTER_NAK):
+            if self.state in ('RPTL_SENT', 'AUTHENTICATED', 'CONFIG_SENT'):
+                self._gen.logger('PEER {} login refused by the master (in state {})'.format(self.peer_id, self.state))
+                self.state = 'NAK'
+            elif self.state == 'YES':
+                self.state = 'NAK'
+
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     A voice stream injected by one peer; frames are sent from the reactor
+#     at the DMR or P25 frame rate. Each frame carries a 16-bit frame number
+#     in its last two bytes (the DMRD BER/RSSI bytes, and the end of the
+#     P25 payload; neither are rewritten when routed) so deliveries can be
+#     matched to when the frame was sent.
+# ---------------------------------------------------------------------------
+
+class voiceStream(object):
+    def __init__(self, _gen, _peer, _stream_id, _p25, _src, _dst, _slot, _duration):
+        self._gen = _gen
+        self._peer = _peer
+        self.stream_id = _stream_id
+        self._p25 = _p25
+        self._src = _src
+        self._dst = _dst
+        self._slot = _slot
+
+        if _p25:
+            self._interval = P25_INTERVAL
+            self._frames = mk_p25_call(max(1, int(_duration / (P25_INTERVAL * 2))))
+        else:
+            self._interval = DMR_INTERVAL
+            self._frames = mk_dmr_call(_src, _dst, False, max(1, int(_duration / (DMR_INTERVAL * 6))))
+
+        self._idx = 0
+        self._timer = task.LoopingCall(self.send)
+
+    def start(self):
+        self._timer.start(self._interval)
+
+    def stop(self):
+        if self._timer.running:
+            self._timer.stop()
+
+    def mk_frame(self, _idx):
+        _peer_bytes = self._peer.peer_id.to_bytes(4, 'big')
+        _stream_bytes = self.stream_id.to_bytes(4, 'big')
+        _count = (_idx & 0xFFFF).to_bytes(2, 'big')
+        if self._p25:
+            _duid, _payload = self._frames[_idx]
+            return (fne_const.TAG_P25_DATA + b'\x00' + self._src.to_bytes(3, 'big') + self._dst.to_bytes(3, 'big') + _peer_bytes + b'\x00' +
+                    _stream_bytes + b'\x00\x00' + bytes([_duid]) + b'\x00' + _payload + _count)
+
+        _frame_type, _dtype_vseq, _burst = self._frames[_idx]
+        _bits = (0x80 if self._slot == 2 else 0) | (_frame_type << 4) | _dtype_vseq
+        return (fne_const.TAG_DMR_DATA + bytes([_idx & 0xFF]) + self._src.to_bytes(3, 'big') + self._dst.to_bytes(3, 'big') + _peer_bytes +
+                bytes([_bits]) + _stream_bytes + _burst + _count)
+
+    def send(self):
+        if self._idx >= len(self._frames):
+            self.stop()
+            return
+
+        self._gen.frame_sent(self, self._idx)
+        self._peer.send(self.mk_frame(self._idx))
+        self._idx += 1
+
+# ---------------------------------------------------------------------------
+#   Class Declaration
+#     Runs a load test round for each peer count; logs the peers in, runs the
+#     voice streams, logs the peers out again and reports the results.
+# ---------------------------------------------------------------------------
+
+class loadGenerator(object):
+    def __init__(self, _args):
+        self.address = _args.Address
+        self.port = _args.Port
+        self.passphrase = _args.Passphrase.encode()
+        self.ping_time = _args.PingTime
+        self._args = _args
+        self.results = []
+
+    def logger(self, _message):
+        print(_message, file = sys.stderr)
+
+    def frame_sent(self, _stream, _idx):
+        self._sent[(_stream.stream_id, _idx & 0xFFFF)] = perf_counter()
+        self._sent_count[_stream.stream_id] = self._sent_count.get(_stream.stream_id, 0) + 1
+
+    def frame_received(self, _peer, _data):
+        _now = perf_counter()
+        _stream_id = int.from_bytes(_data[16:20], 'big')
+        _sent = self._sent.get((_stream_id, int.from_bytes(_data[-2:], 'big')))
+        if _sent == None:
+            return
+
+        self._latency.append(_now - _sent)
+        _key = (_stream_id, _peer.peer_id)
+        self._received[_key] = self._received.get(_key, 0) + 1
+
+    @defer.inlineCallbacks
+    def run(self):
+        try:
+            for _count in self._args.Peers:
+                yield self.run_round(_count)
+                yield task.deferLater(reactor, DRAIN_TIME, lambda: None)
+        finally:
+            if reactor.running:
+                reactor.stop()
+
+    @defer.inlineCallbacks
+    def run_round(self, _count):
+        self._sent = {}
+        self._sent_count = {}
+        self._received = {}
+        self._latency = []
+
+        # every peer gets its own socket, as the master tells them apart by
+        # address and port
+        _peers = []
+        _ports = []
+        for _idx in range(_count):
+            _peer = virtualPeer(self, self._args.PeerBase + _idx)
+            _ports.append(reactor.listenUDP(0, _peer, interface = self._args.Bind))
+            _peers.append(_peer)
+
+        # log in, ramping up at the requested rate
+        _start = perf_counter()
+        for _peer in _peers:
+            _peer.login()
+            if self._args.Ramp > 0:
+                yield task.deferLater(reactor, 1.0 / self._args.Ramp, lambda: None)
+
+        _deadline = _start + LOGIN_TIMEOUT
+        while perf_counter() < _deadline and any(_peer.state not in ('YES', 'NAK') for _peer in _peers):
+            yield task.deferLater(reactor, 0.01, lambda: None)
+
+        _connected = [_peer for _peer in _peers if _peer.state == 'YES']
+        _login_elapsed = max([_peer.login_start + _peer.login_time for _peer in _connected] or [_start]) - _start
+        _login_times = sorted(_peer.login_time for _peer in _connected)
+
+        # inject the voice streams, spread over the connected peers, TGIDs
+        # and slots
+        _streams = []
+        if _connected:
+            for _idx in range(self._args.Streams):
+                _p25 = (self._args.Mode == 'p25') or (self._args.Mode == 'both' and _idx % 2 == 1)
+                _streams.append(voiceStream(self, _connected[_idx % len(_connected)], random.getrandbits(32), _p25,
+                                            self._args.SrcBase + _idx, self._args.TGIDs[_idx % len(self._args.TGIDs)],
+                                            self._args.Slots[_idx % len(self._args.Slots)], self._args.Duration))
+            for _stream in _streams:
+                _stream.start()
+
+            yield task.deferLater(reactor, self._args.Duration + DMR_INTERVAL * 8, lambda: None)
+            for _stream in _streams:
+                _stream.stop()
+            yield task.deferLater(reactor, DRAIN_TIME, lambda: None)
+
+        for _peer in _peers:
+            _peer.logout()
+        for _port in _ports:
+            yield _port.stopListening()
+
+        # loss is counted for every peer that received any of a stream
+        _sent = sum(self._sent_count.values())
+        _delivered = sum(self._received.values())
+        _expected = sum(self._sent_count[_stream_id] for _stream_id, _peer_id in self._received)
+        _latency = sorted(self._latency)
+
+        self.results.append({
+            'peers': _count,
+            'connected': len(_connected),
+            'login_time': _login_elapsed,
+            'logins_per_sec': len(_connected) / _login_elapsed if _login_elapsed else 0,
+            'login_latency_ms': dict(('p{}'.format(_pct), percentile(_login_times, _pct) * 1000) for _pct in LOADGEN_PERCENTILES),
+            'streams': len(_streams),
+            'frames_sent': _sent,
+            'frames_delivered': _delivered,
+            'loss_pct': (100.0 * (_expected - _delivered) / _expected) if _expected else 0,
+            'latency_ms': dict([('p{}'.format(_pct), percentile(_latency, _pct) * 1000) for _pct in LOADGEN_PERCENTILES] +
+                               [('max', (_latency[-1] * 1000) if _latency else 0)]),
+            'pings': sum(_peer.pings for _peer in _peers),
+            'pongs': sum(_peer.pongs for _peer in _peers),
+        })
+        self.report_round(self.results[-1])
+
+    def report_round(self, _result):
+        if len(self.results) == 1:
+            print('{:>6} {:>6} {:>9} {:>9} {:>9} {:>7} {:>9} {:>10} {:>7} {:>9} {:>9} {:>9}'.format('Peers', 'Conn', 'Login s', 'Logins/s', 'Login p99',
+                  'Streams', 'Sent', 'Delivered', 'Loss %', 'Lat p50', 'Lat p99', 'Lat max'))
+        print('{:>6} {:>6} {:>9.3f} {:>9.1f} {:>9.2f} {:>7} {:>9} {:>10} {:>7.2f} {:>9.2f} {:>9.2f} {:>9.2f}'.format(_result['peers'],
+              _result['connected'], _result['login_time'], _result['logins_per_sec'], _result['login_latency_ms']['p99'], _result['streams'],
+              _result['frames_sent'], _result['frames_delivered'], _result['loss_pct'], _result['latency_ms']['p50'],
+              _result['latency_ms']['p99'], _result['latency_ms']['max']))
+        sys.stdout.flush()
+
+# ---------------------------------------------------------------------------
+#   Program Entry Point
+# ---------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    def int_list(_value):
+        return [int(_item) for _item in _value.split(',')]
+
+    parser = argparse.ArgumentParser(description = 'Simulate dvmhost peers and voice traffic against an FNE master')
+    parser.add_argument('-a', '--address', action = 'store', dest = 'Address', default = '127.0.0.1', help = 'Master address.')
+    parser.add_argument('-p', '--port', action = 'store', dest = 'Port', type = int, default = 62031, help = 'Master port.')
+    parser.add_argument('-P', '--passphrase', action = 'store', dest = 'Passphrase', default = '', help = 'Master passphrase.')
+    parser.add_argument('-n', '--peers', action = 'store', dest = 'Peers', type = int_list, default = [10], help = 'Peer counts to test, one round each (i.e. 10,50,100).')
+    parser.add_argument('--peer-base', action = 'store', dest = 'PeerBase', type = int, default = 9100000, help = 'First peer ID.')
+    parser.add_argument('--ramp', action = 'store', dest = 'Ramp', type = float, default = 0, help = 'Logins started per second (0 = all at once).')
+    parser.add_argument('--ping', action = 'store', dest = 'PingTime', type = float, default = 5, help = 'Peer ping interval (in seconds).')
+    parser.add_argument('-s', '--streams', action = 'store', dest = 'Streams', type = int, default = 1, help = 'Concurrent voice streams.')
+    parser.add_argument('-m', '--mode', action = 'store', dest = 'Mode', choices = ['dmr', 'p25', 'both'], default = 'dmr', help = 'Voice stream type.')
+    parser.add_argument('-t', '--tgids', action = 'store', dest = 'TGIDs', type = int_list, default = [1], help = 'TGIDs the streams are sent to.')
+    parser.add_argument('--slots', action = 'store', dest = 'Slots', type = int_list, default = [1], help = 'DMR slots the streams are sent on.')
+    parser.add_argument('--src-base', action = 'store', dest = 'SrcBase', type = int, default = 3100000, help = 'First stream source RID.')
+    parser.add_argument('-d', '--duration', action = 'store', dest = 'Duration', type = float, default = 10, help = 'Voice stream length (in seconds).')
+    parser.add_argument('--bind', action = 'store', dest = 'Bind', default = '127.0.0.1', help = 'Local address the peers bind to.')
+    parser.add_argument('--json', action = 'store', dest = 'Json', default = None, help = 'Also write the results to this JSON file.')
+    cli_args = parser.parse_args()
+
+    gen = loadGenerator(cli_args)
+    reactor.callWhenRunning(gen.run)
+    reactor.run()
+
+    if cli_args.Json:
+        with open(cli_args.Json, 'w') as _file:
+            json.dump(gen.results, _file, indent = 2)